@@ -0,0 +1,292 @@
+"""上传数据的历史归档（Parquet列式存储）与多周期查询
+
+每次导入发布后，清洗后的数据按 月份起始日期/上传 分区写入归档目录：
+    ARCHIVE_DIR/month_start=<YYYY-MM-01>/upload=<上传ID>/part-*.parquet
+"本周"/"上周"、"9月"等相对标签在写入时按该次导入的截止日期换算为week_start、month_start，
+不同时间上传的同名标签不会混为同一周期。正式表每次导入都会整表替换，归档只追加，
+历史趋势直接从归档读取，查询时按分区裁剪月份和上传、只读取用到的列，不影响看板查询的数据库表。
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+import importlib.util
+from datetime import date
+import pandas as pd
+import ingest
+import rollups
+
+# 归档目录
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+# 没有pyarrow时不归档
+ARCHIVE_ENABLED = importlib.util.find_spec("pyarrow") is not None and os.getenv("ARCHIVE_ENABLED", "1") != "0"
+
+# 可查询的指标：profit_rate按行平均，其余求和
+ARCHIVE_METRICS = ("sales_amount", "sales_volume", "order_count", "profit", "profit_rate")
+
+# 可分组的维度列
+ARCHIVE_DIMENSIONS = tuple(spec.name for spec in ingest.SALES_SCHEMA if spec.kind in ("string", "category")
+                           and spec.name not in ("week", "month"))
+
+# 周期起始日期列
+PERIOD_START_COLUMNS = {period_type: f"{period_type}_start" for period_type in rollups.PERIOD_TYPES}
+
+# 上传记录清单，以下划线开头，读取数据集时被忽略
+_MANIFEST_FILE = "_manifest.json"
+_lock = threading.Lock()
+
+if ARCHIVE_ENABLED:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    _TYPES = {"string": pa.string(), "category": pa.string(), "float": pa.float64(), "integer": pa.int64()}
+    # 归档文件的固定结构，不同时期的上传可以放在同一个数据集中读取
+    ARCHIVE_SCHEMA = pa.schema([(spec.name, _TYPES[spec.kind]) for spec in ingest.SALES_SCHEMA]
+                               + [(column, pa.date32()) for column in PERIOD_START_COLUMNS.values()])
+    PARTITIONING = ds.partitioning(pa.schema([("month_start", pa.date32()), ("upload", pa.string())]),
+                                   flavor="hive")
+    # 读取时的结构：month_start来自目录分区
+    _DATASET_SCHEMA = pa.unify_schemas([ARCHIVE_SCHEMA.remove(ARCHIVE_SCHEMA.get_field_index("month_start")),
+                                        PARTITIONING.schema])
+
+# 无法识别的周期标签（起始日期为空）写入的默认分区
+_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _load_manifest():
+    path = os.path.join(ARCHIVE_DIR, _MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"uploads": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(ARCHIVE_DIR, _MANIFEST_FILE)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def list_uploads():
+    """列出已归档的上传，最新的在前"""
+    with _lock:
+        uploads = _load_manifest()["uploads"]
+    entries = [dict(entry, upload=upload) for upload, entry in uploads.items()]
+    return sorted(entries, key=lambda entry: entry["uploaded_at"], reverse=True)
+
+
+def is_archived(upload):
+    with _lock:
+        return upload in _load_manifest()["uploads"]
+
+
+def _start_key(start):
+    """起始日期在清单中的写法，无法识别的周期为空字符串"""
+    return start.isoformat() if isinstance(start, date) else ""
+
+
+def _to_table(df, anchor=None):
+    """清洗后的数据块转为固定结构的Arrow表，缺少的列为空；周期标签按anchor换算出起始日期"""
+    columns = {}
+    for field in ARCHIVE_SCHEMA:
+        period_type = field.name[:-len("_start")] if field.name in PERIOD_START_COLUMNS.values() else None
+        if period_type and period_type in df.columns:
+            starts = rollups.period_starts(period_type, df[period_type], anchor)
+            columns[field.name] = pa.array(starts, type=field.type, from_pandas=True)
+        elif field.name in df.columns:
+            values = df[field.name]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(object)
+            array = pa.array(values, from_pandas=True)
+            columns[field.name] = array if array.type == field.type else array.cast(field.type)
+        else:
+            columns[field.name] = pa.nulls(len(df), field.type)
+    return pa.table(columns, schema=ARCHIVE_SCHEMA)
+
+
+class ArchiveWriter:
+    """一次导入的归档：导入过程中逐块写入临时目录，发布成功后commit移入归档
+
+    anchor为该次导入的数据截止日期（默认今天），相对周期标签按它换算为起始日期。
+    同一上传（指纹相同，如从缓存重新发布）已归档时不重复写入；
+    归档失败只打印错误，不影响导入本身。
+    """
+
+    def __init__(self, upload=None, filename=None, anchor=None):
+        self.upload = upload or uuid.uuid4().hex
+        self.filename = filename
+        self.anchor = anchor
+        self.enabled = ARCHIVE_ENABLED and not is_archived(self.upload)
+        self.staging_dir = os.path.join(ARCHIVE_DIR, f".staging-{self.upload}")
+        self.parts = 0
+        self.rows = 0
+        self.labels = {period_type: set() for period_type in rollups.PERIOD_TYPES}
+        self.starts = {period_type: set() for period_type in rollups.PERIOD_TYPES}
+        if self.enabled:
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def add(self, df):
+        """写入一块清洗后的数据"""
+        if not self.enabled or df.empty:
+            return
+        try:
+            table = _to_table(df, self.anchor)
+            table = table.append_column("upload", pa.array([self.upload] * len(table), pa.string()))
+            ds.write_dataset(
+                table, self.staging_dir, format="parquet", partitioning=PARTITIONING,
+                basename_template=f"part-{self.parts:05d}-{{i}}.parquet",
+                existing_data_behavior="overwrite_or_ignore"
+            )
+            self.parts += 1
+            self.rows += len(df)
+            for period_type in rollups.PERIOD_TYPES:
+                if period_type in df.columns:
+                    self.labels[period_type].update(
+                        value for value in df[period_type].astype(object).unique() if isinstance(value, str)
+                    )
+                starts = table[PERIOD_START_COLUMNS[period_type]].unique().to_pylist()
+                self.starts[period_type].update(_start_key(start) for start in starts)
+        except Exception as e:
+            print(f"写入历史归档失败，本次导入不归档: {str(e)}")
+            self.discard()
+
+    def commit(self):
+        """数据发布后把临时目录中的分区移入归档并登记清单"""
+        if not self.enabled:
+            return False
+        try:
+            with _lock:
+                for month_dir in os.listdir(self.staging_dir) if os.path.isdir(self.staging_dir) else []:
+                    for upload_dir in os.listdir(os.path.join(self.staging_dir, month_dir)):
+                        target = os.path.join(ARCHIVE_DIR, month_dir, upload_dir)
+                        os.makedirs(os.path.dirname(target), exist_ok=True)
+                        shutil.rmtree(target, ignore_errors=True)
+                        os.replace(os.path.join(self.staging_dir, month_dir, upload_dir), target)
+                manifest = _load_manifest()
+                manifest["uploads"][self.upload] = {
+                    "filename": self.filename,
+                    "rows": self.rows,
+                    "as_of": _start_key(self.anchor) or None,
+                    "months": sorted(self.labels["month"], key=lambda month: rollups.period_sort_key("month", month) or 0),
+                    "weeks": sorted(self.labels["week"], key=lambda week: rollups.period_sort_key("week", week) or 0),
+                    "month_starts": sorted(self.starts["month"]),
+                    "week_starts": sorted(self.starts["week"]),
+                    "uploaded_at": time.time()
+                }
+                _save_manifest(manifest)
+            print(f"已归档上传 {self.upload}，共 {self.rows} 行")
+            return True
+        except Exception as e:
+            print(f"登记历史归档失败: {str(e)}")
+            return False
+        finally:
+            shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+    def discard(self):
+        self.enabled = False
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+
+
+def _select_uploads(uploads, period_type, periods, latest):
+    """选出要读取的 (上传, 周期起始日期)：latest时同一周期只取最近一次上传的数据，避免重叠的上传重复计算
+
+    周期按起始日期比较，不同周上传的"本周"是不同的周期。
+    """
+    key = f"{period_type}_starts"
+    ordered = sorted(uploads.items(), key=lambda item: item[1]["uploaded_at"], reverse=True)
+    selected = {}
+    for upload, entry in ordered:
+        for period in entry.get(key, []):
+            if periods is not None and period not in periods:
+                continue
+            if latest and any(period in chosen for chosen in selected.values()):
+                continue
+            selected.setdefault(upload, set()).add(period)
+    return selected
+
+
+def _normalize_periods(period_type, periods):
+    """查询的周期（"2024-09"、"2024-W05"、起始日期或相对标签）统一为起始日期写法"""
+    normalized = set()
+    for period in periods:
+        start = rollups.period_start(period_type, period) if str(period).strip() else None
+        if start is None and str(period).strip():
+            raise ValueError(f"无法识别的周期: {period}")
+        normalized.add(_start_key(start))
+    return normalized
+
+
+def _partition_dir(start, upload):
+    return os.path.join(ARCHIVE_DIR, f"month_start={start or _NULL_PARTITION}", f"upload={upload}")
+
+
+def _parquet_files(directories):
+    return [
+        os.path.join(directory, name) for directory in directories if os.path.isdir(directory)
+        for name in sorted(os.listdir(directory)) if name.endswith(".parquet")
+    ]
+
+
+def query(metrics=("sales_amount",), dimension=None, period_type="month", periods=None, uploads=None, latest=True):
+    """从归档按 (周期, 维度) 汇总指标，返回DataFrame
+
+    periods/uploads为None时不限，periods可以是"2024-09"、"2024-W05"或起始日期；
+    只读取选中上传和月份的分区，以及用到的列。
+    返回列: period（周期起始日期，无法识别的周期为空字符串）, upload, uploaded_at, [dimension], 各指标；
+    latest=False时同一周期的每次上传分别返回。
+    """
+    if not ARCHIVE_ENABLED:
+        raise RuntimeError("未安装pyarrow，历史归档不可用")
+    wanted = _normalize_periods(period_type, periods) if periods is not None else None
+    with _lock:
+        manifest = _load_manifest()
+    available = manifest["uploads"]
+    if uploads is not None:
+        available = {upload: entry for upload, entry in available.items() if upload in uploads}
+    selected = _select_uploads(available, period_type, wanted, latest)
+
+    period_column = PERIOD_START_COLUMNS[period_type]
+    group_columns = ["upload", period_column] + ([dimension] if dimension else [])
+    columns = sorted(set(group_columns) | {metric for metric in metrics})
+    output = ["period", "upload", "uploaded_at"] + ([dimension] if dimension else []) + list(metrics)
+    if not selected:
+        return pd.DataFrame(columns=output)
+
+    # 分区裁剪：只列出选中上传的目录，按月查询时只取选中月份的目录；
+    # 周起始日期不是分区列，由Parquet行组统计信息过滤
+    def period_filter(chosen):
+        starts = sorted(date.fromisoformat(period) for period in chosen if period != "")
+        expression = ds.field(period_column).isin(pa.array(starts, pa.date32())) if starts else None
+        if "" in chosen:
+            empty = ds.field(period_column).is_null()
+            expression = empty if expression is None else (expression | empty)
+        return expression
+
+    directories = []
+    expression = None
+    for upload, chosen in selected.items():
+        months = chosen if period_type == "month" else available[upload]["month_starts"]
+        directories.extend(_partition_dir(month, upload) for month in sorted(months))
+        condition = (ds.field("upload") == upload) & period_filter(chosen)
+        expression = condition if expression is None else (expression | condition)
+
+    dataset = ds.dataset(_parquet_files(directories), format="parquet", partitioning=PARTITIONING,
+                         partition_base_dir=ARCHIVE_DIR, schema=_DATASET_SCHEMA)
+    table = dataset.to_table(columns=columns, filter=expression)
+    aggregations = [(metric, "mean" if metric == "profit_rate" else "sum") for metric in metrics]
+    grouped = table.group_by(group_columns).aggregate(aggregations).to_pandas()
+    grouped = grouped.rename(columns={f"{metric}_{function}": metric for metric, function in aggregations})
+    grouped["period"] = [_start_key(start) for start in grouped[period_column]]
+    grouped["uploaded_at"] = grouped["upload"].map(lambda upload: manifest["uploads"][upload]["uploaded_at"])
+    # 起始日期的ISO写法按字符串排序即按时间排序，无法识别的周期排在最前
+    grouped = grouped.sort_values(
+        ["period", "uploaded_at"] + ([dimension] if dimension else []), kind="stable"
+    )
+    return grouped[output].reset_index(drop=True)
+
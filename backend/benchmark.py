@@ -0,0 +1,751 @@
+"""入库与解析性能基准测试
+
+用法: python benchmark.py load [行数]   在临时SQLite数据库上对比原逐行ORM入库循环与批量入库引擎
+      python benchmark.py excel [行数]  对比原read_excel整表读取与快速Excel读取方式
+      python benchmark.py clean [行数]  对比原逐列清洗函数与按SALES_SCHEMA单次清洗的耗时和峰值内存
+      python benchmark.py star [行数]   对比宽表与事实表+维度表的存储大小和分析查询耗时
+      python benchmark.py panels [行数...]  在不同数据量下测量全部看板面板的查询耗时（读取汇总表）
+      python benchmark.py dashboard [行数]  对比周看板十个接口逐个查询与合并接口一次查询的耗时
+      python benchmark.py engine [行数]  对比SQL与常驻内存列式引擎的各面板耗时，并校验两者结果一致
+      python benchmark.py archive [上传次数] [每次行数]  历史归档的写入耗时，以及按分区裁剪与读取全部归档的趋势查询耗时
+      python benchmark.py rolling [每周行数]  对比每周上传两周数据整表导入与只上传新一周的滚动导入
+      python benchmark.py upsert [行数] [修正行数]  对比按自然键增量修正与整表重新导入的耗时
+      python benchmark.py orders [订单行数]  订单级导入：原始订单行逐行入库与按周/月预先汇总后入库
+      python benchmark.py formats [行数]  同一份数据存为xlsx、CSV、CSV.gz、zip、JSON Lines、Parquet时的文件大小与解析清洗耗时
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import importlib.util
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text, Column, Integer, String, Float, DateTime, Index, func
+from sqlalchemy.orm import sessionmaker, declarative_base
+import models
+import loader
+import ingest
+import dimensions
+import rollups
+import columnar
+import archive
+
+LegacyBase = declarative_base()
+
+
+class LegacySalesData(LegacyBase):
+    """拆分维度表之前的宽表结构：每行都以字符串保存全部维度，用于对比"""
+    __tablename__ = "sales_data"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sku = Column(String(100))
+    spu = Column(String(100), index=True)
+    platform = Column(String(100))
+    shop = Column(String(100))
+    site = Column(String(100))
+    warehouse = Column(String(100))
+    buyer_country = Column(String(100))
+    sales_person = Column(String(100))
+    order_count = Column(Integer, default=0)
+    product_name = Column(String(500))
+    sales_volume = Column(Float, default=0)
+    sales_amount = Column(Float, default=0)
+    cost = Column(Float, nullable=True)
+    profit = Column(Float, nullable=True)
+    profit_rate = Column(Float, default=0)
+    order_status = Column(String(100), nullable=True)
+    week = Column(String(20))
+    month = Column(String(20))
+    created_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        Index("ix_sales_sku", "sku", "product_name", "sales_amount", "sales_volume"),
+        Index("ix_sales_week_sku", "week", "sku", "product_name", "sales_amount", "sales_volume"),
+        Index("ix_sales_month_sku", "month", "sku", "product_name", "sales_amount", "sales_volume"),
+        Index("ix_sales_week_country", "week", "buyer_country", "sales_amount"),
+        Index("ix_sales_month_country", "month", "buyer_country", "sales_amount"),
+        Index("ix_sales_week_platform", "week", "platform", "sales_amount", "sales_volume", "order_count", "profit_rate"),
+        Index("ix_sales_month_platform", "month", "platform", "sales_amount", "sales_volume", "order_count", "profit"),
+        Index("ix_sales_week_person", "week", "sales_person", "sales_amount", "sales_volume", "order_count", "profit_rate"),
+        Index("ix_sales_month_person", "month", "sales_person", "sales_amount", "sales_volume", "order_count", "profit"),
+    )
+
+
+def make_sales_frame(rows, seed=42):
+    """生成与清洗后结构一致的模拟销售数据"""
+    rng = random.Random(seed)
+    platforms = ['Amazon', 'eBay', 'Temu', 'Shopee', 'Walmart']
+    countries = ['美国', '英国', '德国', '法国', '日本', '加拿大']
+    sales_people = ['张三', '李四', '王五', '赵六']
+    # 与真实报表一致：spu和名称由sku决定
+    products = [(f"SKU{i:05d}", f"SPU{i // 4:04d}", f"产品名称{i}") for i in range(5000)]
+    picked = [rng.choice(products) for _ in range(rows)]
+    return pd.DataFrame({
+        'sku': [product[0] for product in picked],
+        'spu': [product[1] for product in picked],
+        'product_name': [product[2] for product in picked],
+        'shop': [f"店铺{rng.randint(1, 20)}" for _ in range(rows)],
+        'site': [rng.choice(['US', 'UK', 'DE', 'JP']) for _ in range(rows)],
+        'warehouse': [rng.choice(['W1', 'W2', 'W3']) for _ in range(rows)],
+        'sales_volume': [float(rng.randint(0, 50)) for _ in range(rows)],
+        'sales_amount': [round(rng.random() * 1000, 2) for _ in range(rows)],
+        'buyer_country': [rng.choice(countries) for _ in range(rows)],
+        'platform': [rng.choice(platforms) for _ in range(rows)],
+        'sales_person': [rng.choice(sales_people) for _ in range(rows)],
+        'order_count': [rng.randint(0, 20) for _ in range(rows)],
+        'profit': [round(rng.random() * 200, 2) for _ in range(rows)],
+        'profit_rate': [round(rng.random(), 4) for _ in range(rows)],
+        'week': [rng.choice(['本周', '上周']) for _ in range(rows)],
+        'order_status': ['完成'] * rows,
+        'month': [rng.choice(['9月', '10月']) for _ in range(rows)],
+    })
+
+
+def legacy_save(df, session):
+    """原save_to_database的逐行循环：iterrows + bulk_save_objects，每100行提交一次"""
+    model_fields = [column.name for column in LegacySalesData.__table__.columns]
+    batch_size = 100
+    total_rows = len(df)
+    for i in range(0, total_rows, batch_size):
+        batch_df = df.iloc[i:min(i + batch_size, total_rows)]
+        batch_objects = []
+        for _, row in batch_df.iterrows():
+            data_dict = {k: v for k, v in row.to_dict().items() if k in model_fields}
+            batch_objects.append(LegacySalesData(**data_dict))
+        session.bulk_save_objects(batch_objects)
+        session.commit()
+    return total_rows
+
+
+def legacy_process_data(df):
+    """原process_data：逐列重命名、转换、填空值，并打印每列类型"""
+    df_renamed = df.rename(columns={original: mapped for original, mapped in ingest.COLUMN_MAPPING.items() if original in df.columns})
+    for col in ['sales_volume', 'sales_amount', 'profit', 'profit_rate', 'order_count']:
+        if col in df_renamed.columns:
+            df_renamed[col] = pd.to_numeric(df_renamed[col], errors='coerce')
+    df_renamed = df_renamed.fillna({
+        'sales_volume': 0, 'sales_amount': 0, 'profit': 0, 'profit_rate': 0, 'order_count': 0,
+        'shop': '', 'site': '', 'warehouse': '', 'buyer_country': '', 'platform': '',
+        'sales_person': '', 'order_status': '', 'month': ''
+    })
+    for col in ingest.STRING_COLUMNS:
+        if col in df_renamed.columns:
+            df_renamed[col] = df_renamed[col].fillna('').astype(str)
+    for col in df_renamed.columns:
+        print(f"{col}: {df_renamed[col].dtype}")
+    model_fields = [column.name for column in LegacySalesData.__table__.columns]
+    return df_renamed[[col for col in df_renamed.columns if col in model_fields]]
+
+
+def fresh_engine(directory, name, metadata=None):
+    """创建一个只包含空表的临时SQLite数据库，默认使用拆分前的宽表结构"""
+    engine = create_engine(f"sqlite:///{os.path.join(directory, name)}")
+    (metadata if metadata is not None else LegacyBase.metadata).create_all(bind=engine)
+    return engine
+
+
+def bench_load(rows):
+    """对比原入库循环与批量入库引擎"""
+    df = make_sales_frame(rows)
+    print(f"\n入库基准: {rows} 行")
+    with tempfile.TemporaryDirectory() as directory:
+        engine = fresh_engine(directory, "legacy.db")
+        session = sessionmaker(bind=engine)()
+        started = time.perf_counter()
+        legacy_save(df, session)
+        legacy_seconds = time.perf_counter() - started
+        session.close()
+        engine.dispose()
+        print(f"原逐行循环: {legacy_seconds:.2f} 秒，{rows / legacy_seconds:,.0f} 行/秒")
+
+        results = {}
+        for method in ("sqlite", "core"):
+            engine = fresh_engine(directory, f"{method}.db")
+            with engine.begin() as connection:
+                stats = loader.bulk_insert(df, connection, table=LegacySalesData.__table__, method=method)
+            engine.dispose()
+            results[method] = stats["seconds"]
+            print(f"批量入库({method}): {stats['seconds']:.2f} 秒，{stats['rows_per_second']:,.0f} 行/秒，"
+                  f"提升 {legacy_seconds / stats['seconds']:.1f} 倍")
+    return legacy_seconds, results
+
+
+def write_workbook(df, path):
+    """把数据按上传文件的中文表头写成xlsx，并附带几列看板不使用的列"""
+    from openpyxl import Workbook
+
+    source = df.rename(columns={mapped: original for original, mapped in ingest.COLUMN_MAPPING.items()})
+    extra_columns = ['ASIN', '备注', '采购员', '上架时间', 'listing标题']
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(source.columns) + extra_columns)
+    extra_values = ['B0EXAMPLE', '无', '采购A', '2024-01-01', '这是一段不会被看板使用的较长listing标题文本']
+    for row in source.itertuples(index=False):
+        sheet.append(list(row) + extra_values)
+    workbook.save(path)
+
+
+def bench_excel(rows):
+    """对比Excel读取方式（读取 + 清洗）"""
+    df = make_sales_frame(rows)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.xlsx")
+        print(f"\n生成 {rows} 行的测试工作簿...")
+        write_workbook(df, path)
+        print(f"Excel读取基准: {rows} 行，文件大小 {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+        timings = {}
+        for reader in ("pandas", "fast", "calamine"):
+            if ingest._resolve_excel_reader(path, reader) != reader:
+                print(f"{reader}: 未安装，跳过")
+                continue
+            started = time.perf_counter()
+            total_rows = sum(len(ingest.process_data(chunk))
+                             for chunk in ingest.iter_excel_chunks(path, path, reader=reader))
+            timings[reader] = time.perf_counter() - started
+            speedup = timings["pandas"] / timings[reader]
+            print(f"{reader}: {timings[reader]:.2f} 秒，{total_rows / timings[reader]:,.0f} 行/秒，"
+                  f"提升 {speedup:.1f} 倍")
+    return timings
+
+
+def _peak_rss_bytes():
+    """当前进程的峰值常驻内存（Linux读取VmHWM，其他系统使用ru_maxrss）"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _measure_clean(variant, csv_path, queue):
+    """在独立进程中执行一种读取+清洗方式，返回耗时和相对导入后基线的峰值内存增量"""
+    baseline = _peak_rss_bytes()
+    started = time.perf_counter()
+    if variant == "legacy":
+        cleaned = legacy_process_data(pd.read_csv(csv_path))
+    else:
+        cleaned = pd.concat([ingest.process_data(chunk)
+                             for chunk in ingest.iter_file_chunks(csv_path, csv_path, chunk_rows=10 ** 9)])
+    seconds = time.perf_counter() - started
+    queue.put((seconds, _peak_rss_bytes() - baseline, int(cleaned.memory_usage(deep=True).sum())))
+
+
+def bench_clean(rows):
+    """对比原read_csv+逐列清洗与声明类型读取+按SALES_SCHEMA单次清洗的耗时和峰值内存"""
+    import multiprocessing
+
+    df = make_sales_frame(rows).rename(
+        columns={mapped: original for original, mapped in ingest.COLUMN_MAPPING.items()})
+    print(f"\n清洗基准: {rows} 行")
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "bench.csv")
+        df.to_csv(csv_path, index=False)
+
+        results = {}
+        for variant, name in (("legacy", "原逐列清洗"), ("schema", "按SALES_SCHEMA单次清洗")):
+            queue = context.Queue()
+            process = context.Process(target=_measure_clean, args=(variant, csv_path, queue))
+            process.start()
+            seconds, peak, size = queue.get()
+            process.join()
+            results[variant] = (seconds, peak, size)
+            print(f"{name}: {seconds:.2f} 秒，峰值内存增量 {peak / 1024 / 1024:.0f} MB，"
+                  f"清洗结果占用 {size / 1024 / 1024:.1f} MB")
+    return results
+
+
+# 拆分前宽表上的等价查询
+LEGACY_QUERIES = {
+    "本周销售额Top10商品": """
+        SELECT sku, product_name, SUM(sales_amount) AS value FROM sales_data
+        WHERE week = '本周' GROUP BY sku, product_name ORDER BY value DESC LIMIT 10""",
+    "全部周销量Top10商品": """
+        SELECT sku, product_name, SUM(sales_volume) AS value FROM sales_data
+        GROUP BY sku, product_name ORDER BY value DESC LIMIT 10""",
+    "本周各平台汇总": """
+        SELECT platform, SUM(sales_amount), SUM(sales_volume), SUM(order_count) FROM sales_data
+        WHERE week = '本周' GROUP BY platform""",
+    "销售人员周环比": """
+        SELECT sales_person,
+            SUM(CASE WHEN week = '本周' THEN sales_amount ELSE 0 END) AS current_amount,
+            SUM(CASE WHEN week = '上周' THEN sales_amount ELSE 0 END) AS previous_amount,
+            SUM(CASE WHEN week = '本周' THEN sales_volume ELSE 0 END) AS current_volume,
+            SUM(CASE WHEN week = '上周' THEN sales_volume ELSE 0 END) AS previous_volume,
+            SUM(CASE WHEN week = '本周' THEN order_count ELSE 0 END) AS current_orders,
+            SUM(CASE WHEN week = '上周' THEN order_count ELSE 0 END) AS previous_orders,
+            AVG(CASE WHEN week = '本周' THEN profit_rate ELSE NULL END) AS current_profit_rate,
+            AVG(CASE WHEN week = '上周' THEN profit_rate ELSE NULL END) AS previous_profit_rate
+        FROM sales_data GROUP BY sales_person
+        HAVING current_amount > 0 OR previous_amount > 0 ORDER BY current_amount DESC""",
+}
+
+# 同一组查询在新结构上直接调用models中的分析函数（读取汇总表）
+STAR_QUERIES = {
+    "本周销售额Top10商品": lambda db: models.get_top_sales_amount(db, week="本周", limit=10),
+    "全部周销量Top10商品": lambda db: models.get_top_sales_volume(db, limit=10),
+    "本周各平台汇总": lambda db: models.query_by_dimension(
+        db, "platform",
+        func.sum(models.SalesRollup.sales_amount).label("sales_amount"),
+        func.sum(models.SalesRollup.sales_volume).label("sales_volume"),
+        func.sum(models.SalesRollup.order_count).label("order_count"),
+        period_type="week", period="本周"
+    ).all(),
+    "销售人员周环比": models.get_salesperson_comparison,
+}
+
+# 看板上的全部面板
+PANEL_QUERIES = {
+    "本周销量Top": lambda db: models.get_top_sales_volume(db, week="本周"),
+    "本周销售额Top": lambda db: models.get_top_sales_amount(db, week="本周"),
+    "销售额增长Top": models.get_top_increased_sales_amount,
+    "销售额下降Top": models.get_top_decreased_sales_amount,
+    "国家分布": models.get_country_sales_distribution,
+    "平台环比": models.get_platform_comparison,
+    "销售人员环比": models.get_salesperson_comparison,
+    "本周无订单商品": models.get_no_orders_this_week,
+    "月销量Top": models.get_month_top_sales_volume,
+    "月销量增长Top": models.get_month_top_increased_sales_volume,
+    "月国家分布": models.get_month_country_sales_distribution,
+    "月平台对比": models.get_month_platform_comparison,
+    "月销售人员对比": models.get_month_salesperson_comparison,
+}
+
+
+def load_star(engine, df):
+    """按save_to_database的方式写入事实表、维度表、汇总表和周期目录"""
+    fact = dimensions.DimensionResolver(engine).resolve(df)
+    rollup = rollups.RollupBuilder()
+    rollup.add(fact)
+    rollup_frame = rollup.frame()
+    with engine.begin() as connection:
+        loader.bulk_insert(fact, connection)
+        loader.bulk_insert(rollup_frame, connection, table=models.SalesRollup.__table__)
+        loader.bulk_insert(rollups.catalog_frame(rollup_frame), connection, table=models.PeriodCatalog.__table__)
+
+
+def _object_sizes(engine):
+    """返回SQLite中每张表/索引占用的字节数"""
+    with engine.connect() as connection:
+        rows = connection.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")).fetchall()
+    return {name: size for name, size in rows}
+
+
+def _best_of(function, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_star(rows):
+    """对比宽表与事实表+维度表：存储大小和分析查询耗时"""
+    df = make_sales_frame(rows)
+    print(f"\n星型模型基准: {rows} 行")
+    with tempfile.TemporaryDirectory() as directory:
+        wide = fresh_engine(directory, "wide.db")
+        with wide.begin() as connection:
+            loader.bulk_insert(df, connection, table=LegacySalesData.__table__)
+
+        star = fresh_engine(directory, "star.db", metadata=models.Base.metadata)
+        load_star(star, df)
+
+        for engine in (wide, star):
+            with engine.connect() as connection:
+                connection.execute(text("ANALYZE"))
+                connection.commit()
+
+        wide_sizes, star_sizes = _object_sizes(wide), _object_sizes(star)
+        wide_fact = sum(size for name, size in wide_sizes.items() if "sales" in name)
+        star_fact = sum(size for name, size in star_sizes.items() if "sales_data" in name)
+        star_rollup = sum(size for name, size in star_sizes.items() if "sales_rollup" in name)
+        star_dims = sum(size for name, size in star_sizes.items() if name.startswith(("dim_", "sqlite_autoindex_dim", "ix_dim", "uq_dim")))
+        print(f"宽表+索引: {wide_fact / 1024 / 1024:.1f} MB，数据库文件 {sum(wide_sizes.values()) / 1024 / 1024:.1f} MB")
+        print(f"事实表+索引: {star_fact / 1024 / 1024:.1f} MB，汇总表 {star_rollup / 1024 / 1024:.1f} MB，"
+              f"维度表 {star_dims / 1024 / 1024:.1f} MB，"
+              f"数据库文件 {sum(star_sizes.values()) / 1024 / 1024:.1f} MB")
+
+        timings = {}
+        wide_session = sessionmaker(bind=wide)()
+        star_session = sessionmaker(bind=star)()
+        for name, sql in LEGACY_QUERIES.items():
+            wide_seconds = _best_of(lambda: wide_session.execute(text(sql)).fetchall())
+            star_seconds = _best_of(lambda: STAR_QUERIES[name](star_session))
+            timings[name] = (wide_seconds, star_seconds)
+            print(f"{name}: 宽表 {wide_seconds * 1000:.1f} ms，汇总表 {star_seconds * 1000:.1f} ms，"
+                  f"提升 {wide_seconds / star_seconds:.1f} 倍")
+        wide_session.close()
+        star_session.close()
+        wide.dispose()
+        star.dispose()
+    return timings
+
+
+def bench_panels(sizes):
+    """在不同数据量下测量每个看板面板的耗时：面板读取汇总表，耗时只随商品/国家数变化"""
+    timings = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sizes:
+            engine = fresh_engine(directory, f"panels_{rows}.db", metadata=models.Base.metadata)
+            load_star(engine, make_sales_frame(rows))
+            with engine.connect() as connection:
+                connection.execute(text("ANALYZE"))
+                connection.commit()
+            session = sessionmaker(bind=engine)()
+            timings[rows] = {name: _best_of(lambda: query(session)) for name, query in PANEL_QUERIES.items()}
+            session.close()
+            engine.dispose()
+
+    print(f"\n看板面板耗时（ms），数据量: {', '.join(str(rows) for rows in sizes)}")
+    for name in PANEL_QUERIES:
+        print(f"{name}: " + " / ".join(f"{timings[rows][name] * 1000:.1f}" for rows in sizes))
+    return timings
+
+
+def bench_dashboard(rows):
+    """对比周看板的十个独立接口（每个接口一个会话）与 /analysis/weekly-dashboard/ 合并接口"""
+    import main
+    import cache
+
+    weekly_endpoints = [
+        lambda db: main.get_top_sales_volume(week=None, db=db),
+        lambda db: main.get_top_sales_amount(week=None, db=db),
+        main.get_top_increased,
+        main.get_top_decreased,
+        main.get_country_distribution,
+        main.get_platform_comparison,
+        lambda db: main.get_platform_detail(db=db),
+        lambda db: main.get_salesperson_comparison(db=db),
+        lambda db: main.get_platform_sales_distribution(db=db),
+        main.get_no_orders_this_week,
+    ]
+    print(f"\n周看板基准: {rows} 行")
+    with tempfile.TemporaryDirectory() as directory:
+        engine = fresh_engine(directory, "dashboard.db", metadata=models.Base.metadata)
+        load_star(engine, make_sales_frame(rows))
+        Session = sessionmaker(bind=engine)
+
+        # 每轮开始前清空分析结果缓存，测量的是实际查询耗时
+        def separate():
+            cache.results.clear()
+            for endpoint in weekly_endpoints:
+                db = Session()
+                try:
+                    endpoint(db)
+                finally:
+                    db.close()
+
+        def bundled():
+            cache.results.clear()
+            db = Session()
+            try:
+                main.get_weekly_dashboard(db=db)
+            finally:
+                db.close()
+
+        separate_seconds = _best_of(separate)
+        bundled_seconds = _best_of(bundled)
+        engine.dispose()
+    print(f"十个接口逐个查询: {separate_seconds * 1000:.1f} ms，合并接口: {bundled_seconds * 1000:.1f} ms，"
+          f"提升 {separate_seconds / bundled_seconds:.1f} 倍")
+    return separate_seconds, bundled_seconds
+
+
+def bench_engine(rows):
+    """对比每个分析函数在SQL与内存列式引擎上的耗时，两者结果必须完全一致"""
+    queries = dict(PANEL_QUERIES)
+    queries.update({
+        "全部周销量Top": lambda db: models.get_top_sales_volume(db),
+        "月销售额Top": models.get_month_top_sales_amount,
+        "月销量下降Top": models.get_month_top_decreased_sales_volume,
+        "周看板商品面板": lambda db: models.get_weekly_product_panels(db),
+        "月份列表": models.get_available_months,
+    })
+    print(f"\n内存引擎基准: {rows} 行")
+    with tempfile.TemporaryDirectory() as directory:
+        engine = fresh_engine(directory, "engine.db", metadata=models.Base.metadata)
+        load_star(engine, make_sales_frame(rows))
+        with engine.connect() as connection:
+            connection.execute(text("ANALYZE"))
+            connection.commit()
+        load_seconds = _best_of(lambda: columnar.load(engine), repeat=1)
+
+        Session = sessionmaker(bind=engine)
+        sql_session, memory_session = Session(), Session()
+        sql_session.info["columnar_store"] = None   # 强制走SQL
+        timings, mismatches = {}, []
+        for name, query in queries.items():
+            if query(sql_session) != query(memory_session):
+                mismatches.append(name)
+            timings[name] = (_best_of(lambda: query(sql_session)), _best_of(lambda: query(memory_session)))
+        sql_session.close()
+        memory_session.close()
+        columnar.unload(engine)
+        engine.dispose()
+
+    print(f"载入内存: {load_seconds * 1000:.0f} ms")
+    for name, (sql_seconds, memory_seconds) in timings.items():
+        print(f"{name}: SQL {sql_seconds * 1000:.2f} ms，内存 {memory_seconds * 1000:.2f} ms，"
+              f"提升 {sql_seconds / memory_seconds:.1f} 倍")
+    total_sql = sum(sql for sql, _ in timings.values())
+    total_memory = sum(memory for _, memory in timings.values())
+    print(f"合计: SQL {total_sql * 1000:.1f} ms，内存 {total_memory * 1000:.1f} ms，提升 {total_sql / total_memory:.1f} 倍")
+    print("结果一致" if not mismatches else f"结果不一致: {', '.join(mismatches)}")
+    return timings, mismatches
+
+
+def bench_archive(uploads, rows):
+    """模拟每月一次上传写入历史归档，对比只读一个月分区与读取全部归档的趋势查询"""
+    print(f"\n历史归档基准: {uploads} 次上传，每次 {rows} 行")
+    with tempfile.TemporaryDirectory() as directory:
+        archive.ARCHIVE_DIR = directory
+        months = [f"{2020 + index // 12}-{index % 12 + 1:02d}" for index in range(uploads)]
+        write_seconds = 0
+        for index, month in enumerate(months):
+            df = make_sales_frame(rows, seed=index)
+            df["month"] = month
+            started = time.perf_counter()
+            writer = archive.ArchiveWriter(f"upload{index:04d}", f"{month}.xlsx")
+            writer.add(df)
+            writer.commit()
+            write_seconds += time.perf_counter() - started
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(directory) for name in names)
+
+        one_month = _best_of(lambda: archive.query(["sales_amount"], "platform", periods=[months[-1]]))
+        all_months = _best_of(lambda: archive.query(["sales_amount", "profit_rate"], "platform"))
+    print(f"归档写入: 平均每次 {write_seconds / uploads * 1000:.0f} ms，归档大小 {size / 1024 / 1024:.1f} MB")
+    print(f"单月趋势（分区裁剪）: {one_month * 1000:.1f} ms，全部 {uploads} 个月: {all_months * 1000:.1f} ms")
+    return write_seconds, one_month, all_months
+
+
+def bench_rolling(rows):
+    """对比每周导入：上传本周+上周两周数据的CSV整表导入，与只上传本周数据的滚动导入（含解析清洗）"""
+    import main
+    from datetime import date
+    from sqlalchemy.orm import sessionmaker
+
+    last_week, this_week = date(2024, 10, 9), date(2024, 10, 16)
+    original_columns = {mapped: original for original, mapped in ingest.COLUMN_MAPPING.items()}
+    previous = make_sales_frame(rows, seed=1).assign(week="本周")
+    current = make_sales_frame(rows, seed=2).assign(week="本周")
+    print(f"\n滚动导入基准: 每周 {rows} 行")
+    with tempfile.TemporaryDirectory() as directory:
+        archive.ARCHIVE_DIR = os.path.join(directory, "archive")
+        main.frame_cache.FRAME_CACHE_DIR = os.path.join(directory, "cache")
+        files = {}
+        for name, df in (("previous", previous), ("full", pd.concat([previous.assign(week="上周"), current])),
+                         ("current", current)):
+            files[name] = os.path.join(directory, f"{name}.csv")
+            df.rename(columns=original_columns).to_csv(files[name], index=False)
+        upload = lambda name: ingest.iter_clean_chunks(files[name], f"{name}.csv")
+
+        timings = {}
+        for label, name, rolling in (("整表导入两周", "full", False), ("滚动导入本周", "current", True)):
+            engine = fresh_engine(directory, f"{name}.db", metadata=models.Base.metadata)
+            db = sessionmaker(bind=engine)()
+            main.save_to_database(upload("previous"), db, as_of=last_week)
+            started = time.perf_counter()
+            main.save_to_database(upload(name), db, as_of=this_week, rolling=rolling)
+            timings[label] = time.perf_counter() - started
+            with engine.connect() as connection:
+                weeks = dict(connection.execute(text("SELECT week, COUNT(*) FROM sales_data GROUP BY week")).fetchall())
+            db.close()
+            engine.dispose()
+            print(f"{label}: {timings[label]:.2f} 秒，导入后各周行数 {weeks}")
+    full, rolled = timings["整表导入两周"], timings["滚动导入本周"]
+    print(f"滚动导入耗时为整表导入的 {rolled / full * 100:.0f}%")
+    return timings
+
+def bench_upsert(rows, corrections):
+    """在rows行数据上修正corrections行：按自然键upsert与整表重新导入修正后的数据"""
+    import main
+    from datetime import date
+    from sqlalchemy.orm import sessionmaker
+
+    as_of = date(2024, 10, 16)
+    df = make_sales_frame(rows)
+    picked = df.sample(corrections, random_state=1).index
+    corrected = df.copy()
+    corrected.loc[picked, "sales_amount"] = (corrected.loc[picked, "sales_amount"] * 1.1).round(2)
+    chunks = lambda frame: [frame.iloc[start:start + 50000] for start in range(0, len(frame), 50000)]
+    print(f"\n增量修正基准: {rows} 行中修正 {corrections} 行")
+    with tempfile.TemporaryDirectory() as directory:
+        archive.ARCHIVE_DIR = os.path.join(directory, "archive")
+        main.frame_cache.FRAME_CACHE_DIR = os.path.join(directory, "cache")
+        engine = fresh_engine(directory, "upsert.db", metadata=models.Base.metadata)
+        db = sessionmaker(bind=engine)()
+        main.save_to_database(chunks(df), db, as_of=as_of)
+
+        started = time.perf_counter()
+        main.save_to_database([corrected.loc[picked]], db, as_of=as_of, upsert=True)
+        upsert_seconds = time.perf_counter() - started
+        with engine.connect() as connection:
+            upserted = connection.execute(text("SELECT COUNT(*), SUM(sales_amount) FROM sales_data")).first()
+
+        started = time.perf_counter()
+        main.save_to_database(chunks(corrected), db, as_of=as_of)
+        reload_seconds = time.perf_counter() - started
+        with engine.connect() as connection:
+            reloaded = connection.execute(text("SELECT COUNT(*), SUM(sales_amount) FROM sales_data")).first()
+        db.close()
+        engine.dispose()
+    print(f"增量修正: {upsert_seconds:.2f} 秒，整表重新导入: {reload_seconds:.2f} 秒，"
+          f"快 {reload_seconds / upsert_seconds:.0f} 倍")
+    print("两种方式结果一致" if upserted[0] == reloaded[0] and abs(upserted[1] - reloaded[1]) < 1e-6 * abs(reloaded[1])
+          else f"结果不一致: {tuple(upserted)} / {tuple(reloaded)}")
+    return upsert_seconds, reload_seconds
+
+
+def make_order_lines(lines, seed=42):
+    """生成ERP导出的原始订单行：每行一个商品，带下单时间，店铺、仓库、销售人员由商品决定"""
+    rng = np.random.default_rng(seed)
+    product = rng.integers(0, 5000, lines)
+    shop = product % 20
+    return pd.DataFrame({
+        'sku': pd.Series(product).map(lambda i: f"SKU{i:05d}"),
+        'spu': pd.Series(product // 4).map(lambda i: f"SPU{i:04d}"),
+        '名称': pd.Series(product).map(lambda i: f"产品名称{i}"),
+        '店铺': pd.Series(shop).map(lambda i: f"店铺{i + 1}"),
+        '站点': np.array(['US', 'UK', 'DE', 'JP'])[shop % 4],
+        '仓库': np.array(['W1', 'W2', 'W3'])[product % 3],
+        '销量': rng.integers(1, 4, lines).astype(float),
+        '销售额': (rng.random(lines) * 100).round(2),
+        '买家国家': np.array(['美国', '英国', '德国', '法国', '日本', '加拿大'])[rng.integers(0, 6, lines)],
+        '平台': np.array(['Amazon', 'eBay', 'Temu', 'Shopee', 'Walmart'])[shop % 5],
+        '销售': np.array(['张三', '李四', '王五', '赵六'])[product % 4],
+        '销售毛利额': (rng.random(lines) * 20).round(2),
+        '订单状态': '完成',
+        '订单日期': pd.Timestamp("2024-08-01") + pd.to_timedelta(rng.integers(0, 77 * 24 * 60, lines), unit="min"),
+    })
+
+
+def bench_orders(lines):
+    """同一份订单行CSV：逐行作为事实行导入（周、月由订单日期推算），与订单级导入先汇总再入库"""
+    import main
+    import orders
+    import jobs
+    from datetime import date
+    from sqlalchemy.orm import sessionmaker
+
+    as_of = date(2024, 10, 16)
+    df = make_order_lines(lines)
+    print(f"\n订单级导入基准: {lines} 行订单")
+    with tempfile.TemporaryDirectory() as directory:
+        archive.ARCHIVE_DIR = os.path.join(directory, "archive")
+        path = os.path.join(directory, "orders.csv")
+        df.to_csv(path, index=False)
+        # 逐行导入的对照组：每行订单按同样规则标注周、月，订单数为1
+        days = df['订单日期'].dt.normalize()
+        mondays = days - pd.to_timedelta(days.dt.weekday, unit="D")
+        line_path = os.path.join(directory, "lines.csv")
+        df.assign(周=mondays.map({monday: orders.week_label(monday.date(), as_of) for monday in mondays.unique()}),
+                  月=days.dt.strftime("%Y-%m"), 订单数=1,
+                  毛利率=(df['销售毛利额'] / df['销售额'].where(df['销售额'] != 0) * 100).fillna(0)
+                  ).to_csv(line_path, index=False)
+        del df
+
+        results = {}
+        for label, file_path, cleaner in (("逐行入库", line_path, None),
+                                          ("订单级汇总后入库", path, orders.clean_order_chunk)):
+            engine = fresh_engine(directory, f"{len(results)}.db", metadata=models.Base.metadata)
+            db = sessionmaker(bind=engine)()
+            started = time.perf_counter()
+            frames = ingest.iter_clean_chunks(file_path, os.path.basename(file_path), jobs.manager.parser_pool(),
+                                              cleaner=cleaner)
+            if cleaner is not None:
+                frames = orders.aggregate(frames, anchor=as_of)
+            rows = main.save_to_database(frames, db, as_of=as_of)
+            seconds = time.perf_counter() - started
+            with engine.connect() as connection:
+                totals = connection.execute(text(
+                    "SELECT SUM(sales_amount), SUM(order_count) FROM sales_data"
+                )).first()
+                size = connection.execute(text(
+                    "SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()"
+                )).scalar()
+            db.close()
+            engine.dispose()
+            results[label] = (seconds, rows, tuple(totals))
+            print(f"{label}: {seconds:.2f} 秒，事实表 {rows} 行，数据库 {size / 1024 / 1024:.1f} MB")
+    (line_seconds, line_rows, line_totals), (order_seconds, order_rows, order_totals) = results.values()
+    print(f"订单行汇总为 {order_rows} 行（{line_rows / max(order_rows, 1):.1f} 行合并为1行），"
+          f"导入快 {line_seconds / order_seconds:.1f} 倍")
+    consistent = abs(line_totals[0] - order_totals[0]) < 1e-6 * abs(line_totals[0]) and line_totals[1] == order_totals[1]
+    print("销售额、订单数合计一致" if consistent else f"合计不一致: {line_totals} / {order_totals}")
+    return results
+
+
+def bench_formats(rows):
+    """各上传格式的文件大小与解析清洗耗时（单进程，与导入时每块的处理相同）"""
+    import gzip
+    import zipfile
+
+    df = make_sales_frame(rows)
+    source = df.rename(columns={mapped: original for original, mapped in ingest.COLUMN_MAPPING.items()})
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"\n生成 {rows} 行的各格式测试文件...")
+        paths = {name: os.path.join(directory, f"bench{name}") for name in
+                 (".xlsx", ".csv", ".csv.gz", ".zip", ".ndjson", ".ndjson.gz", ".parquet")}
+        write_workbook(df, paths[".xlsx"])
+        source.to_csv(paths[".csv"], index=False)
+        with open(paths[".csv"], "rb") as csv_file, gzip.open(paths[".csv.gz"], "wb") as output:
+            output.write(csv_file.read())
+        with zipfile.ZipFile(paths[".zip"], "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.write(paths[".csv"], "bench.csv")
+        source.to_json(paths[".ndjson"], orient="records", lines=True, force_ascii=False)
+        source.to_json(paths[".ndjson.gz"], orient="records", lines=True, force_ascii=False, compression="gzip")
+        if importlib.util.find_spec("pyarrow"):
+            source.to_parquet(paths[".parquet"])
+        else:
+            del paths[".parquet"]
+            print(".parquet: 未安装pyarrow，跳过")
+
+        print(f"上传格式基准: {rows} 行")
+        timings = {}
+        for name, path in paths.items():
+            started = time.perf_counter()
+            total_rows = sum(len(chunk) for chunk in ingest.iter_clean_chunks(path, os.path.basename(path)))
+            timings[name] = time.perf_counter() - started
+            print(f"{name:>11}: {os.path.getsize(path) / 1024 / 1024:7.1f} MB，{timings[name]:6.2f} 秒，"
+                  f"{total_rows / timings[name]:,.0f} 行/秒，比xlsx快 {timings['.xlsx'] / timings[name]:.1f} 倍")
+    return timings
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "load"
+    if mode == "load":
+        bench_load(int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
+    elif mode == "clean":
+        bench_clean(int(sys.argv[2]) if len(sys.argv) > 2 else 500000)
+    elif mode == "star":
+        bench_star(int(sys.argv[2]) if len(sys.argv) > 2 else 200000)
+    elif mode == "panels":
+        bench_panels([int(rows) for rows in sys.argv[2:]] or [100000, 1000000])
+    elif mode == "dashboard":
+        bench_dashboard(int(sys.argv[2]) if len(sys.argv) > 2 else 200000)
+    elif mode == "engine":
+        bench_engine(int(sys.argv[2]) if len(sys.argv) > 2 else 1000000)
+    elif mode == "archive":
+        bench_archive(int(sys.argv[2]) if len(sys.argv) > 2 else 24, int(sys.argv[3]) if len(sys.argv) > 3 else 100000)
+    elif mode == "rolling":
+        bench_rolling(int(sys.argv[2]) if len(sys.argv) > 2 else 200000)
+    elif mode == "upsert":
+        bench_upsert(int(sys.argv[2]) if len(sys.argv) > 2 else 1000000, int(sys.argv[3]) if len(sys.argv) > 3 else 5000)
+    elif mode == "orders":
+        bench_orders(int(sys.argv[2]) if len(sys.argv) > 2 else 2000000)
+    elif mode == "formats":
+        bench_formats(int(sys.argv[2]) if len(sys.argv) > 2 else 500000)
+    elif mode == "excel":
+        bench_excel(int(sys.argv[2]) if len(sys.argv) > 2 else 200000)
+    else:
+        print(__doc__)
@@ -0,0 +1,157 @@
+import os
+import pickle
+import hashlib
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+import database
+import models
+
+# 分析结果缓存的容量上限（字节），超出后按最近最少使用淘汰
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv("ANALYSIS_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+class _Pending:
+    """正在计算中的缓存项，同一个键的并发请求等待同一次计算"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """进程内的分析结果缓存
+
+    每个结果记录计算时读到的数据版本（models.DatasetVersion，发布新数据时在数据库中递增），
+    每次查找都读取当前版本，任何一个进程导入发布后，所有进程中旧版本的结果都不再使用；
+    按结果序列化后的字节数计容量，超出上限时淘汰最久未使用的结果。
+    缓存的结果由所有请求共享，调用方不能修改。
+    """
+
+    def __init__(self, bind, max_bytes=ANALYSIS_CACHE_MAX_BYTES):
+        self.bind = bind
+        self.max_bytes = max_bytes
+        self.version = None             # 最近一次读到的数据版本
+        self._entries = OrderedDict()   # key -> (version, value, size)
+        self._pending = {}              # (key, version) -> _Pending
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def current_version(self, db=None):
+        """读取当前发布的数据版本；传入会话时在该会话中读取，与它随后读到的数据一致"""
+        return models.get_dataset_version(db if db is not None else self.bind)
+
+    def clear(self):
+        """清空本进程缓存的结果"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_or_compute(self, key, compute, db=None):
+        """返回key对应的当前版本结果，没有时调用compute()计算；同一个键的并发未命中只计算一次"""
+        version = self.current_version(db)
+        with self._lock:
+            if version != self.version:
+                # 数据已重新发布：旧版本的结果全部丢弃
+                self.version = version
+                self._entries.clear()
+                self._bytes = 0
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            pending = self._pending.get((key, version))
+            owner = pending is None
+            if owner:
+                pending = self._pending[(key, version)] = _Pending()
+                self.misses += 1
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = compute()
+        except Exception as e:
+            pending.error = e
+            raise
+        else:
+            self._store(key, version, pending.value)
+        finally:
+            with self._lock:
+                self._pending.pop((key, version), None)
+            pending.done.set()
+        return pending.value
+
+    def _store(self, key, version, value):
+        try:
+            size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return
+        with self._lock:
+            # 计算期间已有请求读到更新的数据版本，或单个结果超过容量上限时不缓存
+            if version != self.version or size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (version, value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def etag(self, *parts):
+        """由数据库中当前的数据版本和请求参数生成强ETag"""
+        version = self.current_version()
+        # 不含进程内的状态：各工作进程对同一份数据给出相同的ETag，任一进程发布新数据后都会变化
+        digest = hashlib.sha1("\x1f".join([str(version), *parts]).encode("utf-8")).hexdigest()
+        return f'"{digest[:24]}"'
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+results = ResultCache(database.engine)
+
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match请求头中是否包含etag（支持多个值、弱校验前缀W/和*）"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(
+        (candidate[2:] if candidate.startswith("W/") else candidate) == etag for candidate in candidates
+    )
+
+
+def cached(function):
+    """按函数名和参数缓存分析接口的结果，数据库会话参数db不参与缓存键"""
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # 补齐默认值，省略参数和显式传入默认值得到同一个键
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (function.__qualname__,) + tuple(
+            (name, value) for name, value in bound.arguments.items() if name != "db"
+        )
+        return results.get_or_compute(key, lambda: function(*bound.args, **bound.kwargs),
+                                      db=bound.arguments.get("db"))
+    return wrapper
@@ -0,0 +1,389 @@
+"""常驻内存的列式分析引擎（可选）
+
+设置 ANALYSIS_ENGINE=memory 后，启动时和每次导入发布后把汇总表、维度表和周期目录读入内存：
+每个 (周期类型, 维度) 的汇总行按周期排成连续切片，维度成员预先编码为按维度属性排序的整数组号。
+models中的比较、商品排行和周期目录查询改为在内存中用bincount分组求和、argpartition取Top，
+返回与SQL路径相同的行（字段名、取值、NULL语义和排序都一致），不再经过数据库往返。
+"""
+import os
+import time
+import threading
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, inspect, Integer
+from sqlalchemy.orm import Session
+import database
+import models
+import rollups
+
+# sql: 所有分析查询读数据库（默认）；memory: 读常驻内存的列式数据
+ANALYSIS_ENGINE = os.getenv("ANALYSIS_ENGINE", "sql").lower()
+
+# 每个数据库引擎对应一份内存数据，重新载入时整体替换
+_stores = {}
+_lock = threading.Lock()
+# 每个数据库引擎最近一次载入时的数据版本；其他进程发布新数据后版本变化，本进程在下一个请求时重新载入
+_versions = {}
+_reload_lock = threading.Lock()
+
+
+def enabled():
+    return ANALYSIS_ENGINE == "memory"
+
+
+@lru_cache(maxsize=None)
+def _row_type(fields):
+    """与SQL结果行同名字段的只读行类型"""
+    return namedtuple("Row", fields)
+
+
+def _attribute_key(attributes):
+    """维度属性的排序键：与SQL的ORDER BY一致，NULL排在最前"""
+    return tuple((value is not None, value) for value in attributes)
+
+
+def _top(keys, limit):
+    """keys升序排列后前limit个的位置；并列时保持原顺序（即按维度属性排序）"""
+    if limit is not None and limit < len(keys):
+        if limit <= 0:
+            return np.array([], dtype=np.int64)
+        kth = keys[np.argpartition(keys, limit - 1)[limit - 1]]
+        candidates = np.flatnonzero(keys <= kth)
+    else:
+        candidates = np.arange(len(keys))
+    order = candidates[np.argsort(keys[candidates], kind="stable")]
+    return order if limit is None else order[:limit]
+
+
+def _nullable(values, valid):
+    """数组转为Python值列表，无效位置为None"""
+    return [value if ok else None for value, ok in zip(values.tolist(), valid.tolist())]
+
+
+class _Groups:
+    """维度成员到分组的编码：按比较时的维度属性合并成员，组号顺序即维度属性的升序"""
+
+    def __init__(self, attributes, members=None):
+        self.attributes = tuple(attributes)
+        if members is None or members.empty:
+            ids, tuples = np.array([], dtype=np.int64), []
+        else:
+            ids = members["id"].to_numpy(dtype=np.int64)
+            tuples = [
+                tuple(None if pd.isna(value) else value for value in row)
+                for row in members[list(self.attributes)].itertuples(index=False, name=None)
+            ]
+        # 最后一项对应维度表中不存在或为NULL的成员，属性全部为NULL
+        tuples.append((None,) * len(self.attributes))
+        self.values = sorted(set(tuples), key=_attribute_key)
+        position = {value: code for code, value in enumerate(self.values)}
+        self.ids = pd.Index(ids)
+        self.member_group = np.array([position[value] for value in tuples], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.values)
+
+    def codes_for(self, member_ids):
+        """成员键 -> 组号；找不到的成员（get_indexer返回-1）落到属性全为NULL的组"""
+        return self.member_group[self.ids.get_indexer(member_ids)]
+
+
+class _Block:
+    """一个 (周期类型, 维度) 的全部汇总行，按 (周期, 成员) 排序，每个周期是一段连续切片"""
+
+    def __init__(self, frame, groups, periods, integer_measures):
+        self.groups = groups
+        self.integer_measures = integer_measures
+        member_ids = frame["member_id"].astype("Int64").fillna(-1).to_numpy(dtype=np.int64)
+        period_codes = np.searchsorted(periods, frame["period"].to_numpy(dtype=object))
+        # 与汇总表索引 (period_type, dimension, period, member_id) 的顺序一致
+        order = np.lexsort((member_ids, period_codes))
+        period_codes = period_codes[order]
+        self.group = groups.codes_for(member_ids[order])
+        # 周期起始日期，趋势查询按它筛选和分组；无法识别的周期为NaT
+        self.starts = pd.to_datetime(frame["period_start"]).to_numpy(dtype="datetime64[D]")[order]
+        self.measures = {
+            column: frame[column].fillna(0).to_numpy(
+                dtype=np.int64 if column in integer_measures else np.float64
+            )[order]
+            for column in rollups.MEASURES
+        }
+        boundaries = np.searchsorted(period_codes, np.arange(len(periods) + 1))
+        self.slices = {
+            period: slice(int(boundaries[code]), int(boundaries[code + 1]))
+            for code, period in enumerate(periods) if boundaries[code + 1] > boundaries[code]
+        }
+
+    def rows(self, period=None):
+        """某个周期的行切片，period为None时为全部周期"""
+        if period is None:
+            return slice(None)
+        return self.slices.get(period, slice(0, 0))
+
+    def sums(self, rows, columns):
+        """按组求和，返回 (每组是否有数据, {列: 每组合计})"""
+        codes = self.group[rows]
+        size = len(self.groups)
+        present = np.bincount(codes, minlength=size) > 0
+        totals = {}
+        for column in columns:
+            total = np.bincount(codes, weights=self.measures[column][rows], minlength=size)
+            totals[column] = np.rint(total).astype(np.int64) if column in self.integer_measures else total
+        return present, totals
+
+
+class ColumnarStore:
+    """一份已发布数据的内存列式副本，只读，由load()整体创建和替换"""
+
+    def __init__(self, rollup, members, catalog):
+        integer_measures = {
+            column.name for column in models.SalesRollup.__table__.columns
+            if column.name in rollups.MEASURES and isinstance(column.type, Integer)
+        }
+        self.groups = {}
+        for dimension, key in models.ROLLUP_DIMENSIONS.items():
+            if key is None:
+                self.groups[dimension] = _Groups(())
+            else:
+                _, columns = models.DIMENSIONS[key]
+                attributes = models.COMPARISON_ATTRIBUTES.get(dimension, columns)
+                self.groups[dimension] = _Groups(attributes, members.get(dimension))
+
+        self.blocks = {}
+        rollup = rollup[rollup["period"].notna()]
+        for period_type in rollups.PERIOD_TYPES:
+            of_type = rollup[rollup["period_type"] == period_type]
+            # 周期按字符串排序编码，与汇总表索引中period的顺序一致
+            periods = np.array(sorted(set(of_type["period"])), dtype=object)
+            for dimension in models.ROLLUP_DIMENSIONS:
+                frame = of_type[of_type["dimension"] == dimension]
+                self.blocks[(period_type, dimension)] = _Block(frame, self.groups[dimension], periods, integer_measures)
+
+        # 周期目录：与get_latest_periods相同，按sort_key倒序（NULL在最后）、再按周期倒序
+        self.periods = {}
+        listed = catalog[catalog["period"].notna() & (catalog["period"] != "")]
+        for period_type in rollups.PERIOD_TYPES:
+            entries = listed[listed["period_type"] == period_type]
+            # 同一sort_key内按周期倒序：先整体按周期倒序再稳定排序
+            ordered = sorted(
+                sorted(zip(entries["sort_key"].astype("Int64"), entries["period"]), key=lambda entry: entry[1], reverse=True),
+                key=lambda entry: (pd.isna(entry[0]), 0 if pd.isna(entry[0]) else -int(entry[0])),
+            )
+            self.periods[period_type] = [period for _, period in ordered]
+        # 周期目录中最近的起始日期，与get_latest_period_start一致
+        self.latest_starts = {}
+        for period_type in rollups.PERIOD_TYPES:
+            starts = catalog.loc[catalog["period_type"] == period_type, "period_start"].dropna()
+            self.latest_starts[period_type] = max(starts) if len(starts) else None
+        self.rows = len(rollup)
+
+    def latest_periods(self, period_type, limit=None):
+        periods = self.periods.get(period_type, [])
+        return list(periods if limit is None else periods[:limit])
+
+    def compare(self, dimension, metrics, current, previous, period_type="week",
+                having=None, order_by=None, limit=None, share=False):
+        """与models.compare_periods的SQL语句逐字段一致的内存实现"""
+        block = self.blocks.get((period_type, dimension))
+        groups = self.groups[dimension]
+        columns = sorted({column for metric in metrics for column in models.COMPARISON_METRICS[metric] if column})
+        if block is None:
+            return []
+        # period = NULL在SQL中不匹配任何行
+        empty = slice(0, 0)
+        current_present, current_sums = block.sums(block.rows(current) if current is not None else empty, columns)
+        previous_present, previous_sums = block.sums(block.rows(previous) if previous is not None else empty, columns)
+
+        # 先取出两期任一期有数据的组（即SQL分组后存在的行）
+        selected = np.flatnonzero(current_present | previous_present)
+
+        def period_value(metric, present, sums):
+            value_column, count_column = models.COMPARISON_METRICS[metric]
+            value, valid = sums[value_column][selected], present[selected]
+            if count_column:
+                count = sums[count_column][selected]
+                valid = valid & (count != 0)
+                value = value / np.where(count != 0, count, 1)
+            return value, valid
+
+        outputs = []
+        fields = {}
+        for metric in metrics:
+            current_value, current_valid = period_value(metric, current_present, current_sums)
+            previous_value, previous_valid = period_value(metric, previous_present, previous_sums)
+            delta = np.where(current_valid, current_value, 0) - np.where(previous_valid, previous_value, 0)
+            rate_valid = previous_valid & (previous_value != 0)
+            rate = (np.where(current_valid, current_value, 0) - previous_value) * 1.0 \
+                / np.where(rate_valid, previous_value, 1) * 100
+            outputs += [
+                (f"{metric}_current", current_value, current_valid),
+                (f"{metric}_previous", previous_value, previous_valid),
+                (f"{metric}_delta", delta, np.ones(len(selected), dtype=bool)),
+                (f"{metric}_rate", rate, rate_valid),
+            ]
+            if share and not models.COMPARISON_METRICS[metric][1]:
+                # 占比的分母为同一周期total维度的合计
+                total_block = self.blocks[(period_type, "total")]
+                total_present, total_sums = total_block.sums(
+                    total_block.rows(current), [models.COMPARISON_METRICS[metric][0]]
+                )
+                total = total_sums[models.COMPARISON_METRICS[metric][0]][0].item() if total_present[0] else None
+                share_valid = current_valid & (total is not None and total != 0)
+                share_value = current_value * 1.0 / (total or 1) * 100
+                outputs.append((f"{metric}_share", share_value, share_valid))
+            fields.setdefault("current", (current_value, current_valid))
+            fields.setdefault("previous", (previous_value, previous_valid))
+            fields.setdefault("delta", delta)
+
+        (current_value, current_valid), (previous_value, previous_valid) = fields["current"], fields["previous"]
+        filters = {
+            None: None,
+            "current": current_valid,
+            "both": current_valid & previous_valid,
+            "increased": current_valid & previous_valid & (current_value > previous_value),
+            "decreased": current_valid & previous_valid & (current_value < previous_value),
+            "dropped": previous_valid & ~current_valid,
+            "active": (np.where(current_valid, current_value, 0) > 0) | (np.where(previous_valid, previous_value, 0) > 0),
+        }
+        keep = filters[having]
+        positions = np.arange(len(selected)) if keep is None else np.flatnonzero(keep)
+
+        # selected按组号（维度属性升序）排列；排序字段并列时保持这个顺序
+        if order_by is None:
+            positions = positions if limit is None else positions[:limit]
+        else:
+            field, descending = order_by
+            if field == "delta":
+                keys = fields["delta"][positions]
+            else:
+                value, valid = fields[field]
+                keys = np.where(valid, value, 0)[positions]
+            positions = positions[_top(-keys if descending else keys, limit)]
+
+        names = tuple(groups.attributes) + tuple(name for name, _, _ in outputs)
+        row_type = _row_type(names)
+        attributes = [groups.values[code] for code in selected[positions].tolist()]
+        columns = [_nullable(values[positions], valid[positions]) for _, values, valid in outputs]
+        return [row_type(*attribute, *values) for attribute, values in zip(attributes, zip(*columns))]
+
+    def latest_period_start(self, period_type):
+        return self.latest_starts.get(period_type)
+
+    def trend(self, dimension, columns, period_type, windows, member=None):
+        """与models.trend_statement一致：按period_start合计成员在各起始日期范围内的汇总行
+
+        windows为 [(起始, 结束)] 日期范围；成员按TREND_MEMBER_ATTRIBUTES中的维度属性匹配，total不分成员。
+        返回 {period_start: 行}，行字段为period_start和各汇总列，没有数据的周期不出现。
+        """
+        block = self.blocks.get((period_type, dimension))
+        if block is None:
+            return {}
+        selected = np.zeros(len(block.starts), dtype=bool)
+        for first, last in windows:
+            selected |= (block.starts >= np.datetime64(first, "D")) & (block.starts <= np.datetime64(last, "D"))
+        attribute = models.TREND_MEMBER_ATTRIBUTES[dimension]
+        if attribute:
+            # 与SQL中 维度属性 = :member 一致，NULL不匹配任何成员
+            position = self.groups[dimension].attributes.index(attribute)
+            matching = np.array([
+                values[position] is not None and values[position] == member
+                for values in self.groups[dimension].values
+            ])
+            selected &= matching[block.group]
+        rows = np.flatnonzero(selected)
+        starts, codes = np.unique(block.starts[rows], return_inverse=True)
+        sums = []
+        for column in columns:
+            total = np.bincount(codes, weights=block.measures[column][rows], minlength=len(starts))
+            sums.append((np.rint(total).astype(np.int64) if column in block.integer_measures else total).tolist())
+        row_type = _row_type(("period_start",) + tuple(columns))
+        return {
+            start: row_type(start, *values)
+            for start, values in zip(starts.astype(object).tolist(), zip(*sums) if sums else [()] * len(starts))
+        }
+
+    def top_products(self, measure, period_type="week", period=None, limit=5):
+        """按(sku, 名称)合计商品指标取前limit个，返回 (sku, product_name, value) 行"""
+        block = self.blocks.get((period_type, "product"))
+        if block is None:
+            return []
+        present, sums = block.sums(block.rows(period), [measure])
+        selected = np.flatnonzero(present)
+        values = sums[measure][selected]
+        positions = _top(-values, limit)
+        row_type = _row_type(("sku", "product_name", "value"))
+        groups = self.groups["product"]
+        return [
+            row_type(*groups.values[code], value)
+            for code, value in zip(selected[positions].tolist(), values[positions].tolist())
+        ]
+
+
+def load(bind):
+    """在一个读事务中读取bind当前发布的汇总表、维度表和周期目录，替换内存数据，返回新的ColumnarStore"""
+    started = time.perf_counter()
+    db = Session(bind=bind)
+    try:
+        with database.read_snapshot(db):
+            connection = db.connection()
+            rollup = pd.read_sql_query(select(models.SalesRollup.__table__), connection)
+            members = {}
+            for dimension, key in models.ROLLUP_DIMENSIONS.items():
+                if key is None:
+                    continue
+                model, columns = models.DIMENSIONS[key]
+                table = model.__table__
+                attributes = models.COMPARISON_ATTRIBUTES.get(dimension, columns)
+                members[dimension] = pd.read_sql_query(
+                    select(table.c.id, *[table.c[column] for column in attributes]), connection
+                )
+            catalog = pd.read_sql_query(select(models.PeriodCatalog.__table__), connection)
+    finally:
+        db.close()
+
+    store = ColumnarStore(rollup, members, catalog)
+    with _lock:
+        _stores[bind] = store
+    print(f"内存分析引擎已载入 {store.rows} 行汇总数据，耗时 {time.perf_counter() - started:.2f} 秒")
+    return store
+
+
+def reload(bind):
+    """启用内存引擎时重新载入；载入失败则移除内存数据，分析查询退回SQL"""
+    if not enabled():
+        return None
+    try:
+        _versions[bind] = models.get_dataset_version(bind)
+        if not inspect(bind).has_table(models.SalesRollup.__tablename__):
+            unload(bind)
+            print("尚未导入数据，内存分析引擎将在首次导入后载入")
+            return None
+        return load(bind)
+    except Exception as e:
+        unload(bind)
+        print(f"内存分析引擎载入失败，分析查询改为读取数据库: {str(e)}")
+        return None
+
+
+def unload(bind):
+    with _lock:
+        _stores.pop(bind, None)
+
+
+def for_session(db):
+    """会话应读取的内存数据，没有时返回None（走SQL）
+
+    同一会话第一次取得后固定下来，一个请求内的多个面板读到同一份数据；
+    会话info中预先设为None可强制该会话走SQL。
+    启用内存引擎时先比较数据版本，导入在其他进程中发布时在这里重新载入。
+    """
+    if "columnar_store" not in db.info:
+        bind = db.get_bind()
+        if enabled() and _versions.get(bind) != models.get_dataset_version(db):
+            with _reload_lock:
+                if _versions.get(bind) != models.get_dataset_version(db):
+                    reload(bind)
+        db.info["columnar_store"] = _stores.get(bind)
+    return db.info["columnar_store"]
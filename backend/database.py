@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from sqlalchemy import create_engine, func, exc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -53,6 +54,7 @@ if setup_database():
         pool_timeout=30,
         pool_recycle=1800,  # 30分钟后回收连接
         pool_pre_ping=True,  # 自动检查连接是否可用
+        connect_args={"local_infile": True},  # 允许LOAD DATA LOCAL INFILE批量导入
     )
 else:
     print("无法设置数据库，切换到SQLite作为备用...")
@@ -77,6 +79,21 @@ def get_db():
     finally:
         db.close()
 
+@contextmanager
+def read_snapshot(db):
+    """让同一会话中的多条查询在一个读事务中执行，全部看到同一份数据
+
+    MySQL(InnoDB)默认可重复读，同一事务内本就读取同一快照；SQLite驱动不会为SELECT开启事务，需要显式BEGIN。
+    导入发布时的表切换会等待这个事务结束，不会读到一半旧数据一半新数据。
+    """
+    connection = db.connection()
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("BEGIN")
+    try:
+        yield db
+    finally:
+        db.rollback()
+
 def test_db_connection():
     """测试数据库连接 - 兼容 SQLAlchemy 1.x 和 2.x"""
     max_retries = 3
@@ -0,0 +1,99 @@
+import threading
+import unicodedata
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+import models
+
+# 同一进程内维度表的登记串行执行
+_lock = threading.Lock()
+
+
+def _collation_key(value):
+    """按MySQL utf8mb4_unicode_ci的比较规则归一化：忽略大小写、重音、全半角和末尾空格"""
+    if not isinstance(value, str):
+        return value
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold().rstrip()
+
+
+def member_key(member):
+    """维度成员（属性元组）的查找键：数据库唯一索引视为相同的成员得到相同的键"""
+    return tuple(_collation_key(value) for value in member)
+
+
+class DimensionResolver:
+    """把清洗后的维度字符串列替换为事实表的整数代理键
+
+    维度表只追加、不随导入切换，所有代的事实表共用同一套键；
+    创建时一次性读入已有成员，之后每块数据只对新出现的成员做一次批量INSERT。
+    成员按member_key查找，与MySQL唯一索引的排序规则一致，"Amazon"与"amazon "对应同一个键。
+    """
+
+    def __init__(self, engine, dimensions=None):
+        self.engine = engine
+        self.dimensions = dimensions if dimensions is not None else models.DIMENSIONS
+        self.members = {}
+        with engine.begin() as connection:
+            for key, (model, columns) in self.dimensions.items():
+                model.__table__.create(connection, checkfirst=True)
+                self.members[key] = self._load(connection, model, columns)
+
+    @staticmethod
+    def _load(connection, model, columns, after_id=0):
+        """读取维度成员，返回 {成员查找键: 键}"""
+        table = model.__table__
+        rows = connection.execute(
+            select(table.c.id, *[table.c[column] for column in columns]).where(table.c.id > after_id)
+        )
+        return {member_key(row[1:]): row[0] for row in rows}
+
+    def _register(self, key, model, columns, new_members):
+        """把新成员写入维度表并取回分配的键"""
+        table = model.__table__
+        with _lock:
+            try:
+                with self.engine.begin() as connection:
+                    last_id = connection.execute(select(func.max(table.c.id))).scalar() or 0
+                    connection.execute(table.insert(), [dict(zip(columns, member)) for member in new_members])
+                    self.members[key].update(self._load(connection, model, columns, after_id=last_id))
+            except IntegrityError:
+                # 其他进程刚登记了相同成员：重新读取全部成员后只补登仍缺少的
+                with self.engine.begin() as connection:
+                    self.members[key] = self._load(connection, model, columns)
+                    missing = [member for member in new_members if member_key(member) not in self.members[key]]
+                    if missing:
+                        last_id = connection.execute(select(func.max(table.c.id))).scalar() or 0
+                        connection.execute(table.insert(), [dict(zip(columns, member)) for member in missing])
+                        self.members[key].update(self._load(connection, model, columns, after_id=last_id))
+
+    def keys_for(self, key, df):
+        """返回与df逐行对齐的维度键（可空整数），缺失的属性列按空值处理"""
+        model, columns = self.dimensions[key]
+        # 对属性组合做一次factorize，之后只需按唯一成员查字典，再用codes整体取值
+        codes, uniques = pd.MultiIndex.from_frame(df.reindex(columns=list(columns))).factorize()
+        members = [tuple(None if pd.isna(value) else value for value in member) for member in uniques]
+
+        lookup = [member_key(member) for member in members]
+        known = self.members[key]
+        # 只差大小写或末尾空格的新成员只登记第一次出现的写法
+        new_members = {}
+        for normalized, member in zip(lookup, members):
+            if normalized not in known and normalized not in new_members and any(value is not None for value in member):
+                new_members[normalized] = member
+        if new_members:
+            self._register(key, model, columns, list(new_members.values()))
+            known = self.members[key]
+
+        # 所有属性都为空的行维度键为NULL
+        ids = np.array([known.get(normalized, np.nan) for normalized in lookup], dtype=float)
+        return pd.array(ids[codes], dtype="Int64")
+
+    def resolve(self, df):
+        """返回事实表格式的数据块：各维度属性列替换为对应的 *_id 键列"""
+        dimension_columns = {column for _, columns in self.dimensions.values() for column in columns}
+        result = df.drop(columns=[column for column in df.columns if column in dimension_columns])
+        for key in self.dimensions:
+            result[key] = self.keys_for(key, df)
+        return result
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import shutil
+import threading
+import importlib.util
+import pandas as pd
+
+# 清洗后数据帧的磁盘缓存目录
+FRAME_CACHE_DIR = os.getenv("FRAME_CACHE_DIR", os.path.join("uploads", "cache"))
+
+# 最多保留的缓存条数，超出后删除最早的
+FRAME_CACHE_MAX_ENTRIES = int(os.getenv("FRAME_CACHE_MAX_ENTRIES", 20))
+
+# 有pyarrow时使用Parquet，否则退回pickle
+USE_PARQUET = importlib.util.find_spec("pyarrow") is not None
+
+_INDEX_FILE = "index.json"
+_lock = threading.Lock()
+
+
+def _entry_dir(fingerprint):
+    return os.path.join(FRAME_CACHE_DIR, fingerprint)
+
+
+def _load_index():
+    path = os.path.join(FRAME_CACHE_DIR, _INDEX_FILE)
+    if not os.path.exists(path):
+        return {"current": None, "entries": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_index(index):
+    os.makedirs(FRAME_CACHE_DIR, exist_ok=True)
+    path = os.path.join(FRAME_CACHE_DIR, _INDEX_FILE)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def write_frame(df, path_prefix):
+    """把一块数据写为 path_prefix.parquet（无pyarrow时为.pkl）"""
+    if USE_PARQUET:
+        df.to_parquet(path_prefix + ".parquet", index=False)
+    else:
+        df.to_pickle(path_prefix + ".pkl")
+
+
+def lookup(fingerprint):
+    """返回指纹对应的缓存记录，不存在时返回None"""
+    with _lock:
+        return _load_index()["entries"].get(fingerprint)
+
+
+def current_fingerprint():
+    """当前正式表中数据对应的上传指纹（非缓存导入时为None）"""
+    with _lock:
+        return _load_index().get("current")
+
+
+def is_current(fingerprint):
+    """上传内容是否与当前已发布的数据完全相同"""
+    return fingerprint is not None and current_fingerprint() == fingerprint and lookup(fingerprint) is not None
+
+
+def list_entries():
+    """列出全部缓存记录，最新的在前"""
+    with _lock:
+        index = _load_index()
+    entries = [dict(entry, fingerprint=fingerprint, current=(fingerprint == index.get("current")))
+               for fingerprint, entry in index["entries"].items()]
+    return sorted(entries, key=lambda entry: entry["created_at"], reverse=True)
+
+
+def mark_current(fingerprint):
+    """记录当前发布的数据对应哪次上传；fingerprint为None表示当前数据不来自缓存"""
+    with _lock:
+        index = _load_index()
+        index["current"] = fingerprint
+        _save_index(index)
+
+
+def tee(fingerprint, frames):
+    """边产出清洗后的数据块边写入缓存的临时目录，record后才生效"""
+    partial_dir = _entry_dir(fingerprint) + ".partial"
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    os.makedirs(partial_dir)
+    for index, df in enumerate(frames):
+        write_frame(df, os.path.join(partial_dir, f"part-{index:05d}"))
+        yield df
+
+
+def record(fingerprint, filename, rows, message, as_of=None, rolling=False, upsert=False, orders=False):
+    """导入成功后登记缓存，并淘汰超出数量上限的旧缓存；as_of、rolling、upsert、orders为导入时使用的截止日期和导入方式"""
+    partial_dir = _entry_dir(fingerprint) + ".partial"
+    with _lock:
+        index = _load_index()
+        if os.path.isdir(partial_dir):
+            shutil.rmtree(_entry_dir(fingerprint), ignore_errors=True)
+            os.replace(partial_dir, _entry_dir(fingerprint))
+        index["entries"][fingerprint] = {
+            "filename": filename,
+            "rows": rows,
+            "message": message,
+            "as_of": as_of,
+            "rolling": rolling,
+            "upsert": upsert,
+            "orders": orders,
+            "created_at": time.time()
+        }
+
+        # 按时间淘汰最早的缓存，当前数据对应的缓存保留
+        expired = sorted(
+            (fp for fp in index["entries"] if fp != index.get("current") and fp != fingerprint),
+            key=lambda fp: index["entries"][fp]["created_at"]
+        )
+        while len(index["entries"]) > FRAME_CACHE_MAX_ENTRIES and expired:
+            oldest = expired.pop(0)
+            del index["entries"][oldest]
+            shutil.rmtree(_entry_dir(oldest), ignore_errors=True)
+        _save_index(index)
+
+
+def discard(fingerprint):
+    """导入失败时删除未完成的缓存"""
+    shutil.rmtree(_entry_dir(fingerprint) + ".partial", ignore_errors=True)
+
+
+def read_frame(path):
+    """读取write_frame写入的一块数据，path为完整文件名"""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_pickle(path)
+
+
+def iter_frames(fingerprint):
+    """按写入顺序读取缓存的清洗后数据块，跳过Excel解析和清洗"""
+    entry_dir = _entry_dir(fingerprint)
+    for name in sorted(os.listdir(entry_dir)):
+        if name.endswith((".parquet", ".pkl")):
+            yield read_frame(os.path.join(entry_dir, name))
@@ -0,0 +1,547 @@
+import io
+import os
+import gzip
+import hashlib
+import zipfile
+import importlib.util
+from collections import deque, namedtuple
+from itertools import islice
+from operator import itemgetter
+import numpy as np
+import pandas as pd
+
+# 上传文件按固定大小分块写入磁盘（字节）
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+
+# CSV按行分块解析，每块清洗后立即入库
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", 50000))
+
+# 清洗流程版本，变更清洗规则时递增，使旧的缓存指纹失效
+PIPELINE_VERSION = 2
+
+# 进程池并行清洗时，同时在途的数据块数量（限制内存占用）
+CLEAN_WINDOW = int(os.getenv("CLEAN_WINDOW", 4))
+
+# 按字节范围交给子进程解析CSV时，主进程查找行边界每次扫描的字节数
+CSV_SCAN_BYTES = int(os.getenv("CSV_SCAN_BYTES", 8 * 1024 * 1024))
+
+# Excel读取方式: auto / fast（openpyxl只读流式）/ calamine / pandas（原整表读取）
+EXCEL_READER = os.getenv("EXCEL_READER", "auto")
+EXCEL_READERS = ("auto", "fast", "calamine", "pandas")
+
+# 支持的文件扩展名；.gz为gzip压缩，读取时流式解压
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+CSV_EXTENSIONS = ('.csv', '.csv.gz')
+JSON_LINES_EXTENSIONS = ('.ndjson', '.jsonl', '.ndjson.gz', '.jsonl.gz')
+PARQUET_EXTENSIONS = ('.parquet',)
+ARCHIVE_EXTENSIONS = ('.zip',)
+
+# 可以从头到尾顺序读取的格式（支持只读开头预检、边接收边解析）；Excel、Parquet的目录在文件末尾
+STREAM_EXTENSIONS = CSV_EXTENSIONS + JSON_LINES_EXTENSIONS
+
+SUPPORTED_EXTENSIONS = EXCEL_EXTENSIONS + STREAM_EXTENSIONS + PARQUET_EXTENSIONS + ARCHIVE_EXTENSIONS
+
+# SalesData列的清洗规则：原始表头、模型字段、类型、空值填充
+#   string   - 高基数字符串（sku、名称等）
+#   category - 低基数维度，转为分类类型节省内存
+#   float    - 金额类数值，保持float64精度
+#   integer  - 计数类数值，向下转换为最小整数类型
+ColumnSpec = namedtuple('ColumnSpec', ['source', 'name', 'kind', 'fill'])
+
+SALES_SCHEMA = [
+    ColumnSpec('sku', 'sku', 'string', ''),
+    ColumnSpec('spu', 'spu', 'string', ''),
+    ColumnSpec('名称', 'product_name', 'string', ''),
+    ColumnSpec('店铺', 'shop', 'category', ''),
+    ColumnSpec('站点', 'site', 'category', ''),
+    ColumnSpec('仓库', 'warehouse', 'category', ''),
+    ColumnSpec('销量', 'sales_volume', 'float', 0),
+    ColumnSpec('销售额', 'sales_amount', 'float', 0),
+    ColumnSpec('买家国家', 'buyer_country', 'category', ''),
+    ColumnSpec('平台', 'platform', 'category', ''),
+    ColumnSpec('销售', 'sales_person', 'category', ''),
+    ColumnSpec('订单数', 'order_count', 'integer', 0),
+    ColumnSpec('销售毛利额', 'profit', 'float', 0),
+    ColumnSpec('毛利率', 'profit_rate', 'float', 0),
+    ColumnSpec('周', 'week', 'category', ''),
+    ColumnSpec('订单状态', 'order_status', 'category', ''),
+    ColumnSpec('月', 'month', 'category', ''),
+]
+
+# 表头映射
+COLUMN_MAPPING = {spec.source: spec.name for spec in SALES_SCHEMA}
+
+# 订单级导入的订单日期列：不入事实表，由它推算周、月
+ORDER_DATE_COLUMN = '订单日期'
+
+# 读取文件时保留的原始列
+SOURCE_COLUMNS = set(COLUMN_MAPPING) | {ORDER_DATE_COLUMN}
+
+# 列式文件（Parquet）读取的列：原始表头，以及已经是模型字段名的列
+PARQUET_COLUMNS = SOURCE_COLUMNS | set(COLUMN_MAPPING.values())
+
+# 上传文件必须包含的原始列
+REQUIRED_COLUMNS = ['sku', 'spu', '名称', '销量', '销售额']
+
+# 清洗后必须存在的列（模型字段名）
+REQUIRED_FIELDS = ['sku', 'product_name', 'sales_volume', 'sales_amount', 'week']
+
+# 字符串列（映射后的列名）
+STRING_COLUMNS = [spec.name for spec in SALES_SCHEMA if spec.kind in ('string', 'category')]
+
+# 解析时直接使用的目标类型（按原始列名）：维度列直接解析为分类，字符串列解析为str；
+# 数值列不在解析时声明类型，由清洗时的to_numeric把非法值转为空值
+SOURCE_DTYPES = {
+    spec.source: ('category' if spec.kind == 'category' else str)
+    for spec in SALES_SCHEMA if spec.kind in ('string', 'category')
+}
+
+
+def is_supported_file(filename):
+    """检查文件类型是否支持"""
+    return filename.endswith(SUPPORTED_EXTENSIONS)
+
+
+def _compression(filename):
+    return "gzip" if filename.endswith(".gz") else None
+
+
+async def spool_upload(file, file_path, chunk_size=UPLOAD_CHUNK_SIZE):
+    """按固定大小分块把上传文件写入磁盘，避免整个文件读入内存
+
+    写盘的同时计算内容的SHA-256，返回(写入的字节数, 内容哈希)
+    """
+    total_bytes = 0
+    digest = hashlib.sha256()
+    with open(file_path, "wb") as buffer:
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            buffer.write(chunk)
+            digest.update(chunk)
+            total_bytes += len(chunk)
+    return total_bytes, digest.hexdigest()
+
+
+def fingerprint(*parts):
+    """由内容哈希等信息生成上传指纹，包含清洗流程版本"""
+    return hashlib.sha256("|".join([f"v{PIPELINE_VERSION}", *map(str, parts)]).encode("utf-8")).hexdigest()
+
+
+def _apply_source_dtypes(df):
+    """把原始列转换为目标类型：维度列转分类，字符串列转str（保留空值），数值列转float"""
+    for col in df.columns:
+        dtype = SOURCE_DTYPES.get(col)
+        if dtype is None:
+            if col in COLUMN_MAPPING:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+            continue
+        df[col] = _as_strings(df[col])
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+    return df
+
+
+def _resolve_excel_reader(filename, reader=None):
+    """确定Excel读取方式；fast只支持xlsx，calamine未安装时退回fast"""
+    reader = reader or EXCEL_READER
+    if reader not in EXCEL_READERS:
+        raise ValueError(f"不支持的Excel读取方式: {reader}")
+    if reader == "auto":
+        reader = "calamine" if importlib.util.find_spec("python_calamine") else "fast"
+    if reader == "calamine" and not importlib.util.find_spec("python_calamine"):
+        reader = "fast"
+    if reader == "fast" and filename.endswith('.xls'):
+        reader = "pandas"
+    return reader
+
+
+def iter_excel_fast(file_path, sheet_name=None, chunk_rows=CSV_CHUNK_ROWS):
+    """openpyxl只读模式流式读取xlsx，只保留表头映射中的列，并在读取时转换类型，按块产出"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name is not None else workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        # 只取需要的列，其余列在读取时直接丢弃
+        names = [str(name).strip() if name is not None else None for name in header]
+        positions = [i for i, name in enumerate(names) if name in SOURCE_COLUMNS]
+        columns = [names[i] for i in positions]
+        width = max(positions) + 1 if positions else 0
+        pick = itemgetter(*positions) if len(positions) > 1 else (lambda row: (row[positions[0]],))
+
+        buffer = []
+        yielded = False
+        for row in rows:
+            if not positions:
+                break
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            buffer.append(pick(row))
+            if len(buffer) >= chunk_rows:
+                yield _apply_source_dtypes(pd.DataFrame.from_records(buffer, columns=columns))
+                yielded = True
+                buffer = []
+        if buffer or not yielded:
+            yield _apply_source_dtypes(pd.DataFrame.from_records(buffer, columns=columns))
+    finally:
+        workbook.close()
+
+
+def iter_excel_chunks(file_path, filename, reader=None, chunk_rows=CSV_CHUNK_ROWS, sheet_name=None):
+    """按选定方式读取Excel的一个工作表（默认第一个）"""
+    reader = _resolve_excel_reader(filename, reader)
+    if reader == "fast":
+        yield from iter_excel_fast(file_path, sheet_name=sheet_name, chunk_rows=chunk_rows)
+    elif reader == "calamine":
+        yield pd.read_excel(file_path, engine="calamine", sheet_name=sheet_name if sheet_name is not None else 0,
+                            usecols=lambda col: str(col).strip() in SOURCE_COLUMNS, dtype=SOURCE_DTYPES)
+    else:
+        yield pd.read_excel(file_path, sheet_name=sheet_name if sheet_name is not None else 0)
+
+
+def list_sheets(file_path, filename):
+    """列出Excel文件中的工作表名称"""
+    if importlib.util.find_spec("python_calamine"):
+        from python_calamine import CalamineWorkbook
+        return CalamineWorkbook.from_path(file_path).sheet_names
+    return pd.ExcelFile(file_path).sheet_names
+
+
+def _read_json_block(data):
+    """解析一段JSON Lines：有pyarrow时用多线程解析，同一块内类型不一致（如sku先数字后字符串）时退回pandas"""
+    if importlib.util.find_spec("pyarrow"):
+        import pyarrow
+        import pyarrow.json
+        try:
+            return pyarrow.json.read_json(io.BytesIO(data)).to_pandas()
+        except pyarrow.ArrowInvalid:
+            pass
+    try:
+        return pd.read_json(io.BytesIO(data), lines=True, dtype=False, convert_dates=False)
+    except ValueError as e:
+        raise ValueError(f"JSON Lines格式错误（每行应为一个JSON对象）: {e}")
+
+
+def iter_json_lines(file_path, filename, chunk_rows=CSV_CHUNK_ROWS):
+    """按chunk_rows行分块读取JSON Lines（每行一个对象，.gz流式解压）
+
+    某一块中全部缺失的键补为空列，保证各块的列一致
+    """
+    source = file_path if hasattr(file_path, "read") else open(file_path, "rb")
+    stream = gzip.GzipFile(fileobj=source) if _compression(filename) else source
+    columns = []
+    try:
+        while True:
+            lines = [line for line in islice(stream, chunk_rows) if line.strip()]
+            if not lines:
+                break
+            chunk = _read_json_block(b"".join(lines))
+            columns += [col for col in chunk.columns if col not in columns]
+            yield _apply_source_dtypes(chunk.reindex(columns=columns))
+        if not columns:
+            yield pd.DataFrame()
+    finally:
+        if source is not file_path:
+            source.close()
+
+
+def iter_parquet(file_path, chunk_rows=CSV_CHUNK_ROWS):
+    """按批读取Parquet，只读取原始表头或模型字段名的列"""
+    if not importlib.util.find_spec("pyarrow"):
+        try:
+            df = pd.read_parquet(file_path)
+        except ImportError:
+            raise ValueError("读取Parquet文件需要安装pyarrow")
+        yield _apply_source_dtypes(df[[col for col in df.columns if col in PARQUET_COLUMNS]])
+        return
+    import pyarrow.parquet
+
+    parquet = pyarrow.parquet.ParquetFile(file_path)
+    columns = [name for name in parquet.schema_arrow.names if name in PARQUET_COLUMNS]
+    yielded = False
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+        yield _apply_source_dtypes(batch.to_pandas())
+        yielded = True
+    if not yielded:
+        yield pd.DataFrame(columns=columns)
+
+
+def iter_archive_chunks(file_path, chunk_rows=CSV_CHUNK_ROWS):
+    """单文件上传的zip包：按顺序流式读取包内的CSV、JSON Lines和Parquet，不解压到磁盘"""
+    with zipfile.ZipFile(file_path) as archive:
+        members = [member for member in archive.infolist()
+                   if not member.is_dir() and not os.path.basename(member.filename).startswith(('.', '~$'))
+                   and os.path.basename(member.filename).endswith(STREAM_EXTENSIONS + PARQUET_EXTENSIONS)]
+        if not members:
+            raise ValueError("zip包中没有CSV、JSON Lines或Parquet文件（Excel请使用批量上传）")
+        for member in members:
+            with archive.open(member) as stream:
+                yield from iter_file_chunks(stream, os.path.basename(member.filename), chunk_rows)
+
+
+def iter_file_chunks(file_path, filename, chunk_rows=CSV_CHUNK_ROWS, excel_reader=None):
+    """按块读取文件：CSV、JSON Lines按行分块流式解析，Parquet按批读取，Excel按选定方式读取
+
+    file_path也可以是已打开的二进制流（Excel除外）
+    """
+    if filename.endswith(EXCEL_EXTENSIONS):
+        yield from iter_excel_chunks(file_path, filename, reader=excel_reader, chunk_rows=chunk_rows)
+    elif filename.endswith(CSV_EXTENSIONS):
+        # 字符串列按str、维度列按分类读取，保证各块推断出的类型一致（如纯数字的sku）
+        for chunk in pd.read_csv(file_path, chunksize=chunk_rows, dtype=SOURCE_DTYPES,
+                                 compression=_compression(filename)):
+            yield chunk
+    elif filename.endswith(JSON_LINES_EXTENSIONS):
+        yield from iter_json_lines(file_path, filename, chunk_rows)
+    elif filename.endswith(PARQUET_EXTENSIONS):
+        yield from iter_parquet(file_path, chunk_rows)
+    elif filename.endswith(ARCHIVE_EXTENSIONS):
+        yield from iter_archive_chunks(file_path, chunk_rows)
+    else:
+        raise ValueError("仅支持Excel、CSV、JSON Lines、Parquet文件或zip包")
+
+
+def find_missing_columns(columns, required=None):
+    """返回文件中缺少的必要列；与process_data一致，原始表头也可以用模型字段名代替（如Parquet中的product_name）"""
+    columns = set(columns)
+    return [col for col in (required or REQUIRED_COLUMNS)
+            if col not in columns and COLUMN_MAPPING.get(col) not in columns]
+
+
+def clean_chunk(chunk, check_columns=False):
+    """校验（可选）并清洗一块原始数据，可在子进程中执行"""
+    if check_columns:
+        missing_columns = find_missing_columns(chunk.columns)
+        if missing_columns:
+            raise ValueError(f"文件缺少必要的列: {', '.join(missing_columns)}")
+    return process_data(chunk)
+
+
+def read_clean_excel(file_path, filename, excel_reader=None, sheet_name=None, cleaner=None):
+    """在子进程中解析并清洗整个Excel工作表"""
+    cleaner = cleaner or clean_chunk
+    cleaned = [
+        cleaner(chunk, check_columns=(chunk_index == 0))
+        for chunk_index, chunk in enumerate(
+            iter_excel_chunks(file_path, filename, reader=excel_reader, sheet_name=sheet_name))
+    ]
+    return pd.concat(cleaned, ignore_index=True) if len(cleaned) > 1 else cleaned[0]
+
+
+def read_clean_source(file_path, filename, sheet_name=None, excel_reader=None, cleaner=None):
+    """在子进程中解析并清洗一个数据来源（一个CSV文件或一个Excel工作表）"""
+    cleaner = cleaner or clean_chunk
+    try:
+        if filename.endswith(EXCEL_EXTENSIONS):
+            return read_clean_excel(file_path, filename, excel_reader=excel_reader, sheet_name=sheet_name,
+                                    cleaner=cleaner)
+        cleaned = [
+            cleaner(chunk, check_columns=(chunk_index == 0))
+            for chunk_index, chunk in enumerate(iter_file_chunks(file_path, filename))
+        ]
+        return pd.concat(cleaned, ignore_index=True) if len(cleaned) > 1 else cleaned[0]
+    except ValueError as e:
+        source = f"{filename}[{sheet_name}]" if sheet_name is not None else filename
+        raise ValueError(f"{source}: {e}")
+
+
+def expand_uploads(files, directory):
+    """展开批量上传的文件：zip包解压到directory，返回[(文件路径, 文件名)]"""
+    expanded = []
+    for file_path, filename in files:
+        if not filename.endswith(ARCHIVE_EXTENSIONS):
+            expanded.append((file_path, filename))
+            continue
+        with zipfile.ZipFile(file_path) as archive:
+            for index, member in enumerate(archive.infolist()):
+                # 只取文件名部分，防止压缩包内的路径穿越
+                member_name = os.path.basename(member.filename)
+                if member.is_dir() or not is_supported_file(member_name) or member_name.startswith(('.', '~$')) \
+                        or member_name.endswith(ARCHIVE_EXTENSIONS):
+                    continue
+                target = os.path.join(directory, f"{index}_{member_name}")
+                with archive.open(member) as source, open(target, "wb") as output:
+                    while True:
+                        block = source.read(UPLOAD_CHUNK_SIZE)
+                        if not block:
+                            break
+                        output.write(block)
+                expanded.append((target, member_name))
+        os.remove(file_path)
+    return expanded
+
+
+def plan_sources(files, sheets=None):
+    """把文件列表展开为待解析的数据来源[(文件路径, 文件名, 工作表)]
+
+    sheets为None时读取每个Excel的第一个工作表，"*"表示全部工作表，
+    也可以是工作表名称列表（不存在的工作表会被跳过）。
+    """
+    sources = []
+    for file_path, filename in files:
+        if not filename.endswith(EXCEL_EXTENSIONS) or sheets is None:
+            sources.append((file_path, filename, None))
+            continue
+        available = list_sheets(file_path, filename)
+        selected = available if sheets == "*" else [name for name in available if name in sheets]
+        sources.extend((file_path, filename, name) for name in selected)
+    return sources
+
+
+def iter_clean_sources(sources, executor, window=CLEAN_WINDOW, excel_reader=None, cleaner=None):
+    """在进程池中并行解析清洗多个数据来源，最多window个同时在途，按顺序产出"""
+    pending = deque()
+    for file_path, filename, sheet_name in sources:
+        pending.append(executor.submit(read_clean_source, file_path, filename, sheet_name, excel_reader, cleaner))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def split_csv_ranges(file_path, chunk_rows=CSV_CHUNK_ROWS):
+    """按行边界把磁盘上的CSV切成每段chunk_rows行的字节范围，返回 (列名, (起点, 终点)的生成器)
+
+    主进程只用numpy查找换行符，不做解析；引号内的换行（之前的引号数为奇数）不作为切分点。
+    """
+    with open(file_path, "rb") as header_file:
+        header = header_file.readline()
+    columns = list(pd.read_csv(io.BytesIO(header), nrows=0).columns)
+
+    def ranges():
+        with open(file_path, "rb") as stream:
+            stream.seek(len(header))
+            start = offset = len(header)
+            rows = 0
+            quotes = header.count(b'"')
+            while True:
+                block = stream.read(CSV_SCAN_BYTES)
+                if not block:
+                    break
+                data = np.frombuffer(block, dtype=np.uint8)
+                newlines = np.flatnonzero(data == ord("\n"))
+                quote_positions = np.flatnonzero(data == ord('"'))
+                # 之前的引号数为偶数时，换行符才是行尾
+                row_ends = newlines[(quotes + np.searchsorted(quote_positions, newlines)) % 2 == 0]
+                quotes += len(quote_positions)
+                used = 0
+                while len(row_ends) - used >= chunk_rows - rows:
+                    used += chunk_rows - rows
+                    end = offset + int(row_ends[used - 1]) + 1
+                    yield start, end
+                    start, rows = end, 0
+                rows += len(row_ends) - used
+                offset += len(block)
+            if offset > start or start == len(header):
+                yield start, offset
+
+    return columns, ranges()
+
+
+def read_clean_csv_range(file_path, start, end, columns, cleaner=None, check_columns=False):
+    """在子进程中解析并清洗CSV的一段字节范围（不含表头）"""
+    with open(file_path, "rb") as stream:
+        stream.seek(start)
+        data = stream.read(end - start)
+    if data.strip():
+        chunk = pd.read_csv(io.BytesIO(data), header=None, names=columns, dtype=SOURCE_DTYPES)
+    else:
+        chunk = pd.DataFrame(columns=columns)
+    return (cleaner or clean_chunk)(chunk, check_columns=check_columns)
+
+
+def iter_clean_chunks(file_path, filename, executor=None, window=CLEAN_WINDOW, excel_reader=None, cleaner=None):
+    """逐块读取并清洗文件
+
+    传入进程池时，Excel解析和各块清洗都在子进程中执行；磁盘上的未压缩CSV按行边界切成字节范围，
+    解析也在子进程中执行，其余格式在当前线程按块读取后交给子进程清洗。
+    最多window块同时在途，并按原顺序产出结果。
+    cleaner为每块调用的清洗函数（需可被子进程导入），默认clean_chunk。
+    """
+    cleaner = cleaner or clean_chunk
+    if executor is None:
+        for chunk_index, chunk in enumerate(iter_file_chunks(file_path, filename, excel_reader=excel_reader)):
+            yield cleaner(chunk, check_columns=(chunk_index == 0))
+        return
+
+    if filename.endswith(EXCEL_EXTENSIONS):
+        yield executor.submit(read_clean_excel, file_path, filename, excel_reader, None, cleaner).result()
+        return
+
+    if filename.endswith(".csv") and isinstance(file_path, str):
+        columns, ranges = split_csv_ranges(file_path)
+        tasks = ((read_clean_csv_range, file_path, start, end, columns, cleaner, chunk_index == 0)
+                 for chunk_index, (start, end) in enumerate(ranges))
+    else:
+        tasks = ((cleaner, chunk, chunk_index == 0)
+                 for chunk_index, chunk in enumerate(iter_file_chunks(file_path, filename)))
+
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(*task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _as_strings(series):
+    """非字符串列转为字符串，保留空值"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if pd.api.types.is_string_dtype(series.cat.categories):
+            return series
+    elif pd.api.types.is_string_dtype(series):
+        return series
+    return series.where(series.isna(), series.astype(str))
+
+
+def _clean_column(series, spec):
+    """按清洗规则转换一列"""
+    if spec.kind == 'string':
+        return _as_strings(series).fillna(spec.fill)
+    if spec.kind == 'category':
+        # 先转分类再填空值，只需处理少量不同取值
+        values = _as_strings(series).astype('category')
+        if values.isna().any():
+            if spec.fill not in values.cat.categories:
+                values = values.cat.add_categories([spec.fill])
+            values = values.fillna(spec.fill)
+        return values
+    values = pd.to_numeric(series, errors='coerce').fillna(spec.fill)
+    if spec.kind == 'integer':
+        return pd.to_numeric(values, downcast='integer')
+    return values.astype('float64')
+
+
+def process_data(df):
+    """按SALES_SCHEMA一次性清洗上传的数据：改列名、转类型、填空值，并统计各列空值数"""
+    cleaned = {}
+    null_counts = {}
+    for spec in SALES_SCHEMA:
+        # 原始表头优先，也接受已经是模型字段名的列
+        source = spec.source if spec.source in df.columns else spec.name
+        if source not in df.columns:
+            continue
+        series = df[source]
+        null_counts[spec.name] = int(series.isna().sum())
+        cleaned[spec.name] = _clean_column(series, spec)
+
+    # 确保所有必需的列都存在
+    for col in REQUIRED_FIELDS:
+        if col not in cleaned:
+            print(f"缺少必要的列: {col}")
+            raise ValueError(f"缺少必要的列: {col}")
+
+    result = pd.DataFrame(cleaned, index=df.index)
+    result.attrs["null_counts"] = null_counts
+    nulls = {col: count for col, count in null_counts.items() if count}
+    if nulls:
+        print(f"清洗 {len(result)} 行，各列空值数: {nulls}")
+    return result
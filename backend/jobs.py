@@ -0,0 +1,124 @@
+import os
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# 同时执行的导入任务数；每次导入都会整表切换，默认串行排队
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 1))
+
+# 解析和清洗使用的子进程数，避免CPU密集的pandas计算占用主进程GIL
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", max(1, min(4, (os.cpu_count() or 2) - 1))))
+
+# 内存中最多保留的任务记录数
+MAX_JOB_HISTORY = 200
+
+
+class IngestJob:
+    """一次后台导入任务的状态"""
+
+    def __init__(self, filename):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = "queued"  # queued / running / succeeded / failed
+        self.stage = "queued"   # queued / parsing / loading / publishing / done
+        self.rows_processed = 0
+        self.message = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.lock = threading.Lock()
+
+    def update(self, stage=None, rows_processed=None):
+        """更新任务阶段和已处理行数"""
+        with self.lock:
+            if stage is not None:
+                self.stage = stage
+            if rows_processed is not None:
+                self.rows_processed = rows_processed
+
+    @property
+    def finished(self):
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self):
+        """返回可JSON序列化的任务状态"""
+        with self.lock:
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0
+            return {
+                "job_id": self.id,
+                "filename": self.filename,
+                "status": self.status,
+                "stage": self.stage,
+                "rows_processed": self.rows_processed,
+                "elapsed_seconds": round(elapsed, 2),
+                "rows_per_second": round(self.rows_processed / elapsed, 1) if elapsed > 0 else 0,
+                "message": self.message,
+                "error": self.error
+            }
+
+
+class JobManager:
+    """有界的后台导入任务队列"""
+
+    def __init__(self, workers=INGEST_WORKERS, parse_processes=PARSE_PROCESSES):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._runner = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self._parse_processes = parse_processes
+        self._parser_pool = None
+
+    def parser_pool(self):
+        """按需创建解析用的进程池"""
+        with self._lock:
+            if self._parser_pool is None:
+                self._parser_pool = ProcessPoolExecutor(max_workers=self._parse_processes)
+            return self._parser_pool
+
+    def create(self, filename):
+        """登记一个新任务（尚未开始执行）"""
+        job = IngestJob(filename)
+        with self._lock:
+            self._jobs[job.id] = job
+            # 从最早的开始丢弃已结束的任务，防止记录无限增长；排队或执行中的任务跳过
+            if len(self._jobs) > MAX_JOB_HISTORY:
+                finished = [job_id for job_id, item in self._jobs.items() if item.finished]
+                for job_id in finished[:len(self._jobs) - MAX_JOB_HISTORY]:
+                    del self._jobs[job_id]
+        return job
+
+    def start(self, job, work):
+        """把任务放入队列；work(job)在后台线程中执行并返回完成消息"""
+        self._runner.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, work):
+        with job.lock:
+            job.status = "running"
+            job.started_at = time.time()
+        try:
+            message = work(job)
+            with job.lock:
+                job.status = "succeeded"
+                job.stage = "done"
+                job.message = message
+        except Exception as e:
+            traceback.print_exc()
+            with job.lock:
+                job.status = "failed"
+                job.error = str(e)
+        finally:
+            with job.lock:
+                job.finished_at = time.time()
+            print(f"导入任务 {job.id} 结束: {job.status}")
+
+
+manager = JobManager()
@@ -0,0 +1,247 @@
+import os
+import csv
+import time
+import tempfile
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import MetaData, text
+from sqlalchemy.exc import OperationalError, InternalError
+import models
+
+# 每批发送到数据库的行数
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 20000))
+
+# 入库方式: auto（按数据库自动选择）/ core / load_data / sqlite
+INGEST_LOAD_METHOD = os.getenv("INGEST_LOAD_METHOD", "auto")
+
+# 影子表与旧表的后缀
+STAGING_SUFFIX = "_staging"
+RETIRED_SUFFIX = "_old"
+
+# MySQL未开启local_infile时的错误码，遇到时退回批量INSERT
+LOCAL_INFILE_DISABLED_ERRORS = (1148, 2068, 3948)
+
+
+def _column_values(series):
+    """把一列转换为数据库驱动可接受的Python值列表，NaN转为None"""
+    if series.isna().any():
+        return series.astype(object).where(series.notna(), None).tolist()
+    return series.tolist()
+
+
+def _resolve_method(connection, method):
+    """根据数据库类型确定入库方式"""
+    method = method or INGEST_LOAD_METHOD
+    if method != "auto":
+        return method
+    dialect = connection.dialect.name
+    if dialect == "mysql":
+        return "load_data"
+    if dialect == "sqlite":
+        return "sqlite"
+    return "core"
+
+
+def _insert_core(connection, table, columns, arrays, total_rows, batch_size):
+    """通过SQLAlchemy Core executemany批量插入（MySQL驱动会合并为多行INSERT）"""
+    statement = table.insert()
+    for start in range(0, total_rows, batch_size):
+        end = min(start + batch_size, total_rows)
+        batch = [dict(zip(columns, row)) for row in zip(*(values[start:end] for values in arrays))]
+        connection.execute(statement, batch)
+
+
+def _insert_sqlite(connection, table, columns, arrays, total_rows, batch_size):
+    """SQLite专用路径：直接使用DBAPI游标executemany位置参数，省去字典构造和语句编译"""
+    insert_columns = list(columns)
+    if "created_at" in table.c and "created_at" not in insert_columns:
+        insert_columns.append("created_at")
+        arrays = arrays + [[datetime.now().isoformat(sep=" ")] * total_rows]
+
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        table.name, ", ".join(insert_columns), ", ".join("?" * len(insert_columns))
+    )
+    cursor = connection.connection.cursor()
+    try:
+        for start in range(0, total_rows, batch_size):
+            end = min(start + batch_size, total_rows)
+            cursor.executemany(sql, zip(*(values[start:end] for values in arrays)))
+    finally:
+        cursor.close()
+
+
+def _load_data_frame(df):
+    """按LOAD DATA的转义规则准备数据：字符串中的反斜杠写成两个反斜杠"""
+    escaped = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories
+            if pd.api.types.is_string_dtype(categories) and categories.str.contains("\\", regex=False).any():
+                escaped[col] = series.cat.rename_categories(categories.str.replace("\\", "\\\\", regex=False))
+        elif pd.api.types.is_string_dtype(series) or series.dtype == object:
+            text_values = series.where(series.isna(), series.astype(str))
+            if text_values.str.contains("\\", regex=False).any():
+                escaped[col] = text_values.str.replace("\\", "\\\\", regex=False)
+    return df.assign(**escaped) if escaped else df
+
+
+def _insert_load_data(connection, table, df, columns, batch_size):
+    """MySQL专用路径：写临时CSV后使用LOAD DATA LOCAL INFILE导入"""
+    set_clause = " SET created_at = NOW()" if "created_at" in table.c and "created_at" not in columns else ""
+    for start in range(0, len(df), batch_size):
+        batch_df = df.iloc[start:start + batch_size]
+        fd, csv_path = tempfile.mkstemp(suffix=".csv")
+        os.close(fd)
+        try:
+            # 空值写成\N，非数值字段一律加引号：未加引号的NULL会被MySQL读成空值，
+            # 加引号后字面值为"NULL"的字符串（如商品名称）与空值入库后仍然不同
+            _load_data_frame(batch_df[columns]).to_csv(csv_path, index=False, header=False, na_rep="\\N",
+                                                       quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+            connection.execute(text(
+                f"LOAD DATA LOCAL INFILE :path INTO TABLE {table.name} "
+                "CHARACTER SET utf8mb4 "
+                "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+                "LINES TERMINATED BY '\\n' "
+                f"({', '.join(columns)}){set_clause}"
+            ), {"path": csv_path.replace("\\", "/")})
+        finally:
+            os.remove(csv_path)
+
+
+def bulk_insert(df, connection, table=None, batch_size=None, method=None):
+    """批量写入DataFrame，按列数组成批发送到数据库
+
+    不提交事务，由调用方决定何时提交。返回行数、耗时、每秒行数和实际使用的入库方式。
+    """
+    table = table if table is not None else models.SalesData.__table__
+    batch_size = batch_size or INGEST_BATCH_SIZE
+    method = _resolve_method(connection, method)
+
+    columns = [col for col in df.columns if col in table.c]
+    total_rows = len(df)
+    started = time.perf_counter()
+
+    if total_rows:
+        if method == "load_data":
+            try:
+                _insert_load_data(connection, table, df, columns, batch_size)
+            except (OperationalError, InternalError) as e:
+                # 服务器未开启local_infile时退回Core批量插入
+                if not e.orig or e.orig.args[0] not in LOCAL_INFILE_DISABLED_ERRORS:
+                    raise
+                print(f"LOAD DATA不可用，改用批量INSERT: {str(e)}")
+                method = "core"
+        if method != "load_data":
+            arrays = [_column_values(df[col]) for col in columns]
+            if method == "sqlite":
+                _insert_sqlite(connection, table, columns, arrays, total_rows, batch_size)
+            else:
+                _insert_core(connection, table, columns, arrays, total_rows, batch_size)
+
+    seconds = time.perf_counter() - started
+    rows_per_second = total_rows / seconds if seconds > 0 else float(total_rows)
+    print(f"批量入库 {total_rows} 行，方式 {method}，耗时 {seconds:.2f} 秒，{rows_per_second:,.0f} 行/秒")
+    return {
+        "rows": total_rows,
+        "seconds": seconds,
+        "rows_per_second": rows_per_second,
+        "method": method
+    }
+
+
+class TableGeneration:
+    """一代完整的数据：先写入影子表，全部写完后一次性原子切换为正式表
+
+    读请求在整个导入期间始终看到旧的完整数据，切换后看到新的完整数据；
+    旧数据整表删除，不再逐行DELETE。
+    """
+
+    def __init__(self, engine, tables=None):
+        self.engine = engine
+        self.tables = tables if tables is not None else [models.SalesData.__table__]
+        self.is_mysql = engine.dialect.name == "mysql"
+        self.staging = {}
+        for table in self.tables:
+            staging = table.to_metadata(MetaData(), name=table.name + STAGING_SUFFIX)
+            # 影子表不建二级索引（SQLite索引名全局唯一，且导入完成后一次性建索引比逐行维护快），
+            # 切换时再按正式表定义创建
+            staging.indexes.clear()
+            self.staging[table.name] = staging
+
+    def begin(self):
+        """创建空的影子表，清理上次中断留下的残余"""
+        with self.engine.begin() as connection:
+            for table in self.tables:
+                staging_name = table.name + STAGING_SUFFIX
+                connection.execute(text(f"DROP TABLE IF EXISTS {staging_name}"))
+                # 影子表按当前模型建表（不含二级索引），正式表结构变化时随下一次导入一并切换
+                self.staging[table.name].create(connection)
+        return self
+
+    def append(self, df, table=None):
+        """把一块数据写入影子表并提交，返回入库统计"""
+        table = table if table is not None else self.tables[0]
+        with self.engine.begin() as connection:
+            return bulk_insert(df, connection, table=self.staging[table.name])
+
+    def copy(self, statement, columns, table=None):
+        """在数据库内把SELECT的结果直接插入影子表（INSERT ... SELECT，不经过Python），返回行数"""
+        table = table if table is not None else self.tables[0]
+        staging = self.staging[table.name]
+        started = time.perf_counter()
+        with self.engine.begin() as connection:
+            rows = connection.execute(staging.insert().from_select(columns, statement)).rowcount
+        print(f"库内复制 {rows} 行到 {staging.name}，耗时 {time.perf_counter() - started:.2f} 秒")
+        return rows
+
+    def publish(self):
+        """把影子表原子切换为正式表，并删除旧一代数据；同时递增数据版本，各进程缓存的分析结果失效"""
+        if self.is_mysql:
+            self._publish_mysql()
+        else:
+            self._publish_transactional()
+        print(f"新数据已发布: {', '.join(table.name for table in self.tables)}")
+
+    def _publish_mysql(self):
+        """MySQL: 一条RENAME TABLE同时交换所有表，再整表DROP旧数据"""
+        renames = []
+        for table in self.tables:
+            renames.append(f"{table.name} TO {table.name}{RETIRED_SUFFIX}")
+            renames.append(f"{table.name}{STAGING_SUFFIX} TO {table.name}")
+        with self.engine.begin() as connection:
+            for table in self.tables:
+                # 切换前在影子表上按模型定义一次性建好索引（MySQL索引名按表区分，不会冲突）
+                adds = [
+                    f"ADD {'UNIQUE ' if index.unique else ''}INDEX {index.name} "
+                    f"({', '.join(column.name for column in index.columns)})"
+                    for index in table.indexes
+                ]
+                if adds:
+                    connection.execute(text(f"ALTER TABLE {table.name}{STAGING_SUFFIX} " + ", ".join(adds)))
+                connection.execute(text(f"DROP TABLE IF EXISTS {table.name}{RETIRED_SUFFIX}"))
+            connection.execute(text("RENAME TABLE " + ", ".join(renames)))
+            # RENAME TABLE会隐式提交，MySQL无法与切换放在同一事务中，切换后立即递增数据版本
+            models.bump_dataset_version(connection)
+            for table in self.tables:
+                connection.execute(text(f"DROP TABLE {table.name}{RETIRED_SUFFIX}"))
+
+    def _publish_transactional(self):
+        """SQLite等支持事务性DDL的数据库: 在同一个事务中删除旧表、改名并重建索引"""
+        with self.engine.connect() as connection:
+            if self.engine.dialect.name == "sqlite":
+                # pysqlite默认不为DDL开启事务，显式BEGIN保证切换原子性
+                connection.exec_driver_sql("BEGIN IMMEDIATE")
+            for table in self.tables:
+                connection.execute(text(f"DROP TABLE IF EXISTS {table.name}"))
+                connection.execute(text(f"ALTER TABLE {table.name}{STAGING_SUFFIX} RENAME TO {table.name}"))
+                for index in table.indexes:
+                    index.create(connection)
+            models.bump_dataset_version(connection)
+            connection.commit()
+
+    def discard(self):
+        """导入失败时删除影子表，正式表保持不变"""
+        with self.engine.begin() as connection:
+            for table in self.tables:
+                connection.execute(text(f"DROP TABLE IF EXISTS {table.name}{STAGING_SUFFIX}"))
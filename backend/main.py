@@ -1,19 +1,36 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Body
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 import pandas as pd
-import io
 import models
 import schemas
 import database
 from database import get_db
 import ai_service
+import ingest
+import loader
+import jobs
+import frame_cache
+import dimensions
+import rollups
+import cache
+import columnar
+import archive
+import rolling as rolling_window
+import orders as order_lines
+import upsert as upsert_rows
+import preflight
+import resumable
 import os
+import uuid
+import shutil
 from pydantic import BaseModel
-from sqlalchemy import func, distinct
-from datetime import datetime, timedelta
+from datetime import date
 import asyncio
+import json
 
 app = FastAPI(title="跨境电商销售数据分析看板")
 
@@ -31,6 +48,34 @@ try:
 except Exception as e:
     print(f"上传目录权限错误: {str(e)}")
 
+# 数据版本表：分析结果缓存按它判断数据是否变化，旧数据库升级后首次启动时创建
+models.DatasetVersion.__table__.create(database.engine, checkfirst=True)
+
+# 启用内存分析引擎（ANALYSIS_ENGINE=memory）时，启动即载入当前数据
+columnar.reload(database.engine)
+
+# 分析接口的响应只在导入新数据后变化，客户端每次都带ETag重新验证
+ANALYSIS_CACHE_CONTROL = os.getenv("ANALYSIS_CACHE_CONTROL", "private, no-cache")
+
+# 分析接口的条件请求：ETag由数据库中的数据版本和请求参数决定，If-None-Match命中时直接返回304，只读取数据版本，不执行分析查询
+# （在CORS之前注册，304响应同样会带上CORS头）
+@app.middleware("http")
+async def analysis_conditional_get(request, call_next):
+    if request.method != "GET" or not request.url.path.startswith("/analysis/"):
+        return await call_next(request)
+    
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    # 数据版本从数据库读取，不阻塞事件循环
+    etag = await run_in_threadpool(cache.results.etag, request.url.path, query)
+    headers = {"ETag": etag, "Cache-Control": ANALYSIS_CACHE_CONTROL}
+    if cache.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -49,68 +94,390 @@ class AnalysisRequest(BaseModel):
     platform_comparison: Optional[Dict[str, Any]] = {}
 
 @app.post("/upload/", response_model=schemas.UploadResponse)
-async def upload_file(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    """上传并处理Excel或CSV文件"""
+async def upload_file(file: UploadFile = File(...), excel_reader: Optional[str] = None, as_of: Optional[date] = None,
+                      rolling: bool = False, upsert: bool = False, orders: bool = False):
+    """上传Excel、CSV（.csv/.csv.gz）、JSON Lines（.ndjson/.jsonl，可.gz压缩）、Parquet文件或装有这些文件的zip包：
+    分块写盘后立即返回任务ID，解析和入库在后台执行；压缩文件和zip包在读取时流式解压
+
+    excel_reader可选 auto / fast / calamine / pandas，默认由EXCEL_READER环境变量决定；
+    as_of为数据截止日期，"本周"/"上周"、"9月"等标签按它换算为绝对周期，默认为导入当天；
+    rolling=true时文件只需包含本周数据，原本周数据保留为上周，超出窗口的周被丢弃；
+    upsert=true时文件是修正数据，只按自然键更新或新增其中的行，其余数据不变；
+    orders=true时文件是原始订单行（带订单日期列，不需要周、月），导入前按订单日期汇总到周、月粒度
+    """
+    if not ingest.is_supported_file(file.filename):
+        raise HTTPException(status_code=400, detail="仅支持Excel、CSV（.csv/.csv.gz）、JSON Lines、Parquet文件或zip包")
+    if excel_reader and excel_reader not in ingest.EXCEL_READERS:
+        raise HTTPException(status_code=400, detail=f"不支持的Excel读取方式: {excel_reader}")
+    if rolling and upsert:
+        raise HTTPException(status_code=400, detail="rolling与upsert不能同时使用")
+    
+    # 先分块保存文件到本地，文件名带随机前缀，避免并发上传同名文件互相覆盖；
+    # 确定要导入后才登记任务，重复上传和保存失败不会留下永远排队的任务
+    file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_{file.filename}")
     try:
-        # 先保存文件到本地
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # 根据文件扩展名决定如何读取文件
-        if file.filename.endswith('.xlsx') or file.filename.endswith('.xls'):
-            df = pd.read_excel(file_path)
-        elif file.filename.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:
-            os.remove(file_path)  # 删除不支持的文件
-            raise HTTPException(status_code=400, detail="仅支持Excel或CSV文件")
+        total_bytes, content_hash = await ingest.spool_upload(file, file_path)
+        upload_fingerprint = ingest.fingerprint(content_hash, *upload_options(as_of, rolling, upsert, orders))
         
-        # 打印接收到的数据的前几行，帮助调试
-        print(f"文件头部数据预览:\n{df.head()}")
-        print(f"文件列名:{df.columns.tolist()}")
+        # 与当前数据完全相同的重复上传直接返回上次的结果
+        duplicate = duplicate_upload_response(upload_fingerprint)
+        if duplicate:
+            os.remove(file_path)
+            return duplicate
         
-        # 检查必要的列是否存在
-        required_columns = ['sku', 'spu', '名称', '销量', '销售额']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            os.remove(file_path)  # 清理文件
-            raise HTTPException(
-                status_code=400, 
-                detail=f"文件缺少必要的列: {', '.join(missing_columns)}"
-            )
+        job = jobs.manager.create(file.filename)
+        print(f"文件已保存: {file_path} ({total_bytes} 字节)，导入任务 {job.id} 已排队")
+        jobs.manager.start(job, lambda job: run_ingest_job(job, file_path, file.filename, upload_fingerprint,
+                                                           excel_reader, as_of, rolling, upsert, orders))
+        return {"message": "文件已上传，正在后台导入", "job_id": job.id}
+    
+    except Exception as e:
+        print(f"保存上传文件时出错: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise HTTPException(status_code=500, detail=f"处理文件时出错: {str(e)}")
+
+@app.post("/upload/preflight/", response_model=schemas.PreflightResponse)
+async def preflight_upload(file: UploadFile = File(...), total_size: Optional[int] = None, orders: bool = False):
+    """上传前预检：只读取表头和开头的样本行，报告缺少的必要列、不会导入的列、各列类型和估算行数
+
+    CSV可只发送文件开头（total_size传原文件字节数用于估算行数），Excel需要发送整个文件；
+    orders=true时按订单级导入的必要列检查
+    """
+    if not ingest.is_supported_file(file.filename):
+        raise HTTPException(status_code=400, detail="仅支持Excel、CSV（.csv/.csv.gz）、JSON Lines、Parquet文件或zip包")
+    try:
+        data, total_size, complete = await preflight.read_sample(file, total_size)
+        # 解析样本（Excel可达整个文件）较慢，放到线程池中执行
+        return await run_in_threadpool(preflight.inspect, data, file.filename, total_size,
+                                       complete=complete, order_level=orders)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def upload_options(as_of, rolling, upsert, orders):
+    """参与上传指纹的导入选项，未指定时不影响指纹"""
+    return ([f"as_of={as_of}"] if as_of else []) + (["rolling"] if rolling else []) + \
+        (["upsert"] if upsert else []) + (["orders"] if orders else [])
+
+def duplicate_upload_response(upload_fingerprint):
+    """上传内容与当前已发布数据相同时，返回上次导入的结果"""
+    if not frame_cache.is_current(upload_fingerprint):
+        return None
+    previous = frame_cache.lookup(upload_fingerprint)
+    print(f"重复上传，跳过导入: {upload_fingerprint}")
+    return {
+        "message": f"文件内容与当前数据相同，未重复导入（{previous['message']}）",
+        "job_id": None,
+        "duplicate": True
+    }
+
+def run_cached_ingest(job, upload_fingerprint, label, parse_frames, describe, as_of=None, rolling=False, upsert=False,
+                      orders=False):
+    """按内容指纹导入：与当前数据相同则跳过；命中缓存则直接重放清洗后的数据，否则解析并写入缓存"""
+    previous = frame_cache.lookup(upload_fingerprint)
+    if previous and frame_cache.is_current(upload_fingerprint):
+        # 排队期间已有相同内容发布完成
+        return f"文件内容与当前数据相同，未重复导入（{previous['message']}）"
+    
+    rolling = rolling or bool(previous and previous.get("rolling"))
+    upsert = upsert or bool(previous and previous.get("upsert"))
+    orders = orders or bool(previous and previous.get("orders"))
+    # 相对周期按首次导入时的截止日期换算，从缓存重新发布时保持不变；修正数据默认与当前数据的本周对齐
+    if as_of is None:
+        if previous and previous.get("as_of"):
+            as_of = date.fromisoformat(previous["as_of"])
+        else:
+            as_of = upsert_rows.default_anchor(database.engine) if upsert else date.today()
+    
+    db = database.SessionLocal()
+    try:
+        if previous:
+            print(f"命中清洗缓存 {upload_fingerprint}，跳过解析")
+            job.update(stage="loading")
+            frames = frame_cache.iter_frames(upload_fingerprint)
+        else:
+            job.update(stage="parsing")
+            frames = parse_frames()
+            if orders:
+                # 缓存中保存汇总后的数据，重新发布时不再汇总订单行
+                frames = order_lines.aggregate(frames, anchor=as_of)
+            frames = frame_cache.tee(upload_fingerprint, frames)
         
-        # 数据处理和清洗
-        try:
-            processed_df = process_data(df)
-            print(f"处理后数据预览:\n{processed_df.head()}")
-        except Exception as e:
-            os.remove(file_path)  # 清理文件
-            print(f"数据处理错误: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"数据处理错误: {str(e)}")
+        rows_saved = save_to_database(frames, db, on_progress=job.update, fingerprint=upload_fingerprint,
+                                      source=label, as_of=as_of, rolling=rolling, upsert=upsert)
+        message = describe(rows_saved)
+        frame_cache.record(upload_fingerprint, label, rows_saved, message, as_of=as_of.isoformat(),
+                           rolling=rolling, upsert=upsert, orders=orders)
+        return message
+    except Exception:
+        frame_cache.discard(upload_fingerprint)
+        raise
+    finally:
+        db.close()
+
+def run_ingest_job(job, file_path, filename, upload_fingerprint, excel_reader=None, as_of=None, rolling=False,
+                   upsert=False, orders=False):
+    """后台导入任务：在进程池中解析清洗，逐块写入影子表后原子发布"""
+    cleaner = order_lines.clean_order_chunk if orders else None
+    try:
+        return run_cached_ingest(
+            job, upload_fingerprint, filename,
+            lambda: ingest.iter_clean_chunks(file_path, filename, jobs.manager.parser_pool(),
+                                             excel_reader=excel_reader, cleaner=cleaner),
+            lambda rows_saved: f"成功处理并保存{rows_saved}行数据",
+            as_of=as_of, rolling=rolling, upsert=upsert, orders=orders
+        )
+    finally:
+        os.remove(file_path)  # 处理完成或出错后删除文件
+
+@app.post("/upload/batch/", response_model=schemas.UploadResponse)
+async def upload_batch(files: List[UploadFile] = File(...), sheets: Optional[str] = None, excel_reader: Optional[str] = None,
+                       as_of: Optional[date] = None, rolling: bool = False, upsert: bool = False,
+                       orders: bool = False):
+    """批量上传多个文件（或zip包），各文件、各工作表在进程池中并行解析，最后一次性发布
+
+    sheets: 不传时读取每个Excel的第一个工作表；"*"读取全部工作表；也可用逗号分隔指定工作表名称
+    as_of、rolling、upsert、orders: 数据截止日期、滚动导入、增量修正和订单级导入，与单文件上传相同
+    """
+    for file in files:
+        if not (ingest.is_supported_file(file.filename) or file.filename.endswith(ingest.ARCHIVE_EXTENSIONS)):
+            raise HTTPException(status_code=400, detail=f"不支持的文件类型: {file.filename}")
+    if excel_reader and excel_reader not in ingest.EXCEL_READERS:
+        raise HTTPException(status_code=400, detail=f"不支持的Excel读取方式: {excel_reader}")
+    if rolling and upsert:
+        raise HTTPException(status_code=400, detail="rolling与upsert不能同时使用")
+    sheet_selector = sheets if sheets in (None, "*") else [name.strip() for name in sheets.split(",") if name.strip()]
+    
+    # 每个批次使用独立目录保存文件；确定要导入后才登记任务
+    batch_dir = os.path.join(UPLOAD_DIR, uuid.uuid4().hex)
+    try:
+        os.makedirs(batch_dir, exist_ok=True)
+        saved_files = []
+        content_hashes = []
+        for index, file in enumerate(files):
+            file_path = os.path.join(batch_dir, f"{index}_{file.filename}")
+            _, content_hash = await ingest.spool_upload(file, file_path)
+            saved_files.append((file_path, file.filename))
+            content_hashes.append(content_hash)
         
-        # 保存数据到数据库
-        try:
-            rows_saved = save_to_database(processed_df, db)
-            os.remove(file_path)  # 处理完成后删除文件
-        except Exception as e:
-            os.remove(file_path)  # 清理文件
-            print(f"数据库保存错误: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"数据库保存错误: {str(e)}")
+        # 批次指纹与文件顺序无关，但包含工作表选择
+        upload_fingerprint = ingest.fingerprint(*sorted(content_hashes), f"sheets={sheet_selector}",
+                                                *upload_options(as_of, rolling, upsert, orders))
+        duplicate = duplicate_upload_response(upload_fingerprint)
+        if duplicate:
+            shutil.rmtree(batch_dir, ignore_errors=True)
+            return duplicate
         
-        return {"message": f"成功处理并保存{rows_saved}行数据"}
+        job = jobs.manager.create(", ".join(file.filename for file in files))
+        print(f"批量上传 {len(saved_files)} 个文件已保存，导入任务 {job.id} 已排队")
+        jobs.manager.start(job, lambda job: run_batch_ingest_job(job, batch_dir, saved_files, upload_fingerprint,
+                                                                 sheet_selector, excel_reader, as_of, rolling, upsert,
+                                                                 orders))
+        return {"message": f"已上传{len(saved_files)}个文件，正在后台导入", "job_id": job.id}
     
-    except HTTPException:
-        # 直接重新抛出HTTP异常
-        raise
     except Exception as e:
-        print(f"处理文件时发生未知错误: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        print(f"保存批量上传文件时出错: {str(e)}")
+        shutil.rmtree(batch_dir, ignore_errors=True)
         raise HTTPException(status_code=500, detail=f"处理文件时出错: {str(e)}")
 
+def run_batch_ingest_job(job, batch_dir, saved_files, upload_fingerprint, sheets=None, excel_reader=None, as_of=None,
+                         rolling=False, upsert=False, orders=False):
+    """批量导入任务：各数据来源并行解析清洗，合并写入同一影子表后一次发布"""
+    def parse_frames():
+        sources = ingest.plan_sources(ingest.expand_uploads(saved_files, batch_dir), sheets)
+        if not sources:
+            raise ValueError("上传的文件中没有可导入的数据")
+        print(f"批量导入共 {len(sources)} 个数据来源")
+        
+        # 在途数量与进程数匹配，使吞吐量随CPU核数扩展
+        return ingest.iter_clean_sources(sources, jobs.manager.parser_pool(),
+                                         window=jobs.PARSE_PROCESSES + 1, excel_reader=excel_reader,
+                                         cleaner=order_lines.clean_order_chunk if orders else None)
+    
+    try:
+        return run_cached_ingest(
+            job, upload_fingerprint, ", ".join(filename for _, filename in saved_files), parse_frames,
+            lambda rows_saved: f"成功处理{len(saved_files)}个文件，共保存{rows_saved}行数据",
+            as_of=as_of, rolling=rolling, upsert=upsert, orders=orders
+        )
+    finally:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+@app.post("/upload/sessions/", response_model=schemas.UploadSessionStatus)
+def create_upload_session(filename: str, total_size: int, key: Optional[str] = None, excel_reader: Optional[str] = None,
+                          as_of: Optional[date] = None, rolling: bool = False, upsert: bool = False,
+                          orders: bool = False):
+    """创建分块续传会话，返回每块大小和已确认的偏移量
+
+    key由客户端按文件生成（如 文件名:大小:修改时间），中断后用相同key和参数重新创建即可从offset处继续；
+    导入参数与 /upload/ 相同
+    """
+    if not ingest.is_supported_file(filename):
+        raise HTTPException(status_code=400, detail="仅支持Excel、CSV（.csv/.csv.gz）、JSON Lines、Parquet文件或zip包")
+    if excel_reader and excel_reader not in ingest.EXCEL_READERS:
+        raise HTTPException(status_code=400, detail=f"不支持的Excel读取方式: {excel_reader}")
+    if rolling and upsert:
+        raise HTTPException(status_code=400, detail="rolling与upsert不能同时使用")
+    options = {"excel_reader": excel_reader, "as_of": as_of, "rolling": rolling, "upsert": upsert, "orders": orders}
+    try:
+        session = resumable.open_session(key, os.path.basename(filename), total_size, options)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return session.to_dict()
+
+@app.get("/upload/sessions/{upload_id}", response_model=schemas.UploadSessionStatus)
+def get_upload_session(upload_id: str):
+    """查询上传会话已确认的偏移量"""
+    session = resumable.get(upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已结束")
+    return session.to_dict()
+
+@app.delete("/upload/sessions/{upload_id}")
+def cancel_upload_session(upload_id: str):
+    """放弃上传，删除暂存文件"""
+    session = resumable.get(upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已结束")
+    session.close()
+    return {"message": "已取消上传"}
+
+@app.put("/upload/sessions/{upload_id}/chunks/{index}", response_model=schemas.UploadSessionStatus)
+async def upload_chunk(upload_id: str, index: int, request: Request,
+                       checksum: Optional[str] = Header(None, alias="X-Chunk-SHA256")):
+    """接收第index块（请求体为原始字节，X-Chunk-SHA256为该块的SHA-256），追加后返回新的偏移量
+
+    块不连续时返回409和应继续的offset；最后一块到达后开始导入，返回job_id
+    """
+    session = resumable.get(upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已结束")
+    data = await request.body()
+    # 写盘、校验、表头预检和开始导入都会阻塞，放到线程池中执行，不占用事件循环
+    return await run_in_threadpool(receive_chunk, session, index, data, checksum)
+
+def receive_chunk(session, index, data, checksum):
+    """追加一块数据并推进会话：第一块检查表头并开始边收边解析，最后一块开始导入"""
+    try:
+        with session.condition:
+            first_chunk = session.offset == 0
+        session.append(index, data, checksum)
+    except resumable.OffsetMismatch as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "offset": e.offset})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    options = session.options
+    if first_chunk and session.offset > 0 and session.filename.endswith(ingest.STREAM_EXTENSIONS):
+        # CSV、JSON Lines第一块到达即可按预检规则检查表头，缺列时不必等到全部上传
+        sample = data[:preflight.PREFLIGHT_BYTES]
+        try:
+            report = preflight.inspect(sample, session.filename, session.total_size,
+                                       complete=len(sample) == session.total_size, order_level=options["orders"])
+        except ValueError as e:
+            session.close()
+            raise HTTPException(status_code=400, detail=str(e))
+        if report["missing_columns"]:
+            session.close()
+            raise HTTPException(status_code=400, detail=f"文件缺少必要的列: {', '.join(report['missing_columns'])}")
+        session.start_parsing(order_lines.clean_order_chunk if options["orders"] else None)
+    if session.parse_error is not None:
+        # CSV边收边解析已经失败，不必再传剩余的块
+        error = session.parse_error
+        session.close()
+        raise HTTPException(status_code=400, detail=str(error))
+    if session.complete and session.result is None:
+        session.result = start_session_ingest(session)
+    return session.to_dict()
+
+def start_session_ingest(session):
+    """全部块接收完成：按整个文件的内容指纹判断重复上传，否则开始后台导入"""
+    options = session.options
+    upload_fingerprint = ingest.fingerprint(session.content_hash(), *upload_options(
+        options["as_of"], options["rolling"], options["upsert"], options["orders"]))
+    duplicate = duplicate_upload_response(upload_fingerprint)
+    if duplicate:
+        session.close()
+        return duplicate
+    
+    job = jobs.manager.create(session.filename)
+    print(f"分块上传完成: {session.filename} ({session.total_size} 字节)，导入任务 {job.id} 已排队")
+    jobs.manager.start(job, lambda job: run_session_ingest_job(job, session, upload_fingerprint))
+    return {"message": "文件已上传，正在后台导入", "job_id": job.id}
+
+def run_session_ingest_job(job, session, upload_fingerprint):
+    """分块上传的导入任务：CSV、JSON Lines直接使用接收期间已清洗好的数据块，其他格式此时才解析"""
+    options = session.options
+    cleaner = order_lines.clean_order_chunk if options["orders"] else None
+    if session.filename.endswith(ingest.STREAM_EXTENSIONS):
+        parse_frames = session.parsed_frames
+    else:
+        parse_frames = lambda: ingest.iter_clean_chunks(session.path, session.filename, jobs.manager.parser_pool(),
+                                                         excel_reader=options["excel_reader"], cleaner=cleaner)
+    try:
+        return run_cached_ingest(
+            job, upload_fingerprint, session.filename, parse_frames,
+            lambda rows_saved: f"成功处理并保存{rows_saved}行数据",
+            as_of=options["as_of"], rolling=options["rolling"], upsert=options["upsert"], orders=options["orders"]
+        )
+    finally:
+        session.close()
+
+@app.get("/uploads/")
+def list_cached_uploads():
+    """列出已缓存的历史上传（清洗后的数据），current表示当前发布的数据"""
+    return frame_cache.list_entries()
+
+@app.post("/uploads/{upload_fingerprint}/publish", response_model=schemas.UploadResponse)
+def republish_upload(upload_fingerprint: str):
+    """直接从缓存重新发布一次历史上传，跳过文件解析和清洗"""
+    previous = frame_cache.lookup(upload_fingerprint)
+    if not previous:
+        raise HTTPException(status_code=404, detail="缓存的上传记录不存在")
+    duplicate = duplicate_upload_response(upload_fingerprint)
+    if duplicate:
+        return duplicate
+    
+    job = jobs.manager.create(previous["filename"])
+    jobs.manager.start(job, lambda job: run_cached_ingest(
+        job, upload_fingerprint, previous["filename"], None,
+        lambda rows_saved: f"已从缓存重新发布{rows_saved}行数据"
+    ))
+    return {"message": "正在从缓存重新发布数据", "job_id": job.id}
+
+@app.get("/jobs/{job_id}", response_model=schemas.JobStatus)
+def get_job(job_id: str):
+    """查询后台导入任务的进度"""
+    job = jobs.manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """以Server-Sent Events推送导入任务进度，任务结束后关闭连接"""
+    job = jobs.manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    
+    async def event_stream():
+        last_payload = None
+        while True:
+            state = job.to_dict()
+            payload = json.dumps(state, ensure_ascii=False)
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+            if job.finished:
+                break
+            await asyncio.sleep(0.5)
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/analysis/top-sales-volume/", response_model=List[schemas.ProductAnalysis])
+@cache.cached
 def get_top_sales_volume(week: Optional[str] = None, db: Session = Depends(get_db)):
     """获取销量Top5产品"""
     try:
@@ -121,6 +488,7 @@ def get_top_sales_volume(week: Optional[str] = None, db: Session = Depends(get_d
         raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
 
 @app.get("/analysis/top-sales-amount/", response_model=List[schemas.ProductAnalysis])
+@cache.cached
 def get_top_sales_amount(week: Optional[str] = None, db: Session = Depends(get_db)):
     """获取销售额Top5产品"""
     try:
@@ -131,144 +499,38 @@ def get_top_sales_amount(week: Optional[str] = None, db: Session = Depends(get_d
         raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
 
 @app.get("/analysis/top-increased/", response_model=List[schemas.ComparisonAnalysis])
+@cache.cached
 def get_top_increased(db: Session = Depends(get_db)):
     """获取环比销售额上升Top5"""
     result = models.get_top_increased_sales_amount(db, limit=5)
     return result
 
 @app.get("/analysis/top-decreased/", response_model=List[schemas.ComparisonAnalysis])
+@cache.cached
 def get_top_decreased(db: Session = Depends(get_db)):
     """获取环比销售额下降Top5"""
     result = models.get_top_decreased_sales_amount(db, limit=5)
     return result
 
 @app.get("/analysis/country-distribution/", response_model=List[schemas.CountryAnalysis])
+@cache.cached
 def get_country_distribution(db: Session = Depends(get_db)):
     """获取不同国家销售额占比和环比情况"""
     result = models.get_country_sales_distribution(db)
     return result
 
 @app.get("/analysis/platform-comparison/", response_model=schemas.PlatformComparison)
+@cache.cached
 def get_platform_comparison(db: Session = Depends(get_db)):
     """获取平台销售额、销量、订单、毛利率环比"""
     result = models.get_platform_comparison(db)
     return result
 
 @app.get("/analysis/salesperson-comparison/")
+@cache.cached
 def get_salesperson_comparison(db: Session = Depends(get_db), week: Optional[str] = None):
     """获取销售人员业绩数据"""
-    # 查询当前周期数据
-    current_query = db.query(
-        models.SalesData.sales_person,
-        func.sum(models.SalesData.sales_amount).label("sales_amount"),
-        func.sum(models.SalesData.sales_volume).label("sales_volume"),
-        func.sum(models.SalesData.order_count).label("order_count")
-    )
-    
-    # 如果指定了特定周期，按指定周期筛选，否则使用"本周"
-    if week and week != 'all':
-        current_query = current_query.filter(models.SalesData.week == week)
-    else:
-        current_query = current_query.filter(models.SalesData.week == "本周")
-    
-    current_result = current_query.group_by(models.SalesData.sales_person).all()
-    
-    # 查询上一周期数据以计算环比
-    prev_query = db.query(
-        models.SalesData.sales_person,
-        func.sum(models.SalesData.sales_amount).label("prev_sales_amount"),
-        func.sum(models.SalesData.sales_volume).label("prev_sales_volume"),
-        func.sum(models.SalesData.order_count).label("prev_order_count")
-    )
-    
-    # 如果指定了特定周期，需要确定对应的上一周期
-    if week and week != 'all':
-        # 添加特定周期的上一周期计算逻辑
-        prev_query = prev_query.filter(models.SalesData.week == "上周")
-    else:
-        prev_query = prev_query.filter(models.SalesData.week == "上周")
-    
-    prev_result = {r.sales_person: {
-        "amount": float(r.prev_sales_amount), 
-        "volume": float(r.prev_sales_volume),
-        "orders": int(r.prev_order_count)
-    } for r in prev_query.group_by(models.SalesData.sales_person).all()}
-    
-    # 格式化结果
-    salesperson_data = []
-    for r in current_result:
-        if not r.sales_person:
-            continue
-            
-        # 当前数据
-        current_amount = float(r.sales_amount)
-        current_volume = float(r.sales_volume)
-        current_orders = int(r.order_count)
-        
-        # 获取历史数据
-        prev_data = prev_result.get(r.sales_person, {})
-        previous_amount = prev_data.get("amount", 0)
-        previous_volume = prev_data.get("volume", 0)
-        previous_orders = prev_data.get("orders", 0)
-        
-        # 计算变化率
-        amount_change_rate = 0
-        if previous_amount > 0:
-            amount_change_rate = (current_amount - previous_amount) / previous_amount * 100
-            
-        volume_change_rate = 0
-        if previous_volume > 0:
-            volume_change_rate = (current_volume - previous_volume) / previous_volume * 100
-            
-        orders_change_rate = 0
-        if previous_orders > 0:
-            orders_change_rate = (current_orders - previous_orders) / previous_orders * 100
-        
-        # 计算客单价
-        current_avg_order = 0
-        if current_orders > 0:
-            current_avg_order = current_amount / current_orders
-            
-        previous_avg_order = 0
-        if previous_orders > 0:
-            previous_avg_order = previous_amount / previous_orders
-            
-        # 利润率变化 (假设这个数据暂不可用)
-        current_profit_rate = None
-        previous_profit_rate = None
-        profit_rate_change = None
-        
-        # 将数据添加到结果列表
-        salesperson_data.append({
-            "sales_person": r.sales_person,
-            "sales_amount": current_amount,  # 为前端兼容性保留此字段
-            "sales_volume": current_volume,  # 为前端兼容性保留此字段
-            "order_count": current_orders,   # 为前端兼容性保留此字段
-            "average_order": round(current_avg_order, 2),  # 为前端兼容性保留此字段
-            "change_rate": round(amount_change_rate, 2),   # 为前端兼容性保留此字段
-            
-            # 添加前端表格需要的所有字段
-            "current_amount": current_amount,
-            "previous_amount": previous_amount,
-            "amount_change_rate": round(amount_change_rate, 2),
-            
-            "current_volume": current_volume,
-            "previous_volume": previous_volume,
-            "volume_change_rate": round(volume_change_rate, 2),
-            
-            "current_orders": current_orders,
-            "previous_orders": previous_orders,
-            "orders_change_rate": round(orders_change_rate, 2),
-            
-            "current_profit_rate": current_profit_rate,
-            "previous_profit_rate": previous_profit_rate,
-            "profit_rate_change": profit_rate_change
-        })
-    
-    # 按销售额排序
-    salesperson_data.sort(key=lambda x: x["sales_amount"], reverse=True)
-    
-    return salesperson_data
+    return models.get_salesperson_performance(db, week)
 
 @app.post("/ai/generate-analysis/")
 async def ai_analysis(request: AnalysisRequest):
@@ -342,99 +604,19 @@ async def generate_analysis_with_timeout(request: AnalysisRequest):
     )
 
 @app.get("/analysis/platform-detail/")
+@cache.cached
 def get_platform_detail(db: Session = Depends(get_db), week: Optional[str] = None):
     """获取各平台销售详情"""
-    # 查询当前周期数据
-    current_query = db.query(
-        models.SalesData.platform,
-        func.sum(models.SalesData.sales_amount).label("sales_amount"),
-        func.sum(models.SalesData.sales_volume).label("sales_volume"),
-        func.sum(models.SalesData.order_count).label("order_count")
-    )
-    
-    # 如果指定了特定周期，按指定周期筛选，否则使用"本周"
-    if week and week != 'all':
-        # 这里可以添加逻辑来处理特定周期格式
-        current_query = current_query.filter(models.SalesData.week == week)
-    else:
-        current_query = current_query.filter(models.SalesData.week == "本周")
-    
-    current_result = current_query.group_by(models.SalesData.platform).all()
-    
-    # 查询上一周期数据以计算环比
-    prev_query = db.query(
-        models.SalesData.platform,
-        func.sum(models.SalesData.sales_amount).label("prev_sales_amount")
-    )
-    
-    # 如果指定了特定周期，需要确定对应的上一周期
-    # 简化处理：未指定周期时使用"上周"
-    if week and week != 'all':
-        # 如果是特定周期格式如"2024-W01"，可以添加逻辑计算上一周期
-        # 目前简化为使用"上周"
-        prev_query = prev_query.filter(models.SalesData.week == "上周")
-    else:
-        prev_query = prev_query.filter(models.SalesData.week == "上周")
-    
-    prev_result = {r.platform: float(r.prev_sales_amount) if r.prev_sales_amount else 0 for r in prev_query.group_by(models.SalesData.platform).all()}
-    
-    # 格式化结果
-    platform_details = []
-    for r in current_result:
-        if not r.platform:
-            continue
-            
-        prev_amount = prev_result.get(r.platform, 0)
-        change_rate = 0
-        if prev_amount > 0:
-            change_rate = (float(r.sales_amount) - prev_amount) / prev_amount * 100
-            
-        platform_details.append({
-            "platform": r.platform,
-            "sales_amount": float(r.sales_amount) if r.sales_amount else 0,
-            "sales_volume": float(r.sales_volume) if r.sales_volume else 0,
-            "order_count": int(r.order_count) if r.order_count else 0,
-            "previous_amount": prev_amount,
-            "change_rate": round(change_rate, 2)
-        })
-    
-    # 如果没有数据，返回一个空数组
-    if not platform_details:
-        return []
-        
-    # 按销售额排序
-    platform_details.sort(key=lambda x: x["sales_amount"], reverse=True)
-    
-    return platform_details
+    return models.get_platform_detail(db, week)
 
 @app.get("/analysis/platform-sales-distribution/")
+@cache.cached
 def get_platform_sales_distribution(db: Session = Depends(get_db), week: Optional[str] = None):
     """获取各平台销售占比数据"""
-    # 查询平台销售数据
-    query = db.query(
-        models.SalesData.platform,
-        func.sum(models.SalesData.sales_amount).label("total_sales")
-    )
-    
-    # 如果指定了周次，按周次筛选
-    if week and week != 'all':
-        query = query.filter(models.SalesData.week == week)
-    else:
-        # 默认使用本周数据
-        query = query.filter(models.SalesData.week == "本周")
-    
-    result = query.group_by(models.SalesData.platform).all()
-    
-    # 转换为字典格式 {platform_name: sales_amount}
-    platform_sales = {r.platform: float(r.total_sales) if r.total_sales else 0 for r in result if r.platform}
-    
-    # 如果没有数据，返回一个空字典
-    if not platform_sales:
-        return {}
-        
-    return platform_sales
+    return models.get_platform_sales_distribution(db, week)
 
 @app.get("/analysis/no-orders-this-week/", response_model=List[schemas.ProductAnalysis])
+@cache.cached
 def get_no_orders_this_week(db: Session = Depends(get_db)):
     """获取上周有出单但本周没有出单的SKU"""
     try:
@@ -444,12 +626,99 @@ def get_no_orders_this_week(db: Session = Depends(get_db)):
         print(f"获取上周有单本周无单SKU时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
 
+@app.get("/analysis/weekly-dashboard/", response_model=schemas.WeeklyDashboard)
+@cache.cached
+def get_weekly_dashboard(db: Session = Depends(get_db), week: Optional[str] = None):
+    """周看板的全部面板：一个连接、一个读事务内计算，一次返回
+
+    商品相关的五个面板共用一次商品汇总读取；week只影响销量/销售额Top，与单独的接口一致。
+    各面板直接调用models中的函数，不经过单个接口的结果缓存，全部结果来自同一个快照。
+    面板在同一个连接上依次执行：一个数据库连接不能并发执行查询，分到多个连接则不再是同一个快照。
+    """
+    try:
+        with database.read_snapshot(db):
+            dashboard = models.get_weekly_product_panels(db, week=week, limit=5)
+            dashboard.update({
+                "country_distribution": models.get_country_sales_distribution(db),
+                "platform_comparison": models.get_platform_comparison(db),
+                "platform_detail": models.get_platform_detail(db),
+                "salesperson_comparison": models.get_salesperson_performance(db),
+                "platform_sales_distribution": models.get_platform_sales_distribution(db)
+            })
+            return dashboard
+    except Exception as e:
+        print(f"获取周看板数据时出错: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
+
+@app.get("/analysis/history/uploads/")
+@cache.cached
+def get_history_uploads():
+    """列出历史归档中的上传，最新的在前"""
+    return archive.list_uploads()
+
+@app.get("/analysis/history/trend/")
+@cache.cached
+def get_history_trend(metric: str = "sales_amount", dimension: Optional[str] = None, period_type: str = "month",
+                      periods: Optional[str] = None, uploads: Optional[str] = None, latest: bool = True):
+    """从历史归档读取多个周期的指标，不读取数据库
+
+    periods、uploads为逗号分隔的列表，不传时不限；periods可以是"2024-09"、"2024-W05"或周期起始日期，
+    返回的period为周期起始日期。latest为True时同一周期只取最近一次上传的数据。
+    """
+    if not archive.ARCHIVE_ENABLED:
+        raise HTTPException(status_code=503, detail="历史归档不可用（需要安装pyarrow）")
+    metrics = [name.strip() for name in metric.split(",") if name.strip()]
+    if not metrics or any(name not in archive.ARCHIVE_METRICS for name in metrics):
+        raise HTTPException(status_code=400, detail=f"不支持的指标: {metric}")
+    if dimension and dimension not in archive.ARCHIVE_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"不支持的维度: {dimension}")
+    if period_type not in rollups.PERIOD_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的周期类型: {period_type}")
+    
+    def split(value):
+        return [item.strip() for item in value.split(",")] if value else None
+    
+    try:
+        result = archive.query(metrics, dimension=dimension, period_type=period_type,
+                               periods=split(periods), uploads=split(uploads), latest=latest)
+        return result.astype(object).where(result.notna(), None).to_dict(orient="records")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"读取历史归档时出错: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"历史数据查询错误: {str(e)}")
+
+@app.get("/analysis/trend/")
+@cache.cached
+def get_trend(db: Session = Depends(get_db), dimension: str = "total", member: Optional[str] = None,
+              period_type: str = "week", periods: int = 8, end: Optional[date] = None, yoy: bool = False):
+    """某个商品(sku)、平台、国家或销售人员最近N个周期的趋势，yoy=true时附带去年同期和同比
+
+    dimension为total时是全部数据的合计；end为最后一个周期内的任一日期，默认取最近的周期。
+    """
+    if dimension not in models.TREND_MEMBER_ATTRIBUTES:
+        raise HTTPException(status_code=400, detail=f"不支持的维度: {dimension}")
+    if models.TREND_MEMBER_ATTRIBUTES[dimension] and not member:
+        raise HTTPException(status_code=400, detail="请指定member")
+    if period_type not in rollups.PERIOD_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的周期类型: {period_type}")
+    if not 1 <= periods <= 260:
+        raise HTTPException(status_code=400, detail="periods应在1到260之间")
+    
+    try:
+        points = models.get_trend(db, dimension, member, period_type, periods, end, yoy)
+        return {"dimension": dimension, "member": member, "period_type": period_type, "points": points}
+    except Exception as e:
+        print(f"获取趋势数据时出错: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
+
 @app.get("/")
 def read_root():
     return {"message": "跨境电商销售数据分析系统 API 服务正在运行"}
 
 # 获取可用月份列表
 @app.get("/analysis/available-months/")
+@cache.cached
 def get_months(db: Session = Depends(get_db)):
     """获取所有可用的月份"""
     try:
@@ -461,6 +730,7 @@ def get_months(db: Session = Depends(get_db)):
 
 # 月度数据API端点
 @app.get("/analysis/month-top-sales-volume/")
+@cache.cached
 def get_month_top_sales_volume(month: Optional[str] = None, db: Session = Depends(get_db)):
     """获取月度销量Top10"""
     try:
@@ -471,6 +741,7 @@ def get_month_top_sales_volume(month: Optional[str] = None, db: Session = Depend
         raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
 
 @app.get("/analysis/month-top-sales-amount/")
+@cache.cached
 def get_month_top_sales_amount(month: Optional[str] = None, db: Session = Depends(get_db)):
     """获取月度销售额Top10"""
     try:
@@ -481,6 +752,7 @@ def get_month_top_sales_amount(month: Optional[str] = None, db: Session = Depend
         raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
 
 @app.get("/analysis/month-top-increased/")
+@cache.cached
 def get_month_top_increased(current_month: Optional[str] = None, previous_month: Optional[str] = None, db: Session = Depends(get_db)):
     """获取月度环比销量上升Top10"""
     try:
@@ -491,6 +763,7 @@ def get_month_top_increased(current_month: Optional[str] = None, previous_month:
         raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
 
 @app.get("/analysis/month-top-decreased/")
+@cache.cached
 def get_month_top_decreased(current_month: Optional[str] = None, previous_month: Optional[str] = None, db: Session = Depends(get_db)):
     """获取月度环比销量下降Top10"""
     try:
@@ -501,6 +774,7 @@ def get_month_top_decreased(current_month: Optional[str] = None, previous_month:
         raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
 
 @app.get("/analysis/month-country-distribution/")
+@cache.cached
 def get_month_country_distribution(current_month: Optional[str] = None, previous_month: Optional[str] = None, db: Session = Depends(get_db)):
     """获取月度国家销售额分布"""
     try:
@@ -511,6 +785,7 @@ def get_month_country_distribution(current_month: Optional[str] = None, previous
         raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
 
 @app.get("/analysis/month-platform-comparison/")
+@cache.cached
 def get_month_platform_comparison(current_month: Optional[str] = None, previous_month: Optional[str] = None, db: Session = Depends(get_db)):
     """获取月度平台销售数据环比"""
     try:
@@ -521,6 +796,7 @@ def get_month_platform_comparison(current_month: Optional[str] = None, previous_
         raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
 
 @app.get("/analysis/month-salesperson-comparison/")
+@cache.cached
 def get_month_salesperson_comparison(current_month: Optional[str] = None, previous_month: Optional[str] = None, db: Session = Depends(get_db)):
     """获取月度销售人员数据环比"""
     try:
@@ -530,174 +806,79 @@ def get_month_salesperson_comparison(current_month: Optional[str] = None, previo
         print(f"获取月度销售人员数据环比时出错: {str(e)}")
         raise HTTPException(status_code=500, detail=f"数据查询错误: {str(e)}")
 
-def process_data(df):
-    """处理和清洗上传的数据"""
-    # 表头映射
-    column_mapping = {
-        'sku': 'sku',
-        'spu': 'spu',
-        '名称': 'product_name',
-        '店铺': 'shop',
-        '站点': 'site',
-        '仓库': 'warehouse',
-        '销量': 'sales_volume',
-        '销售额': 'sales_amount', 
-        '买家国家': 'buyer_country',
-        '平台': 'platform',
-        '销售': 'sales_person',
-        '订单数': 'order_count',
-        '销售毛利额': 'profit',
-        '毛利率': 'profit_rate',
-        '周': 'week',
-        '订单状态': 'order_status',
-        '月': 'month'
-    }
+def save_to_database(frames, db, on_progress=None, fingerprint=None, source=None, as_of=None, rolling=False,
+                     upsert=False):
+    """保存处理后的数据到数据库 - 先写入影子表，全部完成后原子切换
+
+    frames可以是单个DataFrame，也可以是逐块产生DataFrame的迭代器；
+    导入期间看板始终读到上一份完整数据。on_progress(stage=, rows_processed=)用于汇报进度，
+    fingerprint为这份数据对应的上传指纹（用于重复上传判断），source为来源文件名（记入历史归档），
+    as_of为数据截止日期（相对周期换算为绝对日期的基准，默认今天）。
+    rolling时frames只含本周数据，当前数据中窗口内的周在库内复制并改标后一同发布；
+    upsert时frames是修正数据，按自然键在正式表上原地更新或新增，不经过影子表。
+    """
+    if isinstance(frames, pd.DataFrame):
+        frames = [frames]
     
-    # 重命名列
-    df_renamed = df.rename(columns={original: mapped for original, mapped in column_mapping.items() if original in df.columns})
-    
-    # 确保所有必需的列都存在
-    required_columns = ['sku', 'product_name', 'sales_volume', 'sales_amount', 'week']
-    for col in required_columns:
-        if col not in df_renamed.columns:
-            print(f"缺少必要的列: {col}")
-            raise ValueError(f"缺少必要的列: {col}")
-    
-    # 数据类型转换
-    if 'sales_volume' in df_renamed.columns:
-        df_renamed['sales_volume'] = pd.to_numeric(df_renamed['sales_volume'], errors='coerce')
-    if 'sales_amount' in df_renamed.columns:
-        df_renamed['sales_amount'] = pd.to_numeric(df_renamed['sales_amount'], errors='coerce')
-    if 'profit' in df_renamed.columns:
-        df_renamed['profit'] = pd.to_numeric(df_renamed['profit'], errors='coerce')
-    if 'profit_rate' in df_renamed.columns:
-        df_renamed['profit_rate'] = pd.to_numeric(df_renamed['profit_rate'], errors='coerce')
-    if 'order_count' in df_renamed.columns:
-        df_renamed['order_count'] = pd.to_numeric(df_renamed['order_count'], errors='coerce')
-    
-    # 处理空值
-    df_renamed = df_renamed.fillna({
-        'sales_volume': 0, 
-        'sales_amount': 0, 
-        'profit': 0, 
-        'profit_rate': 0, 
-        'order_count': 0,
-        'shop': '',
-        'site': '',
-        'warehouse': '',
-        'buyer_country': '',
-        'platform': '',
-        'sales_person': '',
-        'order_status': '',
-        'month': ''
-    })
-    
-    # 确保字符串列不为NaN
-    string_cols = ['sku', 'spu', 'product_name', 'shop', 'site', 'warehouse', 
-                  'buyer_country', 'platform', 'sales_person', 'order_status', 'week', 'month']
-    for col in string_cols:
-        if col in df_renamed.columns:
-            df_renamed[col] = df_renamed[col].fillna('').astype(str)
-    
-    # 检查数据类型转换后的结果
-    print("数据类型转换后：")
-    for col in df_renamed.columns:
-        print(f"{col}: {df_renamed[col].dtype}")
-    
-    # 在返回前过滤掉不在模型字段中的列
-    model_fields = [column.name for column in models.SalesData.__table__.columns]
-    valid_columns = [col for col in df_renamed.columns if col in model_fields]
+    engine = db.get_bind()
+    resolver = dimensions.DimensionResolver(engine)
+    if upsert:
+        # 修正数据不记入历史归档：归档中每个周期取最近一次上传的完整数据
+        total_rows = upsert_rows.apply(frames, engine, resolver, anchor=as_of, on_progress=on_progress)["rows"]
+        columnar.reload(engine)
+        # 当前数据已不等同于任何一次上传，重新上传原文件时需要重新导入
+        frame_cache.mark_current(None)
+        return total_rows
     
-    # 返回只包含有效列的数据帧
-    return df_renamed[valid_columns]
-
-def save_to_database(df, db):
-    """保存处理后的数据到数据库 - 使用批量插入提高性能"""
+    row_keys = upsert_rows.RowKeys()
+    rollup = rollups.RollupBuilder(anchor=as_of)
+    generation = loader.TableGeneration(
+        engine, tables=[models.SalesData.__table__, models.SalesRollup.__table__, models.PeriodCatalog.__table__]
+    ).begin()
+    history = archive.ArchiveWriter(fingerprint, source, anchor=as_of)
+    carried = rolling_window.carried_weeks(as_of) if rolling else {}
     try:
-        # 首先清空现有数据
-        print("清空现有数据...")
-        db.query(models.SalesData).delete()
-        db.commit()
-        print("数据表已清空")
-
-        # 获取模型中定义的字段列表
-        model_fields = [column.name for column in models.SalesData.__table__.columns]
-        print(f"模型字段: {model_fields}")
-        
-        # 过滤DataFrame，只保留模型中存在的列
-        valid_df = df[[col for col in df.columns if col in model_fields]]
-        
-        # 打印前几行数据用于调试
-        print(f"即将保存的数据预览(前5行):")
-        print(valid_df.head())
-        
-        # 记录总行数
-        total_rows = len(valid_df)
-        
-        # 批量大小 - 较大的批量可以提高性能，但不要太大以避免超时
-        batch_size = 100
-        
-        # 批量处理
-        for i in range(0, total_rows, batch_size):
-            batch_df = valid_df.iloc[i:min(i+batch_size, total_rows)]
-            
-            # 创建批量对象
-            batch_objects = []
-            for _, row in batch_df.iterrows():
-                data_dict = {k: v for k, v in row.to_dict().items() if k in model_fields}
-                batch_objects.append(models.SalesData(**data_dict))
-            
-            # 批量添加到会话
-            db.bulk_save_objects(batch_objects)
-            
-            # 每个批次都提交，避免事务过大
-            db.commit()
-            
-            print(f"已处理 {min(i+batch_size, total_rows)}/{total_rows} 行数据")
+        total_rows = 0
+        for df in frames:
+            if rolling:
+                df = rolling_window.current_week(df, as_of)
+            # 清洗后的数据同时写入历史归档
+            history.add(df)
+            # 维度字符串替换为整数键、周期标签解析出起始日期后写入事实表，同时累加看板汇总
+            fact = rollups.add_period_keys(resolver.resolve(df), as_of)
+            fact["row_key"] = row_keys.assign(fact)
+            rollup.add(fact)
+            total_rows += generation.append(fact)["rows"]
+            print(f"已写入影子表 {total_rows} 行数据")
+            if on_progress:
+                on_progress(stage="loading", rows_processed=total_rows)
         
+        if on_progress:
+            on_progress(stage="publishing")
+        if carried:
+            # 保留的旧周不经过Python：事实行库内复制，汇总由数据库GROUP BY后并入
+            carried_rows = rolling_window.carry_over(generation, carried)
+            for partial in rolling_window.rollup_partials(engine, carried):
+                rollup.add_partial(partial)
+            print(f"滚动导入: 新增本周 {total_rows} 行，保留 {carried_rows} 行旧数据")
+        # 汇总表、周期目录与事实表同一次切换，看板不会读到新旧混合的数据
+        rollup_frame = rollup.frame()
+        generation.append(rollup_frame, table=models.SalesRollup.__table__)
+        generation.append(rollups.catalog_frame(rollup_frame), table=models.PeriodCatalog.__table__)
+        # 归档先于发布登记：发布时递增数据版本，之后读到新版本的历史查询一定能看到这次上传
+        history.commit()
+        generation.publish()
+        # 数据已切换（发布时已递增数据版本，各进程缓存的分析结果随之失效）：启用内存引擎时载入新数据
+        columnar.reload(engine)
+        frame_cache.mark_current(fingerprint)
         return total_rows
         
     except Exception as e:
-        db.rollback()
+        generation.discard()
+        history.discard()
         print(f"提交到数据库失败: {str(e)}")
         raise
 
-def get_date_range_for_week(week: Optional[str] = None):
-    """根据周次参数获取日期范围"""
-    if not week or week == 'all':
-        return None, None
-        
-    try:
-        # 假设week格式为 "2023-W01" 表示2023年第1周
-        if 'W' in week:
-            year, week_num = week.split('-W')
-            year = int(year)
-            week_num = int(week_num)
-            
-            # 计算该周的开始日期（周一）
-            start_date = datetime.strptime(f'{year}-{week_num}-1', '%Y-%W-%w')
-            if start_date.year != year:
-                start_date = datetime.strptime(f'{year}-{week_num}-0', '%Y-%W-%w')
-                start_date += timedelta(days=1)
-                
-            end_date = start_date + timedelta(days=6)
-            return start_date.date(), end_date.date()
-        else:
-            # 假设直接是日期范围 "2023-01-01_2023-01-07"
-            dates = week.split('_')
-            if len(dates) == 2:
-                start_date = datetime.strptime(dates[0], '%Y-%m-%d').date()
-                end_date = datetime.strptime(dates[1], '%Y-%m-%d').date()
-                return start_date, end_date
-            
-    except Exception as e:
-        print(f"解析日期时出错: {e}")
-    
-    # 默认返回最近7天
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=6)
-    return start_date, end_date
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
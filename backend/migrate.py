@@ -0,0 +1,383 @@
+"""数据库索引迁移与执行计划检查
+
+用法:
+    python migrate.py          # 旧版宽表转换为事实表+维度表，补算看板汇总表和周期目录，补齐周期起始日期列和自然键，
+                               # 按models中的定义补建缺失索引，删除已被取代的旧索引
+    python migrate.py --check  # 对所有分析接口实际发出的查询执行EXPLAIN，读取事实表或全表扫描汇总表时返回非0
+"""
+import re
+import sys
+import inspect as pyinspect
+import pandas as pd
+from sqlalchemy import inspect, event, text
+from database import engine, SessionLocal
+import models
+import loader
+import dimensions
+import rollups
+import upsert
+
+# 旧版本自动生成的索引（index=True）和事实表上已改由汇总表承担的覆盖索引都以此为前缀，
+# 只清理这一类，不动手工添加的索引
+AUTO_INDEX_PREFIX = "ix_sales_"
+
+
+def migrate_indexes(bind=engine, table=None):
+    """让数据库中的索引与模型定义一致，返回 (新建的索引, 删除的索引)"""
+    table = table if table is not None else models.SalesData.__table__
+    inspector = inspect(bind)
+    if not inspector.has_table(table.name):
+        print(f"表 {table.name} 不存在，直接按模型建表")
+        table.create(bind)
+        return [index.name for index in table.indexes], []
+
+    existing = {index["name"] for index in inspector.get_indexes(table.name)}
+    wanted = {index.name for index in table.indexes}
+
+    created, dropped = [], []
+    with bind.begin() as connection:
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                print(f"创建索引 {index.name} ({', '.join(col.name for col in index.columns)})")
+                index.create(connection)
+                created.append(index.name)
+        for name in sorted(existing - wanted):
+            if name and name.startswith(AUTO_INDEX_PREFIX):
+                print(f"删除已被取代的索引 {name}")
+                if bind.dialect.name == "mysql":
+                    connection.execute(text(f"DROP INDEX {name} ON {table.name}"))
+                else:
+                    connection.execute(text(f"DROP INDEX {name}"))
+                dropped.append(name)
+
+        # 更新统计信息，让优化器选择新索引
+        if bind.dialect.name == "mysql":
+            connection.execute(text(f"ANALYZE TABLE {table.name}"))
+        else:
+            connection.execute(text("ANALYZE"))
+
+    if not created and not dropped:
+        print("索引已是最新，无需迁移")
+    return created, dropped
+
+
+def migrate_star_schema(bind=engine, batch_size=None):
+    """把旧版宽表（维度以字符串保存在每一行）转换为事实表+维度表，返回转换的行数
+
+    按id分页读取旧表，解析维度键后写入影子表，最后原子切换；已是新结构时直接返回0。
+    """
+    table = models.SalesData.__table__
+    inspector = inspect(bind)
+    if not inspector.has_table(table.name):
+        return 0
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    if all(key in existing for key in models.DIMENSIONS):
+        return 0
+
+    print(f"检测到旧版宽表 {table.name}，开始转换为事实表+维度表...")
+    batch_size = batch_size or loader.INGEST_BATCH_SIZE
+    resolver = dimensions.DimensionResolver(bind)
+    generation = loader.TableGeneration(bind).begin()
+    try:
+        total_rows = 0
+        last_id = 0
+        while True:
+            # 每页读完再写入，避免SQLite读游标未关闭时写入被锁
+            chunk = pd.read_sql_query(
+                text(f"SELECT * FROM {table.name} WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                bind, params={"last_id": last_id, "limit": batch_size}
+            )
+            if chunk.empty:
+                break
+            last_id = int(chunk["id"].iloc[-1])
+            total_rows += generation.append(resolver.resolve(chunk))["rows"]
+            print(f"已转换 {total_rows} 行")
+        generation.publish()
+    except Exception:
+        generation.discard()
+        raise
+    print(f"宽表转换完成，共 {total_rows} 行")
+    return total_rows
+
+
+def migrate_rollups(bind=engine, batch_size=None):
+    """为已有的事实表补算看板汇总表，返回读取的事实行数；汇总表已有数据时直接返回0"""
+    fact_table = models.SalesData.__table__
+    rollup_table = models.SalesRollup.__table__
+    inspector = inspect(bind)
+    if not inspector.has_table(fact_table.name):
+        return 0
+    if inspector.has_table(rollup_table.name):
+        with bind.connect() as connection:
+            if connection.execute(text(f"SELECT 1 FROM {rollup_table.name} LIMIT 1")).first():
+                return 0
+
+    print(f"开始根据 {fact_table.name} 生成汇总表 {rollup_table.name}...")
+    batch_size = batch_size or loader.INGEST_BATCH_SIZE
+    builder = rollups.RollupBuilder()
+    generation = loader.TableGeneration(bind, tables=[rollup_table]).begin()
+    try:
+        total_rows = 0
+        last_id = 0
+        while True:
+            chunk = pd.read_sql_query(
+                text(f"SELECT * FROM {fact_table.name} WHERE id > :last_id ORDER BY id LIMIT :limit"),
+                bind, params={"last_id": last_id, "limit": batch_size}
+            )
+            if chunk.empty:
+                break
+            last_id = int(chunk["id"].iloc[-1])
+            builder.add(chunk)
+            total_rows += len(chunk)
+        generation.append(builder.frame())
+        generation.publish()
+    except Exception:
+        generation.discard()
+        raise
+    print(f"汇总表生成完成，共读取 {total_rows} 行")
+    return total_rows
+
+
+def migrate_period_catalog(bind=engine):
+    """根据汇总表的total行补建周期目录，返回登记的周期数；周期目录已有数据时直接返回0"""
+    rollup_table = models.SalesRollup.__table__
+    catalog_table = models.PeriodCatalog.__table__
+    inspector = inspect(bind)
+    if not inspector.has_table(rollup_table.name):
+        return 0
+    if inspector.has_table(catalog_table.name):
+        with bind.connect() as connection:
+            if connection.execute(text(f"SELECT 1 FROM {catalog_table.name} LIMIT 1")).first():
+                return 0
+
+    totals = pd.read_sql_query(
+        text(f"SELECT period_type, period, dimension, row_count FROM {rollup_table.name} WHERE dimension = 'total'"),
+        bind
+    )
+    catalog = rollups.catalog_frame(totals)
+    generation = loader.TableGeneration(bind, tables=[catalog_table]).begin()
+    try:
+        generation.append(catalog)
+        generation.publish()
+    except Exception:
+        generation.discard()
+        raise
+    print(f"周期目录生成完成，共 {len(catalog)} 个周期")
+    return len(catalog)
+
+
+# 保存周期起始日期的列：(表, 列, 周期类型列或固定周期类型, 周期标签列)
+_PERIOD_KEY_COLUMNS = (
+    (models.SalesData.__table__, "week_start", "week", "week"),
+    (models.SalesData.__table__, "month_start", "month", "month"),
+    (models.SalesRollup.__table__, "period_start", None, "period"),
+    (models.PeriodCatalog.__table__, "period_start", None, "period"),
+)
+
+
+def migrate_period_keys(bind=engine, anchor=None):
+    """为旧表补加周期起始日期列并按周期标签回填，返回回填的不同标签数
+
+    数据中的"本周"/"上周"、"9月"等相对标签以anchor（默认今天）为截止日期换算，
+    与导入时的行为一致；回填后原标签不变，只有起始日期为空的行会被更新。
+    """
+    inspector = inspect(bind)
+    filled = 0
+    for table, column, fixed_type, label_column in _PERIOD_KEY_COLUMNS:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table.name)}
+        with bind.begin() as connection:
+            if column not in existing:
+                print(f"为 {table.name} 添加列 {column}")
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column} DATE NULL"))
+            type_column = "period_type" if fixed_type is None else f"'{fixed_type}'"
+            labels = connection.execute(text(
+                f"SELECT DISTINCT {type_column}, {label_column} FROM {table.name} "
+                f"WHERE {column} IS NULL AND {label_column} IS NOT NULL"
+            )).fetchall()
+            for period_type, label in labels:
+                start = rollups.period_start(period_type, label, anchor)
+                if start is None:
+                    continue
+                condition = "" if fixed_type is not None else " AND period_type = :period_type"
+                connection.execute(
+                    text(f"UPDATE {table.name} SET {column} = :start "
+                         f"WHERE {label_column} = :label AND {column} IS NULL{condition}"),
+                    {"start": start, "label": label, "period_type": period_type}
+                )
+                filled += 1
+    if filled:
+        print(f"已回填 {filled} 个周期标签的起始日期，相对周期按 {anchor or '今天'} 换算")
+    return filled
+
+
+def migrate_row_keys(bind=engine, batch_size=None):
+    """为事实表补加row_key列并按自然键回填（增量导入依赖它的唯一索引），返回回填的行数
+
+    重复的自然键按id顺序编号，与导入时的规则一致；已全部有值时直接返回0。
+    """
+    table = models.SalesData.__table__
+    inspector = inspect(bind)
+    if not inspector.has_table(table.name):
+        return 0
+    with bind.begin() as connection:
+        if "row_key" not in {column["name"] for column in inspector.get_columns(table.name)}:
+            print(f"为 {table.name} 添加列 row_key")
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN row_key VARCHAR(160) NULL"))
+        if not connection.execute(text(f"SELECT 1 FROM {table.name} WHERE row_key IS NULL LIMIT 1")).first():
+            return 0
+
+    batch_size = batch_size or loader.INGEST_BATCH_SIZE
+    columns = ["id", "week", "month"] + [column for column in upsert.NATURAL_KEY]
+    keys = upsert.RowKeys()
+    total_rows = 0
+    last_id = 0
+    while True:
+        chunk = pd.read_sql_query(
+            text(f"SELECT {', '.join(columns)} FROM {table.name} WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            bind, params={"last_id": last_id, "limit": batch_size}
+        )
+        if chunk.empty:
+            break
+        last_id = int(chunk["id"].iloc[-1])
+        for column in ("week_start", "month_start"):
+            chunk[column] = pd.to_datetime(chunk[column]).dt.date.astype(object).where(chunk[column].notna(), None)
+        chunk["row_key"] = keys.assign(chunk)
+        with bind.begin() as connection:
+            connection.execute(
+                text(f"UPDATE {table.name} SET row_key = :row_key WHERE id = :row_id"),
+                [{"row_key": key, "row_id": int(row_id)} for row_id, key in zip(chunk["id"], chunk["row_key"])]
+            )
+        total_rows += len(chunk)
+        print(f"已回填 {total_rows} 行自然键")
+    return total_rows
+
+
+def _endpoint_calls(endpoint, db):
+    """生成接口的调用参数：默认参数一次，按周/按月筛选各一次；不读数据库的接口不传db"""
+    parameters = pyinspect.signature(endpoint).parameters
+    base = {"db": db} if "db" in parameters else {}
+    yield base
+    if "week" in parameters:
+        yield {**base, "week": "本周"}
+    if "month" in parameters:
+        months = models.get_available_months(db)
+        if months:
+            yield {**base, "month": months[0]}
+
+
+def capture_analysis_queries(bind=engine):
+    """调用所有GET /analysis/ 接口，记录它们实际发出的SELECT语句和参数"""
+    from main import app
+
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and re.search(r"\bsales_(data|rollup)\b", statement):
+            captured.append((statement, parameters))
+
+    event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    db = SessionLocal(bind=bind)
+    db.info["columnar_store"] = None   # 启用内存引擎时也检查SQL路径
+    try:
+        for route in app.routes:
+            if not route.path.startswith("/analysis/") or "GET" not in getattr(route, "methods", ()):
+                continue
+            for kwargs in _endpoint_calls(route.endpoint, db):
+                try:
+                    route.endpoint(**kwargs)
+                except Exception as e:
+                    print(f"调用 {route.path} 出错: {str(e)}")
+    finally:
+        db.close()
+        event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+    # 同一条语句只检查一次
+    unique = {}
+    for statement, parameters in captured:
+        unique.setdefault(statement, parameters)
+    return list(unique.items())
+
+
+def _aliases(statement, table_name):
+    """语句中某张表的表名及其所有别名（执行计划中按别名显示）"""
+    return {table_name} | set(re.findall(rf"\b{table_name}\s+AS\s+(\w+)", statement, re.IGNORECASE))
+
+
+def _explain_sqlite(connection, statement, parameters):
+    """返回 (问题列表, 计划文本)；分析查询不应读取事实表，读取汇总表必须走索引，
+
+    并且与汇总表同一层的分组、排序要沿索引顺序完成（不能对汇总行建临时B树），
+    只有按成员聚合后的子查询结果可以再排序。
+    """
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    details = [row[-1] for row in rows]
+    fact_names = _aliases(statement, models.SalesData.__tablename__)
+    rollup_names = _aliases(statement, models.SalesRollup.__tablename__)
+    problems = []
+    rollup_levels = set()
+    for row in rows:
+        detail = row[-1]
+        words = detail.split()
+        if len(words) < 2 or words[0] not in ("SCAN", "SEARCH"):
+            continue
+        if words[1] in fact_names:
+            problems.append(detail)
+        elif words[1] in rollup_names:
+            rollup_levels.add(row[1])
+            if words[0] == "SCAN" or "INDEX" not in detail:
+                problems.append(detail)
+    # EXPLAIN QUERY PLAN的每行为 (id, parent, notused, detail)，同一parent即同一层查询
+    problems += [row[-1] for row in rows if "TEMP B-TREE" in row[-1] and row[1] in rollup_levels]
+    return problems, details
+
+
+def _explain_mysql(connection, statement, parameters):
+    """返回 (问题列表, 计划文本)；读取事实表或对汇总表type=ALL全表扫描都视为问题"""
+    result = connection.exec_driver_sql("EXPLAIN " + statement, parameters)
+    columns = list(result.keys())
+    details, problems = [], []
+    for row in result.fetchall():
+        plan = dict(zip(columns, row))
+        detail = f"table={plan.get('table')} type={plan.get('type')} key={plan.get('key')} extra={plan.get('Extra')}"
+        details.append(detail)
+        if plan.get("table") == models.SalesData.__tablename__:
+            problems.append(detail)
+        elif plan.get("table") == models.SalesRollup.__tablename__ and plan.get("type") == "ALL":
+            problems.append(detail)
+    return problems, details
+
+
+def check_query_plans(bind=engine):
+    """检查所有分析查询的执行计划，返回存在问题的查询数"""
+    queries = capture_analysis_queries(bind)
+    explain = _explain_mysql if bind.dialect.name == "mysql" else _explain_sqlite
+    failures = 0
+    with bind.connect() as connection:
+        for statement, parameters in queries:
+            problems, details = explain(connection, statement, parameters)
+            summary = " ".join(statement.split())[:100]
+            if problems:
+                failures += 1
+                print(f"[未走索引] {summary}")
+                for detail in details:
+                    print(f"    {detail}")
+            else:
+                print(f"[OK] {summary}")
+    print(f"共检查 {len(queries)} 条查询，{failures} 条存在问题")
+    return failures
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv[1:]:
+        sys.exit(1 if check_query_plans() else 0)
+    migrate_star_schema()
+    migrate_rollups()
+    migrate_period_catalog()
+    migrate_period_keys()
+    migrate_row_keys()
+    models.Base.metadata.create_all(bind=engine)
+    migrate_indexes()
+    migrate_indexes(table=models.SalesRollup.__table__)
+    migrate_indexes(table=models.PeriodCatalog.__table__)
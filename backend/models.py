@@ -1,328 +1,791 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, func, text
-from sqlalchemy.sql import text
+import heapq
+from datetime import datetime
+from functools import lru_cache
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Index, UniqueConstraint, func, text
+from sqlalchemy import select, case, bindparam, and_, or_
+from sqlalchemy.engine import Engine
 from database import Base, engine
 from typing import List
+import columnar
+import rollups
+
+class Product(Base):
+    """商品维度"""
+    __tablename__ = "dim_product"
+
+    id = Column(Integer, primary_key=True)
+    sku = Column(String(100))
+    spu = Column(String(100))
+    product_name = Column(String(500))
+
+    __table_args__ = (
+        UniqueConstraint("sku", "spu", "product_name", name="uq_dim_product"),
+        Index("ix_dim_product_sku", "sku", "product_name"),
+    )
+
+class Platform(Base):
+    """平台维度"""
+    __tablename__ = "dim_platform"
+
+    id = Column(Integer, primary_key=True)
+    platform = Column(String(100), unique=True)
+
+class Shop(Base):
+    """店铺/站点维度"""
+    __tablename__ = "dim_shop"
+
+    id = Column(Integer, primary_key=True)
+    shop = Column(String(100))
+    site = Column(String(100))
+
+    __table_args__ = (UniqueConstraint("shop", "site", name="uq_dim_shop"),)
+
+class Warehouse(Base):
+    """仓库维度"""
+    __tablename__ = "dim_warehouse"
+
+    id = Column(Integer, primary_key=True)
+    warehouse = Column(String(100), unique=True)
+
+class BuyerCountry(Base):
+    """买家国家维度"""
+    __tablename__ = "dim_buyer_country"
+
+    id = Column(Integer, primary_key=True)
+    buyer_country = Column(String(100), unique=True)
+
+class SalesPerson(Base):
+    """销售人员维度"""
+    __tablename__ = "dim_sales_person"
+
+    id = Column(Integer, primary_key=True)
+    sales_person = Column(String(100), unique=True)
+
+# 事实表的维度键 -> (维度模型, 维度属性列)；维度属性列与清洗后的数据列同名
+DIMENSIONS = {
+    "product_id": (Product, ("sku", "spu", "product_name")),
+    "platform_id": (Platform, ("platform",)),
+    "shop_id": (Shop, ("shop", "site")),
+    "warehouse_id": (Warehouse, ("warehouse",)),
+    "buyer_country_id": (BuyerCountry, ("buyer_country",)),
+    "sales_person_id": (SalesPerson, ("sales_person",)),
+}
 
 class SalesData(Base):
+    """销售事实表：维度以整数代理键保存，只有窄的整数和浮点列
+
+    维度键不声明外键约束：事实表整表导入后切换，维度表只追加，由入库过程保证引用有效。
+    分析接口读取导入时生成的SalesRollup，不直接扫描这张表。
+    """
     __tablename__ = "sales_data"
     
     id = Column(Integer, primary_key=True, index=True)
-    sku = Column(String(100), index=True)
-    spu = Column(String(100), index=True)
-    platform = Column(String(100), index=True)
-    shop = Column(String(100))
-    site = Column(String(100))
-    warehouse = Column(String(100))
-    buyer_country = Column(String(100), index=True)
-    sales_person = Column(String(100), index=True)
+    product_id = Column(Integer)
+    platform_id = Column(Integer)
+    shop_id = Column(Integer)
+    warehouse_id = Column(Integer)
+    buyer_country_id = Column(Integer)
+    sales_person_id = Column(Integer)
     order_count = Column(Integer, default=0)
-    product_name = Column(String(500))
     sales_volume = Column(Float, default=0)
     sales_amount = Column(Float, default=0)
     cost = Column(Float, nullable=True)
     profit = Column(Float, nullable=True)
     profit_rate = Column(Float, default=0)
     order_status = Column(String(100), nullable=True)
-    week = Column(String(20), index=True)
+    week = Column(String(20))
     month = Column(String(20))
+    week_start = Column(Date, nullable=True)    # 所在ISO周的周一，由week标签解析
+    month_start = Column(Date, nullable=True)   # 所在月的1日，由month标签解析
+    row_key = Column(String(160), nullable=True)  # 自然键（见upsert.NATURAL_KEY），增量导入按它匹配
     created_at = Column(DateTime, default=func.now())
 
+    __table_args__ = (
+        Index("uq_sales_data_row_key", "row_key", unique=True),
+    )
+
+class SalesRollup(Base):
+    """导入时预先计算的汇总：每个 周期 × 维度成员 一行，分析接口只读这张表
+
+    member_id为对应维度表的键（dimension为total时为NULL，表示整个周期的合计）；
+    毛利率按行平均，因此保存总和与非空行数，平均值=profit_rate_sum/profit_rate_count。
+    period_start为周期的绝对起始日期（周一/1日），趋势查询按它做范围扫描。
+    """
+    __tablename__ = "sales_rollup"
+
+    id = Column(Integer, primary_key=True)
+    period_type = Column(String(10))   # week / month
+    period = Column(String(20))
+    period_start = Column(Date, nullable=True)
+    dimension = Column(String(20))     # ROLLUP_DIMENSIONS中的维度名
+    member_id = Column(Integer, nullable=True)
+    sales_amount = Column(Float, default=0)
+    sales_volume = Column(Float, default=0)
+    order_count = Column(Integer, default=0)
+    profit = Column(Float, default=0)
+    profit_rate_sum = Column(Float, default=0)
+    profit_rate_count = Column(Integer, default=0)
+    row_count = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index("ix_sales_rollup_lookup", "period_type", "dimension", "period", "member_id"),
+        Index("ix_sales_rollup_trend", "period_type", "dimension", "member_id", "period_start"),
+    )
+
+class PeriodCatalog(Base):
+    """导入时登记的周期目录：数据中出现的每个周/月一行，按sort_key排列即为时间顺序
+
+    周期标签是字符串（如"9月"、"10月"、"本周"），直接按字符串排序会把"9月"排在"10月"之后，
+    sort_key在导入时由rollups.period_sort_key解析得到。
+    """
+    __tablename__ = "period_catalog"
+
+    id = Column(Integer, primary_key=True)
+    period_type = Column(String(10))   # week / month
+    period = Column(String(20))
+    period_start = Column(Date, nullable=True)
+    sort_key = Column(Integer)
+    row_count = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index("ix_period_catalog_order", "period_type", "sort_key", "period"),
+    )
+
+class DatasetVersion(Base):
+    """已发布数据的版本号：只有一行，每次发布新数据时与数据切换在同一个事务中递增
+
+    分析结果缓存和ETag按它判断数据是否变化，所有工作进程读到的是同一个版本。
+    """
+    __tablename__ = "dataset_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, default=0)
+    published_at = Column(DateTime)
+
+# 预先汇总的维度：汇总表中的维度名 -> 事实表维度键；total不分维度，只按周期合计
+ROLLUP_DIMENSIONS = {
+    "product": "product_id",
+    "platform": "platform_id",
+    "buyer_country": "buyer_country_id",
+    "sales_person": "sales_person_id",
+    "total": None,
+}
+
 # 创建数据库表
 def create_tables():
     Base.metadata.create_all(bind=engine)
 
-# 数据分析功能实现
-def get_top_sales_volume(db, week=None, limit=5):
-    """获取销量Top5"""
+def get_dataset_version(bind):
+    """当前发布的数据版本号，尚未发布过数据时为0；bind可以是会话、连接或数据库引擎"""
+    statement = select(DatasetVersion.version).where(DatasetVersion.id == 1)
+    if isinstance(bind, Engine):
+        with bind.connect() as connection:
+            return connection.execute(statement).scalar() or 0
+    return bind.execute(statement).scalar() or 0
+
+def bump_dataset_version(connection):
+    """在发布数据的事务中递增数据版本号，返回新的版本号"""
+    table = DatasetVersion.__table__
+    # 旧数据库没有版本表时随第一次发布创建
+    table.create(connection, checkfirst=True)
+    now = datetime.now()
+    updated = connection.execute(
+        table.update().where(table.c.id == 1).values(version=table.c.version + 1, published_at=now)
+    ).rowcount
+    if not updated:
+        connection.execute(table.insert().values(id=1, version=1, published_at=now))
+    return connection.execute(select(table.c.version).where(table.c.id == 1)).scalar()
+
+def rollup_criteria(dimension, period_type, period=None):
+    """汇总表的筛选条件；period为None时包含该周期类型的所有周期"""
+    criteria = [SalesRollup.period_type == period_type, SalesRollup.dimension == dimension]
+    if period is not None:
+        criteria.append(SalesRollup.period == period)
+    return criteria
+
+def query_by_dimension(db, dimension, *measures, period_type="week", period=None, order_by=None):
+    """从汇总表读取某个维度各成员的指标，并关联维度表取回维度值
+
+    dimension为ROLLUP_DIMENSIONS中的维度名（如"platform"），measures为对SalesRollup列的聚合表达式；
+    结果行用维度属性列名（如row.platform）返回维度值，度量字段名与measures的label一致；默认按维度值排序。
+    """
+    model, columns = DIMENSIONS[ROLLUP_DIMENSIONS[dimension]]
+    grouped = db.query(
+        SalesRollup.member_id, *measures
+    ).filter(*rollup_criteria(dimension, period_type, period)).group_by(SalesRollup.member_id).subquery()
+    attributes = [getattr(model, column) for column in columns]
     query = db.query(
-        SalesData.sku,
-        SalesData.product_name,
-        func.sum(SalesData.sales_volume).label('total_sales_volume')
+        *attributes, *[grouped.c[measure.name] for measure in measures]
+    ).select_from(grouped).outerjoin(model, model.id == grouped.c.member_id)
+    return query.order_by(*(order_by if order_by is not None else attributes))
+
+def query_product_totals(db, measure, label, period_type="week", period=None):
+    """按(sku, 名称)汇总商品指标：先沿索引顺序按成员聚合商品维度的汇总行，再关联商品维度合并同sku同名的商品"""
+    per_member = db.query(
+        SalesRollup.member_id,
+        func.sum(getattr(SalesRollup, measure)).label(measure)
+    ).filter(
+        *rollup_criteria("product", period_type, period)
+    ).group_by(SalesRollup.member_id).subquery("f")
+    return db.query(
+        Product.sku,
+        Product.product_name,
+        func.sum(per_member.c[measure]).label(label)
+    ).select_from(per_member).outerjoin(
+        Product, Product.id == per_member.c.member_id
+    ).group_by(Product.sku, Product.product_name)
+
+def top_products(db, measure, period_type="week", period=None, limit=5):
+    """按(sku, 名称)合计商品指标取前limit个，返回 (sku, product_name, value) 行"""
+    store = columnar.for_session(db)
+    if store is not None:
+        return store.top_products(measure, period_type, period, limit)
+    return query_product_totals(
+        db, measure, "value", period_type, period
+    ).order_by(text("value DESC")).limit(limit).all()
+
+# 可比较的指标：指标名 -> (汇总表求和列, 计数列)；计数列不为None时指标为两者之比（如按行平均的毛利率）
+COMPARISON_METRICS = {
+    "sales_amount": ("sales_amount", None),
+    "sales_volume": ("sales_volume", None),
+    "order_count": ("order_count", None),
+    "profit": ("profit", None),
+    "profit_rate": ("profit_rate_sum", "profit_rate_count"),
+}
+
+# 比较结果中各维度返回的属性列；商品按(sku, 名称)合并，其余维度取维度表的全部属性
+COMPARISON_ATTRIBUTES = {
+    "product": ("sku", "product_name"),
+}
+
+@lru_cache(maxsize=None)
+def comparison_statement(dimension, metrics, having=None, order_by=None, share=False, limited=False):
+    """构建并缓存一类比较面板的Core语句；周期类型、本期、上期和条数都是绑定参数
+
+    第一层按成员对汇总表做一次条件聚合，同时得到本期和上期（某期无数据时为NULL）；
+    第二层关联维度表并按维度属性合并，计算差值、环比和占比。
+    having为作用于第一个指标的筛选: current（本期有数据）/ both（两期都有）/ increased / decreased /
+    dropped（上期有、本期无）/ active（任一期大于0）；order_by为 (字段, 是否降序)，字段为current/previous/delta，
+    默认按维度属性排序。
+    """
+    rollup = SalesRollup.__table__
+    is_current = rollup.c.period == bindparam("current")
+    is_previous = rollup.c.period == bindparam("previous")
+
+    columns = sorted({column for metric in metrics for column in COMPARISON_METRICS[metric] if column})
+    sums = []
+    for column in columns:
+        sums.append(func.sum(case((is_current, rollup.c[column]))).label(f"{column}_current"))
+        sums.append(func.sum(case((is_previous, rollup.c[column]))).label(f"{column}_previous"))
+    per_member = select(rollup.c.member_id, *sums).where(
+        rollup.c.period_type == bindparam("period_type"),
+        rollup.c.dimension == dimension,
+        rollup.c.period.in_([bindparam("current"), bindparam("previous")])
+    ).group_by(rollup.c.member_id).subquery("f")
+
+    if ROLLUP_DIMENSIONS[dimension] is None:
+        attributes = []
+        source = per_member
+        group_by = [per_member.c.member_id]
+    else:
+        model, dimension_columns = DIMENSIONS[ROLLUP_DIMENSIONS[dimension]]
+        dimension_table = model.__table__
+        attributes = [dimension_table.c[column] for column in COMPARISON_ATTRIBUTES.get(dimension, dimension_columns)]
+        source = per_member.outerjoin(dimension_table, dimension_table.c.id == per_member.c.member_id)
+        group_by = attributes
+
+    def period_value(metric, side):
+        value_column, count_column = COMPARISON_METRICS[metric]
+        value = func.sum(per_member.c[f"{value_column}_{side}"])
+        if count_column:
+            value = value / func.nullif(func.sum(per_member.c[f"{count_column}_{side}"]), 0)
+        return value
+
+    outputs = []
+    fields = {}
+    for metric in metrics:
+        current, previous = period_value(metric, "current"), period_value(metric, "previous")
+        delta = func.coalesce(current, 0) - func.coalesce(previous, 0)
+        rate = case((previous != 0, (func.coalesce(current, 0) - previous) * 1.0 / previous * 100))
+        outputs += [
+            current.label(f"{metric}_current"),
+            previous.label(f"{metric}_previous"),
+            delta.label(f"{metric}_delta"),
+            rate.label(f"{metric}_rate"),
+        ]
+        if share and not COMPARISON_METRICS[metric][1]:
+            # 占比的分母取同一周期total维度的合计行，一次索引查找
+            total = select(func.sum(rollup.c[COMPARISON_METRICS[metric][0]])).where(
+                rollup.c.period_type == bindparam("period_type"),
+                rollup.c.dimension == "total",
+                rollup.c.period == bindparam("current")
+            ).scalar_subquery()
+            outputs.append((current * 1.0 / func.nullif(total, 0) * 100).label(f"{metric}_share"))
+        fields.setdefault("current", current)
+        fields.setdefault("previous", previous)
+        fields.setdefault("delta", delta)
+
+    statement = select(*attributes, *outputs).select_from(source).group_by(*group_by)
+
+    current, previous = fields["current"], fields["previous"]
+    filters = {
+        None: None,
+        "current": current.is_not(None),
+        "both": and_(current.is_not(None), previous.is_not(None)),
+        "increased": current > previous,
+        "decreased": current < previous,
+        "dropped": and_(previous.is_not(None), current.is_(None)),
+        "active": or_(func.coalesce(current, 0) > 0, func.coalesce(previous, 0) > 0),
+    }
+    if filters[having] is not None:
+        statement = statement.having(filters[having])
+
+    if order_by is None:
+        statement = statement.order_by(*attributes)
+    else:
+        field, descending = order_by
+        expression = fields[field] if field == "delta" else func.coalesce(fields[field], 0)
+        statement = statement.order_by(expression.desc() if descending else expression.asc())
+
+    if limited:
+        statement = statement.limit(bindparam("limit"))
+    return statement
+
+def compare_periods(db, dimension, metrics, current, previous, period_type="week",
+                    having=None, order_by=None, limit=None, share=False):
+    """本期与上期对比：一次扫描汇总表，返回Core行元组
+
+    每个指标返回 {指标}_current / _previous / _delta / _rate（上期为0或无数据时为NULL），
+    share=True时另有 _share（占本期合计的百分比）；维度属性以列名返回（如row.platform）。
+    """
+    store = columnar.for_session(db)
+    if store is not None:
+        return store.compare(dimension, metrics, current, previous, period_type, having, order_by, limit, share)
+    statement = comparison_statement(
+        dimension, tuple(metrics), having, order_by, share, limit is not None
     )
+    params = {"period_type": period_type, "current": current, "previous": previous}
+    if limit is not None:
+        params["limit"] = limit
+    return db.execute(statement, params).all()
+
+# 趋势查询可用的维度：维度名 -> 按哪个维度属性指定成员；商品按sku合并所有名称
+TREND_MEMBER_ATTRIBUTES = {
+    "product": "sku",
+    "platform": "platform",
+    "buyer_country": "buyer_country",
+    "sales_person": "sales_person",
+    "total": None,
+}
+
+TREND_METRICS = ("sales_amount", "sales_volume", "order_count", "profit", "profit_rate")
+
+@lru_cache(maxsize=None)
+def trend_statement(dimension, metrics, year_over_year=False):
+    """构建并缓存趋势查询：按period_start范围扫描汇总表，每个周期一行
+
+    成员由维度属性（如sku）指定，经维度表取得键后按 (period_type, dimension, member_id, period_start) 索引范围读取；
+    year_over_year时同一条语句再读取去年同期的范围。
+    """
+    rollup = SalesRollup.__table__
+    columns = sorted({column for metric in metrics for column in COMPARISON_METRICS[metric] if column})
+    in_window = rollup.c.period_start.between(bindparam("start"), bindparam("end"))
+    if year_over_year:
+        in_window = or_(in_window, rollup.c.period_start.between(bindparam("last_year_start"), bindparam("last_year_end")))
+    statement = select(
+        rollup.c.period_start, *[func.sum(rollup.c[column]).label(column) for column in columns]
+    ).where(
+        rollup.c.period_type == bindparam("period_type"),
+        rollup.c.dimension == dimension,
+        in_window
+    )
+    attribute = TREND_MEMBER_ATTRIBUTES[dimension]
+    if attribute:
+        model, _ = DIMENSIONS[ROLLUP_DIMENSIONS[dimension]]
+        dimension_table = model.__table__
+        statement = statement.select_from(
+            rollup.join(dimension_table, dimension_table.c.id == rollup.c.member_id)
+        ).where(dimension_table.c[attribute] == bindparam("member"))
+    else:
+        # total行的member_id为空：加上该条件后沿索引按period_start顺序读取，分组不需要排序
+        statement = statement.where(rollup.c.member_id.is_(None))
+    return statement.group_by(rollup.c.period_start).order_by(rollup.c.period_start)
+
+def get_latest_period_start(db, period_type):
+    """周期目录中最近一个周期的起始日期"""
+    store = columnar.for_session(db)
+    if store is not None:
+        return store.latest_period_start(period_type)
+    return db.query(func.max(PeriodCatalog.period_start)).filter(PeriodCatalog.period_type == period_type).scalar()
+
+def get_trend(db, dimension="total", member=None, period_type="week", periods=8, end=None,
+              year_over_year=False, metrics=TREND_METRICS):
+    """某个维度成员最近periods个周期的时间序列，一次范围查询取回
+
+    end为最后一个周期的起始日期（默认取周期目录中最近的周期）；没有数据的周期指标为None。
+    year_over_year时每个点另有 {指标}_last_year（去年同期，周按52周前）和 {指标}_yoy（同比百分比）。
+    """
+    end = end or get_latest_period_start(db, period_type)
+    if end is None:
+        return []
+    end = rollups.period_start(period_type, end.isoformat())
+    starts = [rollups.shift_period(period_type, end, offset) for offset in range(-(periods - 1), 1)]
+    year = 12 if period_type == "month" else 52
+    params = {"period_type": period_type, "start": starts[0], "end": starts[-1]}
+    if year_over_year:
+        params.update(last_year_start=rollups.shift_period(period_type, starts[0], -year),
+                      last_year_end=rollups.shift_period(period_type, starts[-1], -year))
+    if TREND_MEMBER_ATTRIBUTES[dimension]:
+        params["member"] = member
     
-    if week:
-        query = query.filter(SalesData.week == week)
+    store = columnar.for_session(db)
+    if store is not None:
+        columns = sorted({column for metric in metrics for column in COMPARISON_METRICS[metric] if column})
+        windows = [(params["start"], params["end"])]
+        if year_over_year:
+            windows.append((params["last_year_start"], params["last_year_end"]))
+        rows = store.trend(dimension, columns, period_type, windows, member)
+    else:
+        rows = {row.period_start: row for row in db.execute(trend_statement(dimension, tuple(metrics), year_over_year), params)}
     
-    results = query.group_by(
-        SalesData.sku,
-        SalesData.product_name
-    ).order_by(text('total_sales_volume DESC')).limit(limit).all()
+    def metric_value(row, metric):
+        if row is None:
+            return None
+        value_column, count_column = COMPARISON_METRICS[metric]
+        value = getattr(row, value_column)
+        if count_column:
+            count = getattr(row, count_column)
+            return value / count if count else None
+        return value
+    
+    points = []
+    for start in starts:
+        row = rows.get(start)
+        point = {"period_start": start.isoformat()}
+        for metric in metrics:
+            point[metric] = metric_value(row, metric)
+        if year_over_year:
+            last_year = rows.get(rollups.shift_period(period_type, start, -year))
+            for metric in metrics:
+                current, previous = point[metric], metric_value(last_year, metric)
+                point[f"{metric}_last_year"] = previous
+                point[f"{metric}_yoy"] = (current - previous) / previous * 100 \
+                    if current is not None and previous else None
+        points.append(point)
+    return points
+
+# 数据分析功能实现
+def get_top_sales_volume(db, week=None, limit=5):
+    """获取销量Top5"""
+    results = top_products(db, 'sales_volume', 'week', week or None, limit)
     
     # 转换为字典列表
     return [
         {
             "sku": row.sku,
             "product_name": row.product_name,
-            "value": float(row.total_sales_volume)
+            "value": float(row.value)
         }
         for row in results
     ]
 
 def get_top_sales_amount(db, week=None, limit=5):
     """获取销售额Top5"""
-    query = db.query(
-        SalesData.sku,
-        SalesData.product_name,
-        func.sum(SalesData.sales_amount).label('total_sales_amount')
-    )
-    
-    if week:
-        query = query.filter(SalesData.week == week)
-    
-    results = query.group_by(
-        SalesData.sku,
-        SalesData.product_name
-    ).order_by(text('total_sales_amount DESC')).limit(limit).all()
+    results = top_products(db, 'sales_amount', 'week', week or None, limit)
     
     # 转换为字典列表
     return [
         {
             "sku": row.sku,
             "product_name": row.product_name,
-            "value": float(row.total_sales_amount)
+            "value": float(row.value)
         }
         for row in results
     ]
 
 def get_top_increased_sales_amount(db, limit=5):
     """获取环比销售额上升Top5（按绝对增长量排序）"""
-    query = """
-    SELECT 
-        t1.sku,
-        t1.product_name,
-        t1.current_amount,
-        t2.previous_amount,
-        (t1.current_amount - t2.previous_amount) AS amount_change,
-        CASE 
-            WHEN t2.previous_amount > 0 THEN 
-                ((t1.current_amount - t2.previous_amount) / t2.previous_amount) * 100
-            ELSE 0
-        END AS change_rate
-    FROM 
-        (SELECT 
-            sku, 
-            product_name, 
-            SUM(sales_amount) AS current_amount
-         FROM 
-            sales_data
-         WHERE 
-            week = '本周'
-         GROUP BY 
-            sku, product_name) AS t1
-    JOIN 
-        (SELECT 
-            sku, 
-            product_name, 
-            SUM(sales_amount) AS previous_amount
-         FROM 
-            sales_data
-         WHERE 
-            week = '上周'
-         GROUP BY 
-            sku, product_name) AS t2
-    ON 
-        t1.sku = t2.sku
-    WHERE
-        t1.current_amount > t2.previous_amount
-    ORDER BY 
-        amount_change DESC
-    LIMIT :limit
-    """
-    
-    results = db.execute(text(query), {"limit": limit}).fetchall()
+    results = compare_periods(
+        db, "product", ["sales_amount"], "本周", "上周",
+        having="increased", order_by=("delta", True), limit=limit
+    )
     
     # 确保数据转换正确，明确指定数据类型
     return [
         {
-            "sku": row[0],
-            "product_name": row[1],
-            "current_value": float(row[2]) if row[2] is not None else 0.0,
-            "previous_value": float(row[3]) if row[3] is not None else 0.0,
-            "amount_change": float(row[4]) if row[4] is not None else 0.0,  # 确保这是正确的增长量
-            "change_rate": float(row[5]) if row[5] is not None else 0.0
+            "sku": row.sku,
+            "product_name": row.product_name,
+            "current_value": float(row.sales_amount_current),
+            "previous_value": float(row.sales_amount_previous),
+            "amount_change": float(row.sales_amount_delta),  # 确保这是正确的增长量
+            "change_rate": float(row.sales_amount_rate) if row.sales_amount_rate is not None else 0.0
         }
         for row in results
     ]
 
 def get_top_decreased_sales_amount(db, limit=5):
     """获取环比销售额下降Top5（按绝对下降量排序）"""
-    query = """
-    SELECT 
-        t1.sku,
-        t1.product_name,
-        t1.current_amount,
-        t2.previous_amount,
-        (t2.previous_amount - t1.current_amount) AS amount_decrease,
-        CASE 
-            WHEN t2.previous_amount > 0 THEN 
-                ((t1.current_amount - t2.previous_amount) / t2.previous_amount) * 100
-            ELSE 0
-        END AS change_rate
-    FROM 
-        (SELECT 
-            sku, 
-            product_name, 
-            SUM(sales_amount) AS current_amount
-         FROM 
-            sales_data
-         WHERE 
-            week = '本周'
-         GROUP BY 
-            sku, product_name) AS t1
-    JOIN 
-        (SELECT 
-            sku, 
-            product_name, 
-            SUM(sales_amount) AS previous_amount
-         FROM 
-            sales_data
-         WHERE 
-            week = '上周'
-         GROUP BY 
-            sku, product_name) AS t2
-    ON 
-        t1.sku = t2.sku
-    WHERE
-        t1.current_amount < t2.previous_amount
-    ORDER BY 
-        amount_decrease DESC
-    LIMIT :limit
-    """
-    
-    results = db.execute(text(query), {"limit": limit}).fetchall()
+    results = compare_periods(
+        db, "product", ["sales_amount"], "本周", "上周",
+        having="decreased", order_by=("delta", False), limit=limit
+    )
     
     # 确保数据转换正确，明确指定数据类型
     return [
         {
-            "sku": row[0],
-            "product_name": row[1],
-            "current_value": float(row[2]) if row[2] is not None else 0.0,
-            "previous_value": float(row[3]) if row[3] is not None else 0.0,
-            "amount_decrease": float(row[4]) if row[4] is not None else 0.0,  # 确保这是正确的下降量
-            "change_rate": float(row[5]) if row[5] is not None else 0.0
+            "sku": row.sku,
+            "product_name": row.product_name,
+            "current_value": float(row.sales_amount_current),
+            "previous_value": float(row.sales_amount_previous),
+            "amount_decrease": float(-row.sales_amount_delta),  # 确保这是正确的下降量
+            "change_rate": float(row.sales_amount_rate) if row.sales_amount_rate is not None else 0.0
         }
         for row in results
     ]
 
 def get_country_sales_distribution(db):
     """获取不同国家销售额占比和环比情况"""
-    # 当前周数据
-    current_week_data = db.query(
-        SalesData.buyer_country,
-        func.sum(SalesData.sales_amount).label('current_amount')
-    ).filter(SalesData.week == "本周").group_by(
-        SalesData.buyer_country
-    ).subquery()
-    
-    # 上周数据
-    previous_week_data = db.query(
-        SalesData.buyer_country,
-        func.sum(SalesData.sales_amount).label('previous_amount')
-    ).filter(SalesData.week == "上周").group_by(
-        SalesData.buyer_country
-    ).subquery()
-    
-    # 合并查询
-    results = db.query(
-        current_week_data.c.buyer_country,
-        current_week_data.c.current_amount,
-        previous_week_data.c.previous_amount
-    ).outerjoin(
-        previous_week_data,
-        current_week_data.c.buyer_country == previous_week_data.c.buyer_country
-    ).all()
-    
-    # 计算总销售额用于计算占比
-    total_current = sum([r.current_amount for r in results if r.current_amount])
+    # 本周有销售的国家，一次查询同时取回上周销售额和本周占比
+    results = compare_periods(
+        db, "buyer_country", ["sales_amount"], "本周", "上周",
+        having="current", share=True
+    )
     
     # 转换为字典列表
     return [
         {
             "country": row.buyer_country or "未知",
-            "value": float(row.current_amount or 0),
-            "percent": float(row.current_amount) / total_current * 100 if total_current else 0,
-            "previous_value": float(row.previous_amount or 0),
-            "change_rate": ((float(row.current_amount or 0) - float(row.previous_amount or 0)) / 
-                            float(row.previous_amount or 1) * 100) if row.previous_amount else 0
+            "value": float(row.sales_amount_current or 0),
+            "percent": float(row.sales_amount_share) if row.sales_amount_share is not None else 0,
+            "previous_value": float(row.sales_amount_previous or 0),
+            "change_rate": float(row.sales_amount_rate) if row.sales_amount_previous else 0
         }
         for row in results
     ]
 
 def get_platform_comparison(db):
     """获取平台销售额、销量、订单、毛利率环比"""
-    query = """
-    SELECT 
-        SUM(CASE WHEN week = '本周' THEN sales_amount ELSE 0 END) as current_amount,
-        SUM(CASE WHEN week = '上周' THEN sales_amount ELSE 0 END) as previous_amount,
-        SUM(CASE WHEN week = '本周' THEN sales_volume ELSE 0 END) as current_volume,
-        SUM(CASE WHEN week = '上周' THEN sales_volume ELSE 0 END) as previous_volume,
-        SUM(CASE WHEN week = '本周' THEN order_count ELSE 0 END) as current_orders,
-        SUM(CASE WHEN week = '上周' THEN order_count ELSE 0 END) as previous_orders,
-        AVG(CASE WHEN week = '本周' THEN profit_rate ELSE NULL END) as current_profit_rate,
-        AVG(CASE WHEN week = '上周' THEN profit_rate ELSE NULL END) as previous_profit_rate
-    FROM 
-        sales_data
-    """
+    result = compare_periods(
+        db, "total", ["sales_amount", "sales_volume", "order_count", "profit_rate"], "本周", "上周"
+    )
+    if not result:
+        return {
+            "current_amount": None, "previous_amount": None, "amount_change_rate": None,
+            "current_volume": None, "previous_volume": None, "volume_change_rate": None,
+            "current_orders": None, "previous_orders": None, "orders_change_rate": None,
+            "current_profit_rate": None, "previous_profit_rate": None, "profit_rate_change": None
+        }
     
-    result = db.execute(text(query)).fetchone()
+    row = result[0]
+    # 某一周没有数据时销售额、销量、订单按0计
     return {
-        "current_amount": result[0],
-        "previous_amount": result[1],
-        "amount_change_rate": (result[0] - result[1]) / result[1] * 100 if result[1] else None,
-        "current_volume": result[2],
-        "previous_volume": result[3],
-        "volume_change_rate": (result[2] - result[3]) / result[3] * 100 if result[3] else None,
-        "current_orders": result[4],
-        "previous_orders": result[5],
-        "orders_change_rate": (result[4] - result[5]) / result[5] * 100 if result[5] else None,
-        "current_profit_rate": result[6],
-        "previous_profit_rate": result[7],
-        "profit_rate_change": result[6] - result[7] if result[6] and result[7] else None
+        "current_amount": row.sales_amount_current or 0,
+        "previous_amount": row.sales_amount_previous or 0,
+        "amount_change_rate": row.sales_amount_rate,
+        "current_volume": row.sales_volume_current or 0,
+        "previous_volume": row.sales_volume_previous or 0,
+        "volume_change_rate": row.sales_volume_rate,
+        "current_orders": row.order_count_current or 0,
+        "previous_orders": row.order_count_previous or 0,
+        "orders_change_rate": row.order_count_rate,
+        "current_profit_rate": row.profit_rate_current,
+        "previous_profit_rate": row.profit_rate_previous,
+        "profit_rate_change": row.profit_rate_delta
+        if row.profit_rate_current and row.profit_rate_previous else None
     }
 
 def get_salesperson_comparison(db):
     """获取销售人员销售额、销量、订单、毛利率环比"""
-    query = """
-    SELECT 
-        sales_person,
-        SUM(CASE WHEN week = '本周' THEN sales_amount ELSE 0 END) as current_amount,
-        SUM(CASE WHEN week = '上周' THEN sales_amount ELSE 0 END) as previous_amount,
-        SUM(CASE WHEN week = '本周' THEN sales_volume ELSE 0 END) as current_volume,
-        SUM(CASE WHEN week = '上周' THEN sales_volume ELSE 0 END) as previous_volume,
-        SUM(CASE WHEN week = '本周' THEN order_count ELSE 0 END) as current_orders,
-        SUM(CASE WHEN week = '上周' THEN order_count ELSE 0 END) as previous_orders,
-        AVG(CASE WHEN week = '本周' THEN profit_rate ELSE NULL END) as current_profit_rate,
-        AVG(CASE WHEN week = '上周' THEN profit_rate ELSE NULL END) as previous_profit_rate
-    FROM 
-        sales_data
-    GROUP BY 
-        sales_person
-    HAVING 
-        current_amount > 0 OR previous_amount > 0
-    ORDER BY 
-        current_amount DESC
-    """
-    
-    results = db.execute(text(query)).fetchall()
+    results = compare_periods(
+        db, "sales_person", ["sales_amount", "sales_volume", "order_count", "profit_rate"], "本周", "上周",
+        having="active", order_by=("current", True)
+    )
     return [
         {
-            "sales_person": result[0],
-            "current_amount": result[1],
-            "previous_amount": result[2],
-            "amount_change_rate": (result[1] - result[2]) / result[2] * 100 if result[2] else None,
-            "current_volume": result[3],
-            "previous_volume": result[4],
-            "volume_change_rate": (result[3] - result[4]) / result[4] * 100 if result[4] else None,
-            "current_orders": result[5],
-            "previous_orders": result[6],
-            "orders_change_rate": (result[5] - result[6]) / result[6] * 100 if result[6] else None,
-            "current_profit_rate": result[7],
-            "previous_profit_rate": result[8],
-            "profit_rate_change": result[7] - result[8] if result[7] and result[8] else None
+            "sales_person": row.sales_person,
+            "current_amount": row.sales_amount_current or 0,
+            "previous_amount": row.sales_amount_previous or 0,
+            "amount_change_rate": row.sales_amount_rate,
+            "current_volume": row.sales_volume_current or 0,
+            "previous_volume": row.sales_volume_previous or 0,
+            "volume_change_rate": row.sales_volume_rate,
+            "current_orders": row.order_count_current or 0,
+            "previous_orders": row.order_count_previous or 0,
+            "orders_change_rate": row.order_count_rate,
+            "current_profit_rate": row.profit_rate_current,
+            "previous_profit_rate": row.profit_rate_previous,
+            "profit_rate_change": row.profit_rate_delta
+            if row.profit_rate_current and row.profit_rate_previous else None
         }
-        for result in results
+        for row in results
     ]
 
+def get_salesperson_performance(db, week=None):
+    """销售人员业绩（周看板表格）：本周或指定周与上周比较，只保留当前周期有数据的销售人员"""
+    # 如果指定了特定周期，按指定周期筛选，否则使用"本周"
+    if week and week != 'all':
+        current_week = week
+    else:
+        current_week = "本周"
+    
+    # 如果指定了特定周期，需要确定对应的上一周期
+    if week and week != 'all':
+        # 添加特定周期的上一周期计算逻辑
+        prev_week = "上周"
+    else:
+        prev_week = "上周"
+    
+    # 一次查询同时取回当前周期和上一周期的数据，只保留当前周期有数据的销售人员
+    results = compare_periods(
+        db, "sales_person", ["sales_amount", "sales_volume", "order_count"], current_week, prev_week,
+        having="current", order_by=("current", True)
+    )
+    
+    # 格式化结果
+    salesperson_data = []
+    for r in results:
+        if not r.sales_person:
+            continue
+            
+        # 当前数据
+        current_amount = float(r.sales_amount_current)
+        current_volume = float(r.sales_volume_current)
+        current_orders = int(r.order_count_current)
+        
+        # 历史数据，上一周期没有数据时按0计
+        previous_amount = float(r.sales_amount_previous) if r.sales_amount_previous is not None else 0
+        previous_volume = float(r.sales_volume_previous) if r.sales_volume_previous is not None else 0
+        previous_orders = int(r.order_count_previous) if r.order_count_previous is not None else 0
+        
+        # 计算变化率
+        amount_change_rate = 0
+        if previous_amount > 0:
+            amount_change_rate = (current_amount - previous_amount) / previous_amount * 100
+            
+        volume_change_rate = 0
+        if previous_volume > 0:
+            volume_change_rate = (current_volume - previous_volume) / previous_volume * 100
+            
+        orders_change_rate = 0
+        if previous_orders > 0:
+            orders_change_rate = (current_orders - previous_orders) / previous_orders * 100
+        
+        # 计算客单价
+        current_avg_order = 0
+        if current_orders > 0:
+            current_avg_order = current_amount / current_orders
+            
+        previous_avg_order = 0
+        if previous_orders > 0:
+            previous_avg_order = previous_amount / previous_orders
+            
+        # 利润率变化 (假设这个数据暂不可用)
+        current_profit_rate = None
+        previous_profit_rate = None
+        profit_rate_change = None
+        
+        # 将数据添加到结果列表
+        salesperson_data.append({
+            "sales_person": r.sales_person,
+            "sales_amount": current_amount,  # 为前端兼容性保留此字段
+            "sales_volume": current_volume,  # 为前端兼容性保留此字段
+            "order_count": current_orders,   # 为前端兼容性保留此字段
+            "average_order": round(current_avg_order, 2),  # 为前端兼容性保留此字段
+            "change_rate": round(amount_change_rate, 2),   # 为前端兼容性保留此字段
+            
+            # 添加前端表格需要的所有字段
+            "current_amount": current_amount,
+            "previous_amount": previous_amount,
+            "amount_change_rate": round(amount_change_rate, 2),
+            
+            "current_volume": current_volume,
+            "previous_volume": previous_volume,
+            "volume_change_rate": round(volume_change_rate, 2),
+            
+            "current_orders": current_orders,
+            "previous_orders": previous_orders,
+            "orders_change_rate": round(orders_change_rate, 2),
+            
+            "current_profit_rate": current_profit_rate,
+            "previous_profit_rate": previous_profit_rate,
+            "profit_rate_change": profit_rate_change
+        })
+    
+    return salesperson_data
+
+def get_platform_detail(db, week=None):
+    """各平台销售详情：本周或指定周的销售额、销量、订单数及销售额环比"""
+    # 如果指定了特定周期，按指定周期筛选，否则使用"本周"
+    if week and week != 'all':
+        # 这里可以添加逻辑来处理特定周期格式
+        current_week = week
+    else:
+        current_week = "本周"
+    
+    # 如果指定了特定周期，需要确定对应的上一周期
+    # 简化处理：未指定周期时使用"上周"
+    if week and week != 'all':
+        # 如果是特定周期格式如"2024-W01"，可以添加逻辑计算上一周期
+        # 目前简化为使用"上周"
+        prev_week = "上周"
+    else:
+        prev_week = "上周"
+    
+    # 一次查询同时取回当前周期和上一周期的数据，按当前销售额排序
+    results = compare_periods(
+        db, "platform", ["sales_amount", "sales_volume", "order_count"], current_week, prev_week,
+        having="current", order_by=("current", True)
+    )
+    
+    # 格式化结果
+    platform_details = []
+    for r in results:
+        if not r.platform:
+            continue
+            
+        prev_amount = float(r.sales_amount_previous) if r.sales_amount_previous else 0
+        change_rate = 0
+        if prev_amount > 0:
+            change_rate = (float(r.sales_amount_current) - prev_amount) / prev_amount * 100
+            
+        platform_details.append({
+            "platform": r.platform,
+            "sales_amount": float(r.sales_amount_current) if r.sales_amount_current else 0,
+            "sales_volume": float(r.sales_volume_current) if r.sales_volume_current else 0,
+            "order_count": int(r.order_count_current) if r.order_count_current else 0,
+            "previous_amount": prev_amount,
+            "change_rate": round(change_rate, 2)
+        })
+    
+    # 如果没有数据，返回一个空数组
+    if not platform_details:
+        return []
+    
+    return platform_details
+
+def get_platform_sales_distribution(db, week=None):
+    """各平台销售额占比数据 {平台: 销售额}"""
+    # 如果指定了周次，按周次筛选
+    if week and week != 'all':
+        current_week = week
+    else:
+        # 默认使用本周数据
+        current_week = "本周"
+    
+    # 查询平台销售数据（本期与上期取同一周，只用本期）
+    result = compare_periods(
+        db, "platform", ["sales_amount"], current_week, current_week, having="current"
+    )
+    
+    # 转换为字典格式 {platform_name: sales_amount}
+    platform_sales = {r.platform: float(r.sales_amount_current) if r.sales_amount_current else 0 for r in result if r.platform}
+    
+    # 如果没有数据，返回一个空字典
+    if not platform_sales:
+        return {}
+        
+    return platform_sales
+
 def get_data_for_ai_analysis(db):
     """获取用于AI分析的数据"""
     # 获取销售额Top5
@@ -348,100 +811,145 @@ def get_data_for_ai_analysis(db):
 
 def get_no_orders_this_week(db, limit=5):
     """获取上周有出单但本周没有出单的SKU，按上周销售额排序"""
-    query = """
-    SELECT 
-        t2.sku,
-        t2.product_name,
-        t2.sales_amount AS previous_amount
-    FROM 
-        (SELECT 
-            sku
-         FROM 
-            sales_data
-         WHERE 
-            week = '本周'
-         GROUP BY 
-            sku) AS t1
-    RIGHT JOIN 
-        (SELECT 
-            sku, 
-            product_name, 
-            SUM(sales_amount) AS sales_amount
-         FROM 
-            sales_data
-         WHERE 
-            week = '上周'
-         GROUP BY 
-            sku, product_name) AS t2
-    ON 
-        t1.sku = t2.sku
-    WHERE
-        t1.sku IS NULL
-    ORDER BY 
-        t2.sales_amount DESC
-    LIMIT :limit
-    """
-    
-    results = db.execute(text(query), {"limit": limit}).fetchall()
+    results = compare_periods(
+        db, "product", ["sales_amount"], "本周", "上周",
+        having="dropped", order_by=("previous", True), limit=limit
+    )
     
     # 转换为字典列表
     return [
         {
-            "sku": row[0],
-            "product_name": row[1],
-            "value": float(row[2]) if row[2] is not None else 0.0
+            "sku": row.sku,
+            "product_name": row.product_name,
+            "value": float(row.sales_amount_previous) if row.sales_amount_previous is not None else 0.0
         }
         for row in results
     ]
 
-def get_month_top_sales_volume(db, month=None, limit=10):
-    """获取月度销量Top10"""
-    query = db.query(
-        SalesData.sku,
-        SalesData.product_name,
-        func.sum(SalesData.sales_volume).label('total_sales_volume')
-    )
+@lru_cache(maxsize=None)
+def weekly_product_statement():
+    """周看板商品面板共用的语句：每个(sku, 名称)一行，同时取本周/上周销售额和按week筛选的销售额、销量"""
+    rollup = SalesRollup.__table__
+    product = Product.__table__
+    in_week = or_(bindparam("week").is_(None), rollup.c.period == bindparam("week"))
+    sums = {
+        "current_amount": case((rollup.c.period == "本周", rollup.c.sales_amount)),
+        "previous_amount": case((rollup.c.period == "上周", rollup.c.sales_amount)),
+        "sales_amount": case((in_week, rollup.c.sales_amount)),
+        "sales_volume": case((in_week, rollup.c.sales_volume)),
+    }
+    # 先按成员聚合（沿索引顺序，不需要排序），再按(sku, 名称)合并
+    per_member = select(
+        rollup.c.member_id, *[func.sum(value).label(name) for name, value in sums.items()]
+    ).where(
+        rollup.c.period_type == "week", rollup.c.dimension == "product"
+    ).group_by(rollup.c.member_id).subquery("f")
+    return select(
+        product.c.sku,
+        product.c.product_name,
+        *[func.sum(per_member.c[name]).label(name) for name in sums]
+    ).select_from(per_member.outerjoin(
+        product, product.c.id == per_member.c.member_id
+    )).group_by(product.c.sku, product.c.product_name)
+
+def get_weekly_product_panels(db, week=None, limit=5):
+    """周看板的全部商品面板：一次扫描商品汇总，得到销量/销售额Top、环比升降和本周无单商品
+
+    结果与get_top_sales_volume、get_top_sales_amount、get_top_increased_sales_amount、
+    get_top_decreased_sales_amount、get_no_orders_this_week分别查询一致。
+    """
+    if columnar.for_session(db) is not None:
+        # 内存引擎没有数据库往返，逐个面板计算即可
+        return {
+            "top_sales_volume": get_top_sales_volume(db, week, limit),
+            "top_sales_amount": get_top_sales_amount(db, week, limit),
+            "top_increased": get_top_increased_sales_amount(db, limit),
+            "top_decreased": get_top_decreased_sales_amount(db, limit),
+            "no_orders_this_week": get_no_orders_this_week(db, limit)
+        }
+    rows = db.execute(weekly_product_statement(), {"week": week or None}).all()
     
-    if month:
-        query = query.filter(SalesData.month == month)
+    top_volume, top_amount, increased, decreased, dropped = [], [], [], [], []
+    for sku, product_name, current, previous, sales_amount, sales_volume in rows:
+        if sales_amount is not None:
+            top_amount.append((sales_amount, sku, product_name))
+            top_volume.append((sales_volume, sku, product_name))
+        if previous is None:
+            continue
+        if current is None:
+            dropped.append((previous, sku, product_name))
+        elif current > previous:
+            increased.append((current - previous, sku, product_name, current, previous))
+        elif current < previous:
+            decreased.append((previous - current, sku, product_name, current, previous))
     
-    results = query.group_by(
-        SalesData.sku,
-        SalesData.product_name
-    ).order_by(text('total_sales_volume DESC')).limit(limit).all()
+    def largest(items):
+        return heapq.nlargest(limit, items, key=lambda item: item[0])
+    
+    def change_rate(current, previous):
+        return (current - previous) / previous * 100 if previous != 0 else 0.0
+    
+    return {
+        "top_sales_volume": [
+            {"sku": sku, "product_name": product_name, "value": float(value)}
+            for value, sku, product_name in largest(top_volume)
+        ],
+        "top_sales_amount": [
+            {"sku": sku, "product_name": product_name, "value": float(value)}
+            for value, sku, product_name in largest(top_amount)
+        ],
+        "top_increased": [
+            {
+                "sku": sku,
+                "product_name": product_name,
+                "current_value": float(current),
+                "previous_value": float(previous),
+                "amount_change": float(change),
+                "change_rate": float(change_rate(current, previous))
+            }
+            for change, sku, product_name, current, previous in largest(increased)
+        ],
+        "top_decreased": [
+            {
+                "sku": sku,
+                "product_name": product_name,
+                "current_value": float(current),
+                "previous_value": float(previous),
+                "amount_decrease": float(change),
+                "change_rate": float(change_rate(current, previous))
+            }
+            for change, sku, product_name, current, previous in largest(decreased)
+        ],
+        "no_orders_this_week": [
+            {"sku": sku, "product_name": product_name, "value": float(previous)}
+            for previous, sku, product_name in largest(dropped)
+        ]
+    }
+
+def get_month_top_sales_volume(db, month=None, limit=10):
+    """获取月度销量Top10"""
+    results = top_products(db, 'sales_volume', 'month', month or None, limit)
     
     # 转换为字典列表
     return [
         {
             "sku": row.sku,
             "product_name": row.product_name,
-            "value": float(row.total_sales_volume)
+            "value": float(row.value)
         }
         for row in results
     ]
 
 def get_month_top_sales_amount(db, month=None, limit=10):
     """获取月度销售额Top10"""
-    query = db.query(
-        SalesData.sku,
-        SalesData.product_name,
-        func.sum(SalesData.sales_amount).label('total_sales_amount')
-    )
-    
-    if month:
-        query = query.filter(SalesData.month == month)
-    
-    results = query.group_by(
-        SalesData.sku,
-        SalesData.product_name
-    ).order_by(text('total_sales_amount DESC')).limit(limit).all()
+    results = top_products(db, 'sales_amount', 'month', month or None, limit)
     
     # 转换为字典列表
     return [
         {
             "sku": row.sku,
             "product_name": row.product_name,
-            "value": float(row.total_sales_amount)
+            "value": float(row.value)
         }
         for row in results
     ]
@@ -449,9 +957,8 @@ def get_month_top_sales_amount(db, month=None, limit=10):
 def get_month_top_increased_sales_volume(db, current_month=None, previous_month=None, limit=10):
     """获取月度环比销量上升Top10"""
     if not current_month or not previous_month:
-        # 获取所有月份并按降序排列
-        all_months = db.query(SalesData.month).distinct().order_by(SalesData.month.desc()).all()
-        months = [m[0] for m in all_months if m[0]]
+        # 从周期目录取最近的两个月
+        months = get_latest_periods(db, "month", limit=2)
         
         if len(months) >= 2:
             current_month = months[0]
@@ -459,63 +966,19 @@ def get_month_top_increased_sales_volume(db, current_month=None, previous_month=
         else:
             return []  # 没有足够的月份数据进行比较
     
-    query = """
-    SELECT 
-        t1.sku,
-        t1.product_name,
-        t1.current_volume,
-        t2.previous_volume,
-        (t1.current_volume - t2.previous_volume) AS volume_change,
-        CASE 
-            WHEN t2.previous_volume > 0 THEN 
-                ((t1.current_volume - t2.previous_volume) / t2.previous_volume) * 100
-            ELSE 0
-        END AS change_rate
-    FROM 
-        (SELECT 
-            sku, 
-            product_name, 
-            SUM(sales_volume) AS current_volume
-         FROM 
-            sales_data
-         WHERE 
-            month = :current_month
-         GROUP BY 
-            sku, product_name) AS t1
-    JOIN 
-        (SELECT 
-            sku, 
-            product_name, 
-            SUM(sales_volume) AS previous_volume
-         FROM 
-            sales_data
-         WHERE 
-            month = :previous_month
-         GROUP BY 
-            sku, product_name) AS t2
-    ON 
-        t1.sku = t2.sku
-    WHERE
-        t1.current_volume > t2.previous_volume
-    ORDER BY 
-        volume_change DESC
-    LIMIT :limit
-    """
-    
-    results = db.execute(text(query), {
-        "current_month": current_month,
-        "previous_month": previous_month,
-        "limit": limit
-    }).fetchall()
+    results = compare_periods(
+        db, "product", ["sales_volume"], current_month, previous_month, period_type="month",
+        having="increased", order_by=("delta", True), limit=limit
+    )
     
     return [
         {
-            "sku": row[0],
-            "product_name": row[1],
-            "current_value": float(row[2]) if row[2] is not None else 0.0,
-            "previous_value": float(row[3]) if row[3] is not None else 0.0,
-            "amount_change": float(row[4]) if row[4] is not None else 0.0,
-            "change_rate": float(row[5]) if row[5] is not None else 0.0
+            "sku": row.sku,
+            "product_name": row.product_name,
+            "current_value": float(row.sales_volume_current),
+            "previous_value": float(row.sales_volume_previous),
+            "amount_change": float(row.sales_volume_delta),
+            "change_rate": float(row.sales_volume_rate) if row.sales_volume_rate is not None else 0.0
         }
         for row in results
     ]
@@ -523,9 +986,8 @@ def get_month_top_increased_sales_volume(db, current_month=None, previous_month=
 def get_month_top_decreased_sales_volume(db, current_month=None, previous_month=None, limit=10):
     """获取月度环比销量下降Top10"""
     if not current_month or not previous_month:
-        # 获取所有月份并按降序排列
-        all_months = db.query(SalesData.month).distinct().order_by(SalesData.month.desc()).all()
-        months = [m[0] for m in all_months if m[0]]
+        # 从周期目录取最近的两个月
+        months = get_latest_periods(db, "month", limit=2)
         
         if len(months) >= 2:
             current_month = months[0]
@@ -533,63 +995,19 @@ def get_month_top_decreased_sales_volume(db, current_month=None, previous_month=
         else:
             return []  # 没有足够的月份数据进行比较
     
-    query = """
-    SELECT 
-        t1.sku,
-        t1.product_name,
-        t1.current_volume,
-        t2.previous_volume,
-        (t2.previous_volume - t1.current_volume) AS volume_decrease,
-        CASE 
-            WHEN t2.previous_volume > 0 THEN 
-                ((t1.current_volume - t2.previous_volume) / t2.previous_volume) * 100
-            ELSE 0
-        END AS change_rate
-    FROM 
-        (SELECT 
-            sku, 
-            product_name, 
-            SUM(sales_volume) AS current_volume
-         FROM 
-            sales_data
-         WHERE 
-            month = :current_month
-         GROUP BY 
-            sku, product_name) AS t1
-    JOIN 
-        (SELECT 
-            sku, 
-            product_name, 
-            SUM(sales_volume) AS previous_volume
-         FROM 
-            sales_data
-         WHERE 
-            month = :previous_month
-         GROUP BY 
-            sku, product_name) AS t2
-    ON 
-        t1.sku = t2.sku
-    WHERE
-        t1.current_volume < t2.previous_volume
-    ORDER BY 
-        volume_decrease DESC
-    LIMIT :limit
-    """
-    
-    results = db.execute(text(query), {
-        "current_month": current_month,
-        "previous_month": previous_month,
-        "limit": limit
-    }).fetchall()
+    results = compare_periods(
+        db, "product", ["sales_volume"], current_month, previous_month, period_type="month",
+        having="decreased", order_by=("delta", False), limit=limit
+    )
     
     return [
         {
-            "sku": row[0],
-            "product_name": row[1],
-            "current_value": float(row[2]) if row[2] is not None else 0.0,
-            "previous_value": float(row[3]) if row[3] is not None else 0.0,
-            "amount_change": float(row[4]) if row[4] is not None else 0.0,
-            "change_rate": float(row[5]) if row[5] is not None else 0.0
+            "sku": row.sku,
+            "product_name": row.product_name,
+            "current_value": float(row.sales_volume_current),
+            "previous_value": float(row.sales_volume_previous),
+            "amount_change": float(-row.sales_volume_delta),
+            "change_rate": float(row.sales_volume_rate) if row.sales_volume_rate is not None else 0.0
         }
         for row in results
     ]
@@ -597,9 +1015,8 @@ def get_month_top_decreased_sales_volume(db, current_month=None, previous_month=
 def get_month_country_sales_distribution(db, current_month=None, previous_month=None):
     """获取月度国家销售额分布与环比"""
     if not current_month or not previous_month:
-        # 获取所有月份并按降序排列
-        all_months = db.query(SalesData.month).distinct().order_by(SalesData.month.desc()).all()
-        months = [m[0] for m in all_months if m[0]]
+        # 从周期目录取最近的两个月
+        months = get_latest_periods(db, "month", limit=2)
         
         if len(months) >= 2:
             current_month = months[0]
@@ -607,48 +1024,23 @@ def get_month_country_sales_distribution(db, current_month=None, previous_month=
         else:
             return []  # 没有足够的月份数据进行比较
     
-    # 当前月销售额
-    current_query = db.query(
-        SalesData.buyer_country,
-        func.sum(SalesData.sales_amount).label('total_amount')
-    ).filter(
-        SalesData.month == current_month
-    ).group_by(
-        SalesData.buyer_country
-    ).order_by(text('total_amount DESC')).all()
-    
-    # 上月销售额
-    previous_query = db.query(
-        SalesData.buyer_country,
-        func.sum(SalesData.sales_amount).label('total_amount')
-    ).filter(
-        SalesData.month == previous_month
-    ).group_by(
-        SalesData.buyer_country
-    ).all()
-    
-    # 转换为字典 {country: amount}
-    previous_data = {row.buyer_country: float(row.total_amount) for row in previous_query if row.buyer_country}
+    # 本月有销售的国家，按本月销售额降序，一次查询同时取回上月销售额
+    results = compare_periods(
+        db, "buyer_country", ["sales_amount"], current_month, previous_month, period_type="month",
+        having="current", order_by=("current", True)
+    )
     
     # 计算环比
     result = []
-    for row in current_query:
+    for row in results:
         if not row.buyer_country:
             continue
-            
-        current_amount = float(row.total_amount) if row.total_amount else 0
-        previous_amount = previous_data.get(row.buyer_country, 0)
-        
-        # 计算环比变化率
-        change_rate = 0
-        if previous_amount > 0:
-            change_rate = (current_amount - previous_amount) / previous_amount * 100
         
         result.append({
             "country": row.buyer_country,
-            "value": current_amount,
-            "previous_value": previous_amount,
-            "change_rate": round(change_rate, 2)
+            "value": float(row.sales_amount_current) if row.sales_amount_current else 0,
+            "previous_value": float(row.sales_amount_previous or 0),
+            "change_rate": round(row.sales_amount_rate, 2) if row.sales_amount_previous else 0
         })
     
     return result
@@ -656,9 +1048,8 @@ def get_month_country_sales_distribution(db, current_month=None, previous_month=
 def get_month_platform_comparison(db, current_month=None, previous_month=None):
     """获取月度平台销售数据环比"""
     if not current_month or not previous_month:
-        # 获取所有月份并按降序排列
-        all_months = db.query(SalesData.month).distinct().order_by(SalesData.month.desc()).all()
-        months = [m[0] for m in all_months if m[0]]
+        # 从周期目录取最近的两个月
+        months = get_latest_periods(db, "month", limit=2)
         
         if len(months) >= 2:
             current_month = months[0]
@@ -666,79 +1057,38 @@ def get_month_platform_comparison(db, current_month=None, previous_month=None):
         else:
             return {"current": {}, "previous": {}, "platforms": []}  # 没有足够的月份数据
     
-    # 当前月平台数据
-    current_query = db.query(
-        SalesData.platform,
-        func.sum(SalesData.sales_amount).label('sales_amount'),
-        func.sum(SalesData.sales_volume).label('sales_volume'),
-        func.sum(SalesData.order_count).label('order_count'),
-        func.sum(SalesData.profit).label('profit')
-    ).filter(
-        SalesData.month == current_month
-    ).group_by(
-        SalesData.platform
-    ).all()
-    
-    # 上月平台数据
-    previous_query = db.query(
-        SalesData.platform,
-        func.sum(SalesData.sales_amount).label('sales_amount'),
-        func.sum(SalesData.sales_volume).label('sales_volume'),
-        func.sum(SalesData.order_count).label('order_count'),
-        func.sum(SalesData.profit).label('profit')
-    ).filter(
-        SalesData.month == previous_month
-    ).group_by(
-        SalesData.platform
-    ).all()
+    # 两个月的平台数据一次查询取回
+    results = compare_periods(
+        db, "platform", ["sales_amount", "sales_volume", "order_count", "profit"],
+        current_month, previous_month, period_type="month"
+    )
     
-    # 汇总当前月数据
+    # 分别汇总当前月和上月数据，只包含该月有数据的平台
     current_data = {}
-    for row in current_query:
-        if not row.platform:
-            continue
-            
-        platform = row.platform
-        sales_amount = float(row.sales_amount) if row.sales_amount else 0
-        sales_volume = float(row.sales_volume) if row.sales_volume else 0
-        order_count = int(row.order_count) if row.order_count else 0
-        profit = float(row.profit) if row.profit else 0
-        
-        # 计算毛利率
-        profit_rate = 0
-        if sales_amount > 0:
-            profit_rate = (profit / sales_amount) * 100
-        
-        current_data[platform] = {
-            "sales_amount": sales_amount,
-            "sales_volume": sales_volume,
-            "order_count": order_count,
-            "profit_rate": round(profit_rate, 2)
-        }
-    
-    # 汇总上月数据
     previous_data = {}
-    for row in previous_query:
+    for row in results:
         if not row.platform:
             continue
-            
-        platform = row.platform
-        sales_amount = float(row.sales_amount) if row.sales_amount else 0
-        sales_volume = float(row.sales_volume) if row.sales_volume else 0
-        order_count = int(row.order_count) if row.order_count else 0
-        profit = float(row.profit) if row.profit else 0
-        
-        # 计算毛利率
-        profit_rate = 0
-        if sales_amount > 0:
-            profit_rate = (profit / sales_amount) * 100
         
-        previous_data[platform] = {
-            "sales_amount": sales_amount,
-            "sales_volume": sales_volume,
-            "order_count": order_count,
-            "profit_rate": round(profit_rate, 2)
-        }
+        for side, data in (("current", current_data), ("previous", previous_data)):
+            if getattr(row, f"sales_amount_{side}") is None:
+                continue
+            sales_amount = float(getattr(row, f"sales_amount_{side}") or 0)
+            sales_volume = float(getattr(row, f"sales_volume_{side}") or 0)
+            order_count = int(getattr(row, f"order_count_{side}") or 0)
+            profit = float(getattr(row, f"profit_{side}") or 0)
+            
+            # 计算毛利率
+            profit_rate = 0
+            if sales_amount > 0:
+                profit_rate = (profit / sales_amount) * 100
+            
+            data[row.platform] = {
+                "sales_amount": sales_amount,
+                "sales_volume": sales_volume,
+                "order_count": order_count,
+                "profit_rate": round(profit_rate, 2)
+            }
     
     # 获取所有平台
     all_platforms = set(list(current_data.keys()) + list(previous_data.keys()))
@@ -752,9 +1102,8 @@ def get_month_platform_comparison(db, current_month=None, previous_month=None):
 def get_month_salesperson_comparison(db, current_month=None, previous_month=None):
     """获取月度销售人员数据环比"""
     if not current_month or not previous_month:
-        # 获取所有月份并按降序排列
-        all_months = db.query(SalesData.month).distinct().order_by(SalesData.month.desc()).all()
-        months = [m[0] for m in all_months if m[0]]
+        # 从周期目录取最近的两个月
+        months = get_latest_periods(db, "month", limit=2)
         
         if len(months) >= 2:
             current_month = months[0]
@@ -762,79 +1111,38 @@ def get_month_salesperson_comparison(db, current_month=None, previous_month=None
         else:
             return []  # 没有足够的月份数据
     
-    # 当前月销售人员数据
-    current_query = db.query(
-        SalesData.sales_person,
-        func.sum(SalesData.sales_amount).label('sales_amount'),
-        func.sum(SalesData.sales_volume).label('sales_volume'),
-        func.sum(SalesData.order_count).label('order_count'),
-        func.sum(SalesData.profit).label('profit')
-    ).filter(
-        SalesData.month == current_month
-    ).group_by(
-        SalesData.sales_person
-    ).all()
-    
-    # 上月销售人员数据
-    previous_query = db.query(
-        SalesData.sales_person,
-        func.sum(SalesData.sales_amount).label('sales_amount'),
-        func.sum(SalesData.sales_volume).label('sales_volume'),
-        func.sum(SalesData.order_count).label('order_count'),
-        func.sum(SalesData.profit).label('profit')
-    ).filter(
-        SalesData.month == previous_month
-    ).group_by(
-        SalesData.sales_person
-    ).all()
-    
-    # 将上月数据转换为字典 {sales_person: data}
-    previous_data = {}
-    for row in previous_query:
-        if not row.sales_person:
-            continue
-            
-        sales_person = row.sales_person
-        sales_amount = float(row.sales_amount) if row.sales_amount else 0
-        sales_volume = float(row.sales_volume) if row.sales_volume else 0
-        order_count = int(row.order_count) if row.order_count else 0
-        profit = float(row.profit) if row.profit else 0
-        
-        # 计算毛利率
-        profit_rate = 0
-        if sales_amount > 0:
-            profit_rate = (profit / sales_amount) * 100
-        
-        previous_data[sales_person] = {
-            "sales_amount": sales_amount,
-            "sales_volume": sales_volume,
-            "order_count": order_count,
-            "profit_rate": round(profit_rate, 2)
-        }
+    # 本月有数据的销售人员，按本月销售额降序，一次查询同时取回上月数据
+    results = compare_periods(
+        db, "sales_person", ["sales_amount", "sales_volume", "order_count", "profit"],
+        current_month, previous_month, period_type="month",
+        having="current", order_by=("current", True)
+    )
     
     # 整合数据并计算环比
     result = []
-    for row in current_query:
+    for row in results:
         if not row.sales_person:
             continue
             
         sales_person = row.sales_person
-        current_amount = float(row.sales_amount) if row.sales_amount else 0
-        current_volume = float(row.sales_volume) if row.sales_volume else 0
-        current_orders = int(row.order_count) if row.order_count else 0
-        current_profit = float(row.profit) if row.profit else 0
+        current_amount = float(row.sales_amount_current) if row.sales_amount_current else 0
+        current_volume = float(row.sales_volume_current) if row.sales_volume_current else 0
+        current_orders = int(row.order_count_current) if row.order_count_current else 0
+        current_profit = float(row.profit_current) if row.profit_current else 0
         
         # 计算当前毛利率
         current_profit_rate = 0
         if current_amount > 0:
             current_profit_rate = (current_profit / current_amount) * 100
         
-        # 获取上月数据
-        prev_data = previous_data.get(sales_person, {})
-        previous_amount = prev_data.get("sales_amount", 0)
-        previous_volume = prev_data.get("sales_volume", 0)
-        previous_orders = prev_data.get("order_count", 0)
-        previous_profit_rate = prev_data.get("profit_rate", 0)
+        # 上月数据，上月没有数据时按0计
+        previous_amount = float(row.sales_amount_previous) if row.sales_amount_previous else 0
+        previous_volume = float(row.sales_volume_previous) if row.sales_volume_previous else 0
+        previous_orders = int(row.order_count_previous) if row.order_count_previous else 0
+        previous_profit = float(row.profit_previous) if row.profit_previous else 0
+        previous_profit_rate = 0
+        if previous_amount > 0:
+            previous_profit_rate = round((previous_profit / previous_amount) * 100, 2)
         
         # 计算环比变化率
         amount_change_rate = 0
@@ -872,13 +1180,20 @@ def get_month_salesperson_comparison(db, current_month=None, previous_month=None
             "profit_rate_change": round(profit_rate_change, 2)
         })
     
-    # 按销售额排序
-    result.sort(key=lambda x: x["sales_amount"], reverse=True)
-    
     return result
 
+def get_latest_periods(db, period_type, limit=None):
+    """从周期目录按时间倒序取出周期，limit为None时返回全部"""
+    store = columnar.for_session(db)
+    if store is not None:
+        return store.latest_periods(period_type, limit)
+    query = db.query(PeriodCatalog.period).filter(
+        PeriodCatalog.period_type == period_type, PeriodCatalog.period != ""
+    ).order_by(PeriodCatalog.sort_key.desc(), PeriodCatalog.period.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return [row[0] for row in query.all() if row[0]]
+
 def get_available_months(db):
-    """获取所有可用的月份"""
-    result = db.query(SalesData.month).distinct().order_by(SalesData.month.desc()).all()
-    months = [row[0] for row in result if row[0]]
-    return months
\ No newline at end of file
+    """获取所有可用的月份，最近的月份在前"""
+    return get_latest_periods(db, "month")
@@ -0,0 +1,122 @@
+"""订单级导入：上传ERP导出的原始订单行，按订单日期推算周、月并预先汇总到事实表粒度
+
+每块订单行在进程池中清洗后立即按 商品、店铺、站点、仓库、国家、平台、销售人员、订单状态 和
+订单日期所在的周一、月初 groupby求和，只把部分汇总传回主进程；主进程合并各块后按数据截止日期
+给周打标签（本周/上周/上上周，更早的周为"2024-W05"），月份标为"2024-09"，再交给原有的入库流程。
+
+订单数按订单行计数，文件带"订单数"列时累加该列；毛利率按汇总后的 毛利额/销售额 重新计算（百分比）。
+"""
+import os
+import pandas as pd
+import ingest
+import rollups
+
+# 订单行文件必须包含的原始列（不需要周、月）
+REQUIRED_COLUMNS = ingest.REQUIRED_COLUMNS + [ingest.ORDER_DATE_COLUMN]
+
+# 汇总键（清洗后的列名）：全部字符串/维度列，其中week、month在汇总前为周一、月初日期
+GROUP_COLUMNS = ingest.STRING_COLUMNS
+
+# 累加的指标，order_lines为原始订单行数，只用于统计
+SUM_COLUMNS = ["sales_volume", "sales_amount", "order_count", "profit", "order_lines"]
+
+# 汇总后每次交给入库流程的行数
+ORDER_OUTPUT_ROWS = int(os.getenv("ORDER_OUTPUT_ROWS", ingest.CSV_CHUNK_ROWS))
+
+_LABELS = {offset: label for label, offset in rollups.RELATIVE_WEEKS.items()}
+
+
+def _sum(frame):
+    """按汇总键求和；文件中没有的维度列不参与分组，空值单独成组"""
+    keys = [col for col in GROUP_COLUMNS if col in frame.columns]
+    return frame.groupby(keys, observed=True, dropna=False, sort=False)[SUM_COLUMNS].sum().reset_index()
+
+
+def parse_order_dates(values):
+    """订单日期解析为当天零点；按推断格式批量解析，格式不一致的少数值再逐个解析"""
+    dates = pd.to_datetime(values, errors="coerce")
+    retry = dates.isna() & values.notna()
+    if retry.any():
+        dates[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return dates.dt.normalize()
+
+
+def clean_order_chunk(chunk, check_columns=False):
+    """清洗一块订单行并按事实表粒度汇总，可在子进程中执行；返回的week、month为周一、月初日期"""
+    if check_columns:
+        missing_columns = ingest.find_missing_columns(chunk.columns, REQUIRED_COLUMNS)
+        if missing_columns:
+            raise ValueError(f"文件缺少必要的列: {', '.join(missing_columns)}")
+
+    days = parse_order_dates(chunk[ingest.ORDER_DATE_COLUMN])
+    invalid = int(days.isna().sum())
+    if invalid:
+        print(f"{invalid} 行订单日期无法识别，周、月留空")
+
+    # 周、月由订单日期推算，原文件中的同名列和行级毛利率不使用
+    raw = chunk.drop(columns=[col for col in ("周", "月", "毛利率") if col in chunk.columns])
+    cleaned = ingest.process_data(raw.assign(**{"周": ""}))
+    cleaned["week"] = days - pd.to_timedelta(days.dt.weekday, unit="D")
+    cleaned["month"] = days.dt.to_period("M").dt.start_time
+    if "order_count" not in cleaned.columns:
+        cleaned["order_count"] = 1
+    cleaned["order_lines"] = 1
+    return _sum(cleaned)
+
+
+def week_label(monday, anchor=None):
+    """周一日期转为周标签：截止日期所在周及之前两周用相对标签，其余用ISO周"""
+    offset = (monday - rollups.period_start("week", _LABELS[0], anchor)).days // 7
+    if offset in _LABELS:
+        return _LABELS[offset]
+    year, week, _ = monday.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def month_label(first_day):
+    return f"{first_day.year}-{first_day.month:02d}"
+
+
+def _labels(values, formatter):
+    """日期列转为标签列，每个不同日期只格式化一次，无日期时为空串"""
+    labels = {value: formatter(value.date()) for value in values.dropna().unique()}
+    return values.map(labels).fillna("").astype("category")
+
+
+class OrderAggregator:
+    """合并各块订单行的部分汇总，定期压缩，最后给周、月打标签"""
+
+    def __init__(self, anchor=None):
+        self.anchor = anchor
+        self.partials = []
+        self.lines = 0
+
+    def add(self, partial):
+        self.lines += int(partial["order_lines"].sum())
+        self.partials.append(partial)
+        if len(self.partials) >= rollups.COMPACT_EVERY:
+            self.partials = [_sum(pd.concat(self.partials, ignore_index=True))]
+
+    def frame(self):
+        """返回与清洗后上传数据格式相同的汇总行"""
+        if not self.partials:
+            return pd.DataFrame(columns=GROUP_COLUMNS + SUM_COLUMNS[:-1] + ["profit_rate"])
+        result = _sum(pd.concat(self.partials, ignore_index=True)).drop(columns=["order_lines"])
+        result["week"] = _labels(result["week"], lambda monday: week_label(monday, self.anchor))
+        result["month"] = _labels(result["month"], month_label)
+        amount = result["sales_amount"]
+        result["profit_rate"] = (result["profit"] / amount.where(amount != 0) * 100).fillna(0)
+        result["order_count"] = pd.to_numeric(result["order_count"], downcast="integer")
+        return result
+
+
+def aggregate(frames, anchor=None, chunk_rows=None):
+    """读完全部订单行的部分汇总后，按chunk_rows行一块产出汇总后的数据"""
+    chunk_rows = chunk_rows or ORDER_OUTPUT_ROWS
+    aggregator = OrderAggregator(anchor)
+    for partial in frames:
+        aggregator.add(partial)
+    result = aggregator.frame()
+    print(f"订单级导入: {aggregator.lines} 行订单汇总为 {len(result)} 行")
+    for start in range(0, max(len(result), 1), chunk_rows):
+        yield result.iloc[start:start + chunk_rows].reset_index(drop=True)
@@ -0,0 +1,243 @@
+"""上传前预检：只读取文件开头的一小段，检查表头和列类型并估算行数，不保存文件、不入库
+
+CSV、JSON Lines（包括.gz压缩的）只需要前 PREFLIGHT_BYTES 字节（浏览器可用 file.slice 只发送开头），
+gzip按能解压出的部分解析，截断处不完整的最后一行丢弃；xlsx和Parquet的目录在文件末尾，只有完整文件
+才能读取，因此按整个文件预检，超过 PREFLIGHT_EXCEL_MAX_BYTES 时不做预检；zip包不做预检。
+"""
+import io
+import os
+import re
+import time
+import zlib
+import zipfile
+import importlib.util
+import pandas as pd
+import ingest
+import orders
+
+# CSV预检读取的字节数
+PREFLIGHT_BYTES = int(os.getenv("PREFLIGHT_BYTES", 256 * 1024))
+
+# 可以预检的Excel文件大小上限（字节）
+PREFLIGHT_EXCEL_MAX_BYTES = int(os.getenv("PREFLIGHT_EXCEL_MAX_BYTES", 20 * 1024 * 1024))
+
+# Excel预检读取的数据行数
+PREFLIGHT_ROWS = int(os.getenv("PREFLIGHT_ROWS", 1000))
+
+# 原始表头 -> 清洗规则；清洗时也接受模型字段名作为表头
+_SPECS = {spec.source: spec for spec in ingest.SALES_SCHEMA}
+_SPECS.update({spec.name: spec for spec in ingest.SALES_SCHEMA})
+_FIELD_SOURCES = {spec.name: spec.source for spec in ingest.SALES_SCHEMA}
+
+_DATE_LIKE = re.compile(r"^\s*\d{4}[-/.年]\d{1,2}[-/.月]\d{1,2}")
+
+
+def find_missing_columns(columns, order_level=False):
+    """与导入时相同的必要列校验：必需的原始表头或对应的模型字段名必须存在，清洗后的必需字段（如周）也一样"""
+    required = orders.REQUIRED_COLUMNS if order_level else ingest.REQUIRED_COLUMNS
+    missing = ingest.find_missing_columns(columns, required)
+    if not order_level:
+        missing += [_FIELD_SOURCES[field] for field in ingest.REQUIRED_FIELDS
+                    if _FIELD_SOURCES[field] not in required and _FIELD_SOURCES[field] not in columns
+                    and field not in columns]
+    return missing
+
+
+async def read_sample(file, total_size=None):
+    """读取上传的样本：CSV、JSON Lines最多PREFLIGHT_BYTES字节，Excel、Parquet读取整个文件
+
+    返回 (样本字节, 原文件总字节数, 样本是否为完整文件)；total_size为浏览器只发送开头时原文件的大小。
+    """
+    if file.filename.endswith(ingest.ARCHIVE_EXTENSIONS):
+        raise ValueError("zip包不做预检")
+    streaming = file.filename.endswith(ingest.STREAM_EXTENSIONS)
+    limit = PREFLIGHT_BYTES if streaming else PREFLIGHT_EXCEL_MAX_BYTES
+    data = await file.read(limit + 1)
+    if len(data) > limit:
+        if not streaming:
+            raise ValueError(f"文件超过 {PREFLIGHT_EXCEL_MAX_BYTES // 1024 // 1024} MB，不做预检")
+        data = data[:limit]
+        total_size = total_size or file.size
+        return data, total_size, False
+    total_size = total_size or len(data)
+    return data, total_size, total_size <= len(data)
+
+
+def _decompress_sample(data, complete):
+    """解压gzip样本，最多解压出PREFLIGHT_BYTES字节
+
+    返回 (解压后的字节, 是否为完整文件, 实际用到的压缩字节数)
+    """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    try:
+        text = decompressor.decompress(data, PREFLIGHT_BYTES)
+    except zlib.error:
+        raise ValueError("文件不是有效的gzip压缩文件")
+    return text, complete and decompressor.eof, len(data) - len(decompressor.unconsumed_tail)
+
+
+def _complete_lines(data, complete):
+    """丢弃截断处不完整的最后一行"""
+    if not complete:
+        data = data[:data.rfind(b"\n") + 1]
+        if not data:
+            raise ValueError("预检数据中没有完整的一行")
+    return data
+
+
+def _read_csv_sample(data, complete):
+    """解析CSV样本，返回 (数据, 实际解析的字节数)"""
+    data = _complete_lines(data, complete)
+    try:
+        return pd.read_csv(io.BytesIO(data), dtype=str), len(data)
+    except UnicodeDecodeError:
+        raise ValueError("CSV文件不是UTF-8编码，请另存为UTF-8后再上传")
+    except pd.errors.ParserError as e:
+        raise ValueError(f"CSV格式错误: {e}")
+
+
+def _read_json_sample(data, complete):
+    """解析JSON Lines样本，返回 (数据, 实际解析的字节数)"""
+    data = _complete_lines(data, complete)
+    try:
+        return pd.read_json(io.BytesIO(data), lines=True, dtype=False, convert_dates=False), len(data)
+    except ValueError as e:
+        raise ValueError(f"JSON Lines格式错误（每行应为一个JSON对象）: {e}")
+
+
+def _read_parquet_sample(data):
+    """读取Parquet的前PREFLIGHT_ROWS行，返回 (数据, 总行数)"""
+    if not importlib.util.find_spec("pyarrow"):
+        raise ValueError("读取Parquet文件需要安装pyarrow")
+    import pyarrow
+    import pyarrow.parquet
+    try:
+        parquet = pyarrow.parquet.ParquetFile(io.BytesIO(data))
+    except pyarrow.ArrowInvalid:
+        raise ValueError("Parquet文件不完整或已损坏：需要上传整个文件才能预检")
+    batch = next(parquet.iter_batches(batch_size=PREFLIGHT_ROWS), None)
+    df = batch.to_pandas() if batch is not None else pd.DataFrame(columns=parquet.schema_arrow.names)
+    return df, parquet.metadata.num_rows
+
+
+def _read_excel_sample(data, filename):
+    """读取Excel第一个工作表的表头和前PREFLIGHT_ROWS行，返回 (数据, 工作表总数据行数或None)"""
+    try:
+        if filename.endswith(".xls"):
+            return pd.read_excel(io.BytesIO(data), nrows=PREFLIGHT_ROWS, dtype=object), None
+        from openpyxl import load_workbook
+        workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    except zipfile.BadZipFile:
+        raise ValueError("Excel文件不完整：xlsx需要上传整个文件才能预检")
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True, max_row=PREFLIGHT_ROWS + 1)
+        header = next(rows, None) or ()
+        names = [str(name).strip() if name is not None else "" for name in header]
+        records = [tuple(row) + (None,) * (len(names) - len(row)) for row in rows]
+        total_rows = sheet.max_row - 1 if sheet.max_row else None
+    finally:
+        workbook.close()
+    df = pd.DataFrame.from_records([row[:len(names)] for row in records], columns=range(len(names)))
+    df.columns = names
+    return df.loc[:, [name != "" for name in names]], total_rows
+
+
+def _present(values):
+    """去掉空值和空白字符串"""
+    values = values.dropna()
+    return values[values.astype(str).str.strip() != ""]
+
+
+def _invalid_dates(values):
+    return int(orders.parse_order_dates(values).isna().sum())
+
+
+def detect_type(values):
+    """样本中一列的类型: empty / integer / float / date / text"""
+    values = _present(values)
+    if values.empty:
+        return "empty"
+    numbers = pd.to_numeric(values, errors="coerce")
+    if numbers.notna().all():
+        return "integer" if (numbers % 1 == 0).all() else "float"
+    if pd.api.types.is_datetime64_any_dtype(values) or _DATE_LIKE.match(str(values.iloc[0])):
+        if not _invalid_dates(values):
+            return "date"
+    return "text"
+
+
+def _examples(values):
+    return "、".join(f"'{value}'" for value in values.unique()[:3])
+
+
+def inspect(data, filename, total_size=None, complete=True, order_level=False):
+    """检查样本：缺少的必要列、不会导入的列、各列类型、数值列中的非法值，并估算总行数"""
+    started = time.perf_counter()
+    if filename.endswith(ingest.EXCEL_EXTENSIONS):
+        df, total_rows = _read_excel_sample(data, filename)
+        estimated_rows = total_rows if total_rows is not None else (len(df) if len(df) < PREFLIGHT_ROWS else None)
+        exact = total_rows is not None or estimated_rows is not None
+    elif filename.endswith(ingest.PARQUET_EXTENSIONS):
+        df, estimated_rows = _read_parquet_sample(data)
+        exact = True
+    else:
+        compressed_bytes = None
+        if filename.endswith(".gz"):
+            data, complete, compressed_bytes = _decompress_sample(data, complete)
+        json_lines = filename.endswith(ingest.JSON_LINES_EXTENSIONS)
+        df, used_bytes = (_read_json_sample if json_lines else _read_csv_sample)(data, complete)
+        if complete:
+            estimated_rows, exact = len(df), True
+        elif compressed_bytes:
+            # 压缩文件按样本的压缩比推算
+            estimated_rows = round(len(df) * total_size / compressed_bytes) if total_size else None
+            exact = False
+        else:
+            # 按样本的平均行宽推算：(总字节 - 表头) / (样本字节 - 表头) * 样本行数
+            header_bytes = 0 if json_lines else data.find(b"\n") + 1
+            body_bytes = max(used_bytes - header_bytes, 1)
+            estimated_rows = round(len(df) * (total_size - header_bytes) / body_bytes) if total_size else None
+            exact = False
+
+    columns = [str(column).strip() for column in df.columns]
+    df.columns = columns
+    accepted = set(_SPECS) | ({ingest.ORDER_DATE_COLUMN} if order_level else set())
+    mapped = {column: _SPECS[column].name if column in _SPECS else "order_date" for column in columns if column in accepted}
+    missing = find_missing_columns(columns, order_level)
+    required = set(orders.REQUIRED_COLUMNS if order_level else ingest.REQUIRED_COLUMNS)
+    required |= {ingest.COLUMN_MAPPING[column] for column in required if column in ingest.COLUMN_MAPPING}
+
+    warnings = []
+    for column in mapped:
+        values = _present(df[column])
+        if column == ingest.ORDER_DATE_COLUMN:
+            invalid = _invalid_dates(values)
+            if invalid:
+                warnings.append(f"{column}: 样本中 {invalid} 个值不是日期")
+        elif _SPECS[column].kind in ("float", "integer"):
+            numbers = pd.to_numeric(values, errors="coerce")
+            if numbers.isna().any():
+                warnings.append(f"{column}: 样本中 {int(numbers.isna().sum())} 个值不是数字"
+                                f"（如 {_examples(values[numbers.isna()])}），导入时按 {_SPECS[column].fill} 处理")
+        if column in required and values.empty and len(df):
+            warnings.append(f"{column}: 样本中全部为空")
+    if order_level:
+        ignored = [column for column in ("周", "月", "毛利率") if column in columns]
+        if ignored:
+            warnings.append(f"订单级导入时 {'、'.join(ignored)} 由订单日期和汇总结果重新计算，文件中的值不使用")
+
+    return {
+        "filename": filename,
+        "ok": not missing,
+        "columns": columns,
+        "mapped_columns": mapped,
+        "unmapped_columns": [column for column in columns if column not in mapped],
+        "missing_columns": missing,
+        "column_types": {column: detect_type(df[column]) for column in columns},
+        "warnings": warnings,
+        "sample_rows": len(df),
+        "estimated_rows": estimated_rows,
+        "exact_rows": exact,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
@@ -0,0 +1,218 @@
+"""分块续传上传：客户端按编号逐块发送（可带SHA-256校验），服务端按偏移量追加到暂存文件并确认
+
+客户端用 文件名+大小+修改时间 作为key创建上传会话，连接中断或刷新页面后用同一个key重新创建，
+得到已确认的偏移量，从断点继续发送；最后一块到达后才开始导入。
+CSV、JSON Lines边接收边解析（.gz边接收边解压）：第一块到达后即按块读取暂存文件（读到已接收的末尾时
+等待后续块），在进程池中清洗，清洗结果暂存为Parquet，导入任务直接读取；Excel、Parquet和zip包的目录
+在文件末尾，只能在全部接收后解析。
+会话只保存在内存中，服务重启后需要重新上传。
+"""
+import io
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+import ingest
+import jobs
+import frame_cache
+
+# 每块的字节数（最后一块可以更小）
+RESUMABLE_CHUNK_SIZE = int(os.getenv("RESUMABLE_CHUNK_SIZE", 8 * 1024 * 1024))
+
+# 暂存目录
+RESUMABLE_DIR = os.getenv("RESUMABLE_DIR", os.path.join("uploads", "sessions"))
+
+# 多久没有收到新块的未完成会话被清理（秒）
+RESUMABLE_TTL = int(os.getenv("RESUMABLE_TTL", 24 * 3600))
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+class OffsetMismatch(Exception):
+    """收到的块与已确认的偏移量不连续，客户端应从offset处继续"""
+
+    def __init__(self, offset):
+        super().__init__(f"应从偏移量 {offset} 继续上传")
+        self.offset = offset
+
+
+class _GrowingFile(io.RawIOBase):
+    """暂存文件的只读视图：读到已接收数据的末尾时等待后续块，全部接收后返回EOF"""
+
+    def __init__(self, session):
+        self.session = session
+        self.file = open(session.path, "rb")
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        session = self.session
+        with session.condition:
+            while self.position >= session.offset and not session.complete and not session.cancelled:
+                session.condition.wait()
+            if session.cancelled:
+                raise ValueError("上传已取消")
+            available = session.offset - self.position
+        count = self.file.readinto(memoryview(buffer)[:min(len(buffer), available)])
+        self.position += count
+        return count
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class UploadSession:
+    """一次分块上传：暂存文件、已确认的偏移量、整个文件的SHA-256，以及CSV的边收边解析"""
+
+    def __init__(self, key, filename, total_size, options, chunk_size=RESUMABLE_CHUNK_SIZE):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.filename = filename
+        self.total_size = total_size
+        self.options = options
+        self.chunk_size = chunk_size
+        self.directory = os.path.abspath(os.path.join(RESUMABLE_DIR, self.id))
+        self.path = os.path.join(self.directory, "upload" + os.path.splitext(filename)[1])
+        self.offset = 0
+        self.checksums = []
+        self.digest = hashlib.sha256()
+        self.condition = threading.Condition()
+        self.complete = False
+        self.cancelled = False
+        self.updated_at = time.time()
+        self.result = None
+        # 边接收边解析的状态：已清洗的数据块文件、是否解析完成、解析错误
+        self.parts = []
+        self.parsed = False
+        self.parse_error = None
+        os.makedirs(self.directory, exist_ok=True)
+        open(self.path, "wb").close()
+
+    def to_dict(self):
+        return {
+            "upload_id": self.id,
+            "filename": self.filename,
+            "total_size": self.total_size,
+            "chunk_size": self.chunk_size,
+            "offset": self.offset,
+            "complete": self.complete,
+            **(self.result or {})
+        }
+
+    def append(self, index, data, checksum=None):
+        """追加第index块并返回新的偏移量；重复发送已确认的块时直接返回当前偏移量"""
+        start = index * self.chunk_size
+        if checksum and hashlib.sha256(data).hexdigest() != checksum.lower():
+            raise ValueError(f"第 {index} 块校验失败，请重新发送")
+        with self.condition:
+            if self.cancelled:
+                raise ValueError("上传已取消")
+            if start < self.offset:
+                # 上次发送成功但确认丢失，客户端重发
+                if index < len(self.checksums) and checksum and self.checksums[index] != checksum.lower():
+                    raise ValueError(f"第 {index} 块与已接收的内容不一致")
+                return self.offset
+            if start != self.offset:
+                raise OffsetMismatch(self.offset)
+            end = start + len(data)
+            if end > self.total_size or (len(data) != self.chunk_size and end != self.total_size):
+                raise ValueError(f"第 {index} 块大小不正确")
+            with open(self.path, "ab") as output:
+                output.write(data)
+            self.digest.update(data)
+            self.checksums.append(hashlib.sha256(data).hexdigest() if not checksum else checksum.lower())
+            self.offset = end
+            self.complete = end == self.total_size
+            self.updated_at = time.time()
+            self.condition.notify_all()
+            return self.offset
+
+    def content_hash(self):
+        return self.digest.hexdigest()
+
+    def start_parsing(self, cleaner=None):
+        """CSV、JSON Lines在接收的同时开始解析清洗，清洗结果按块写入会话目录"""
+        if not self.filename.endswith(ingest.STREAM_EXTENSIONS):
+            return False
+        threading.Thread(target=self._parse, args=(cleaner,), name=f"upload-{self.id}", daemon=True).start()
+        return True
+
+    def _parse(self, cleaner):
+        try:
+            with io.BufferedReader(_GrowingFile(self), buffer_size=1024 * 1024) as stream:
+                frames = ingest.iter_clean_chunks(stream, self.filename, jobs.manager.parser_pool(), cleaner=cleaner)
+                for index, df in enumerate(frames):
+                    prefix = os.path.join(self.directory, f"part-{index:05d}")
+                    frame_cache.write_frame(df, prefix)
+                    with self.condition:
+                        self.parts.append(prefix + (".parquet" if frame_cache.USE_PARQUET else ".pkl"))
+                        self.condition.notify_all()
+        except Exception as e:
+            if not self.cancelled:
+                print(f"边接收边解析失败 {self.filename}: {str(e)}")
+            with self.condition:
+                self.parse_error = e
+        finally:
+            with self.condition:
+                self.parsed = True
+                self.condition.notify_all()
+
+    def parsed_frames(self):
+        """按顺序产出已清洗的数据块，解析尚未结束时等待"""
+        index = 0
+        while True:
+            with self.condition:
+                while index >= len(self.parts) and not self.parsed:
+                    self.condition.wait()
+                if self.parse_error is not None:
+                    raise self.parse_error
+                if index >= len(self.parts):
+                    return
+                path = self.parts[index]
+            yield frame_cache.read_frame(path)
+            index += 1
+
+    def close(self):
+        """取消未完成的解析并删除暂存文件"""
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify_all()
+        with _lock:
+            _sessions.pop(self.id, None)
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _expire():
+    now = time.time()
+    with _lock:
+        expired = [session for session in _sessions.values()
+                   if not session.complete and now - session.updated_at > RESUMABLE_TTL]
+    for session in expired:
+        print(f"清理超时的上传会话 {session.id} ({session.filename})")
+        session.close()
+
+
+def open_session(key, filename, total_size, options):
+    """创建上传会话；相同key、文件名、大小和导入选项的未结束会话直接返回，用于断点续传"""
+    if total_size <= 0:
+        raise ValueError("文件为空")
+    _expire()
+    with _lock:
+        for session in _sessions.values():
+            if key and (session.key, session.filename, session.total_size, session.options) == \
+                    (key, filename, total_size, options) and not session.cancelled:
+                return session
+        session = UploadSession(key, filename, total_size, options)
+        _sessions[session.id] = session
+    return session
+
+
+def get(upload_id):
+    with _lock:
+        return _sessions.get(upload_id)
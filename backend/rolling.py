@@ -0,0 +1,96 @@
+"""滚动导入：每周只上传新一周的数据，之前的周从正式表复制到影子表并重新标注
+
+新上传的数据作为"本周"；正式表中仍在窗口内的周（按week_start判断）在数据库内
+INSERT ... SELECT 复制到影子表，同时改标为"上周"/"上上周"，不再经过解析、清洗和入库；
+超出窗口的周不复制，随旧表整表删除。这些周的汇总由数据库按维度GROUP BY后并入新汇总。
+"""
+import os
+import pandas as pd
+from sqlalchemy import select, case, func, literal
+import models
+import rollups
+
+# 窗口包含的周数（含本周），最多到"上上周"
+ROLLING_WEEKS = min(int(os.getenv("ROLLING_WEEKS", 2)), len(rollups.RELATIVE_WEEKS))
+
+_LABELS = {offset: label for label, offset in rollups.RELATIVE_WEEKS.items()}
+_CURRENT = _LABELS[0]
+
+
+def carried_weeks(anchor=None, weeks=ROLLING_WEEKS):
+    """窗口内需要从旧数据保留的周：{周一日期: 新标签}"""
+    current = rollups.period_start("week", _CURRENT, anchor)
+    return {rollups.shift_period("week", current, -offset): _LABELS[-offset] for offset in range(1, weeks)}
+
+
+def current_week(df, anchor=None):
+    """新上传的数据块全部标为本周；带有其它周标签的行说明上传了不止一周，直接报错"""
+    current = rollups.period_start("week", _CURRENT, anchor)
+    if "week" in df.columns:
+        labels = df["week"].astype(object)
+        starts = rollups.period_starts("week", labels, anchor)
+        other = labels.notna() & (labels != "") & (starts != current)
+        if other.any():
+            raise ValueError(f"滚动导入只接受本周数据，发现其它周: {', '.join(map(str, labels[other].unique()[:5]))}")
+    df = df.copy()
+    df["week"] = _CURRENT
+    return df
+
+
+def _relabel(fact, carried):
+    return case({start: label for start, label in carried.items()}, value=fact.c.week_start)
+
+
+def carry_over(generation, carried):
+    """把旧事实表中窗口内的周复制到影子表并改标，返回复制的行数"""
+    if not carried:
+        return 0
+    fact = models.SalesData.__table__
+    columns = [column.name for column in fact.columns if column.name not in ("id", "week")]
+    statement = select(*[fact.c[name] for name in columns], _relabel(fact, carried).label("week")).where(
+        fact.c.week_start.in_(list(carried))
+    )
+    return generation.copy(statement, columns + ["week"])
+
+
+def rollup_partials(bind, carried, dimensions=None):
+    """保留的旧周并入新汇总的部分汇总
+
+    周汇总直接取旧汇总表中这些周的行并改标；月汇总需要去掉超出窗口的周，由数据库按 (月份, 成员) 重新汇总。
+    """
+    if not carried:
+        return []
+    fact = models.SalesData.__table__
+    rollup = models.SalesRollup.__table__
+    dimensions = dimensions if dimensions is not None else models.ROLLUP_DIMENSIONS
+    measures = [
+        func.sum(func.coalesce(fact.c[name], 0)).label(name)
+        for name in ("sales_amount", "sales_volume", "order_count", "profit")
+    ] + [
+        func.sum(func.coalesce(fact.c.profit_rate, 0)).label("profit_rate_sum"),
+        func.count(fact.c.profit_rate).label("profit_rate_count"),
+        func.count().label("row_count")
+    ]
+    partials = []
+    with bind.connect() as connection:
+        weeks = pd.DataFrame(connection.execute(
+            select(rollup.c.period_type, rollup.c.period_start, rollup.c.dimension, rollup.c.member_id,
+                   *[rollup.c[name] for name in rollups.MEASURES])
+            .where(rollup.c.period_type == "week", rollup.c.period_start.in_(list(carried)))
+        ).mappings().all())
+        if not weeks.empty:
+            weeks["period"] = weeks["period_start"].map(carried)
+            weeks["member_id"] = weeks["member_id"].astype("Int64")
+            partials.append(weeks)
+
+        for dimension, key in dimensions.items():
+            member = (fact.c[key] if key else literal(None)).label("member_id")
+            statement = select(
+                literal("month").label("period_type"), fact.c.month.label("period"),
+                literal(dimension).label("dimension"), member, *measures
+            ).where(fact.c.week_start.in_(list(carried))).group_by(fact.c.month, *([fact.c[key]] if key else []))
+            months = pd.DataFrame(connection.execute(statement).mappings().all())
+            if not months.empty:
+                months["member_id"] = months["member_id"].astype("Int64")
+                partials.append(months)
+    return partials
@@ -0,0 +1,209 @@
+import re
+from datetime import date, timedelta
+import pandas as pd
+import models
+
+# 汇总的周期类型，对应事实表中的周期列
+PERIOD_TYPES = ("week", "month")
+
+# 汇总表中的累加指标
+MEASURES = ("sales_amount", "sales_volume", "order_count", "profit",
+            "profit_rate_sum", "profit_rate_count", "row_count")
+
+# 累积多少块部分汇总后合并一次，控制内存占用
+COMPACT_EVERY = 16
+
+_GROUP_COLUMNS = ["period_type", "period", "dimension", "member_id"]
+
+# 相对周标签的先后顺序
+RELATIVE_WEEKS = {"上上周": -2, "上周": -1, "本周": 0}
+
+_YEAR_MONTH = re.compile(r"(\d{4})\s*[-/.年]\s*(\d{1,2})")
+_MONTH = re.compile(r"^(\d{1,2})\s*月?$")
+_YEAR_WEEK = re.compile(r"(\d{4})\s*-?\s*W(\d{1,2})", re.IGNORECASE)
+_WEEK = re.compile(r"^第?\s*(\d{1,2})\s*周$")
+_DATE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+
+
+def period_sort_key(period_type, period):
+    """把周期标签解析为可按时间排序的整数，无法识别时返回None
+
+    月: "2024-09"/"2024年9月" -> 202409，"9月" -> 9（无年份时只能按月份排序）；
+    周: "2024-W05" -> 202405，"第5周" -> 5，"本周"/"上周" -> 0/-1。
+    """
+    text = str(period).strip()
+    if period_type == "month":
+        match = _YEAR_MONTH.search(text)
+        if match:
+            return int(match.group(1)) * 100 + int(match.group(2))
+        match = _MONTH.match(text)
+        if match:
+            return int(match.group(1))
+    else:
+        if text in RELATIVE_WEEKS:
+            return RELATIVE_WEEKS[text]
+        match = _YEAR_WEEK.search(text)
+        if match:
+            return int(match.group(1)) * 100 + int(match.group(2))
+        match = _WEEK.match(text)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def _week_monday(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _recent_year(number, current_number, anchor):
+    """没有年份的第N周/N月：取不晚于anchor的最近一次"""
+    return anchor.year if number <= current_number else anchor.year - 1
+
+
+def period_start(period_type, period, anchor=None):
+    """把周期标签解析为绝对的起始日期（周为ISO周一，月为1日），无法识别时返回None
+
+    "本周"/"上周"等相对周和不带年份的"第5周"、"9月"按anchor（数据截止日期，默认今天）推算；
+    周也接受日期或"开始日期_结束日期"，取所在周的周一。
+    """
+    anchor = anchor or date.today()
+    text = str(period).strip()
+    try:
+        if period_type == "month":
+            match = _YEAR_MONTH.search(text)
+            if match:
+                return date(int(match.group(1)), int(match.group(2)), 1)
+            match = _MONTH.match(text)
+            if match:
+                month = int(match.group(1))
+                return date(_recent_year(month, anchor.month, anchor), month, 1)
+            return None
+        if text in RELATIVE_WEEKS:
+            return _week_monday(anchor) + timedelta(weeks=RELATIVE_WEEKS[text])
+        match = _YEAR_WEEK.search(text)
+        if match:
+            return date.fromisocalendar(int(match.group(1)), int(match.group(2)), 1)
+        match = _DATE.match(text)
+        if match:
+            return _week_monday(date(int(match.group(1)), int(match.group(2)), int(match.group(3))))
+        match = _WEEK.match(text)
+        if match:
+            week = int(match.group(1))
+            year = _recent_year(week, anchor.isocalendar()[1], anchor)
+            return date.fromisocalendar(year, week, 1)
+    except ValueError:
+        # 如2024-W60、13月
+        return None
+    return None
+
+
+def shift_period(period_type, start, count):
+    """周期起始日期前后移动count个周期"""
+    if period_type == "month":
+        months = start.year * 12 + start.month - 1 + count
+        return date(months // 12, months % 12 + 1, 1)
+    return start + timedelta(weeks=count)
+
+
+def period_starts(period_type, labels, anchor=None):
+    """与labels逐行对齐的周期起始日期列（object类型，无法识别为None），每个不同标签只解析一次"""
+    labels = labels.astype(object)
+    starts = {label: period_start(period_type, label, anchor) for label in labels.dropna().unique()}
+    return labels.map(starts).astype(object).where(labels.notna(), None)
+
+
+def add_period_keys(fact, anchor=None):
+    """为事实表数据块加上week_start、month_start列"""
+    for period_type in PERIOD_TYPES:
+        fact[f"{period_type}_start"] = period_starts(period_type, _column(fact, period_type), anchor)
+    return fact
+
+
+def catalog_frame(rollup):
+    """由汇总表的total行生成周期目录：每个周期一行，带行数和排序键"""
+    totals = rollup[rollup["dimension"] == "total"]
+    catalog = pd.DataFrame({
+        "period_type": totals["period_type"].to_numpy(),
+        "period": totals["period"].to_numpy(),
+        "period_start": _column(totals, "period_start").to_numpy(),
+        "row_count": totals["row_count"].to_numpy()
+    })
+    catalog["sort_key"] = pd.array(
+        [period_sort_key(period_type, period) for period_type, period in zip(catalog["period_type"], catalog["period"])],
+        dtype="Int64"
+    )
+    return catalog
+
+
+def _column(df, name):
+    """取事实表数据块中的列，缺失时按全空处理"""
+    if name in df.columns:
+        return df[name]
+    return pd.Series(pd.NA, index=df.index, dtype="object")
+
+
+class RollupBuilder:
+    """导入时逐块累加 (周期, 维度, 成员) 汇总，供看板直接读取
+
+    每块事实数据只做一次groupby，部分汇总定期合并；全部数据写完后frame()返回汇总表的全部行，
+    每行带按anchor（数据截止日期）解析出的周期起始日期。
+    """
+
+    def __init__(self, dimensions=None, anchor=None):
+        self.dimensions = dimensions if dimensions is not None else models.ROLLUP_DIMENSIONS
+        self.anchor = anchor
+        self.partials = []
+
+    def add(self, fact):
+        """累加一块事实表数据（维度已替换为 *_id 键）"""
+        if fact.empty:
+            return
+        profit_rate = pd.to_numeric(_column(fact, "profit_rate"), errors="coerce")
+        measures = pd.DataFrame({
+            "sales_amount": pd.to_numeric(_column(fact, "sales_amount"), errors="coerce").fillna(0),
+            "sales_volume": pd.to_numeric(_column(fact, "sales_volume"), errors="coerce").fillna(0),
+            "order_count": pd.to_numeric(_column(fact, "order_count"), errors="coerce").fillna(0),
+            "profit": pd.to_numeric(_column(fact, "profit"), errors="coerce").fillna(0),
+            "profit_rate_sum": profit_rate.fillna(0),
+            "profit_rate_count": profit_rate.notna().astype("int64"),
+            "row_count": 1
+        }, index=fact.index)
+
+        for period_type in PERIOD_TYPES:
+            period = _column(fact, period_type).astype(object)
+            for dimension, key in self.dimensions.items():
+                member = _column(fact, key) if key else pd.Series(pd.NA, index=fact.index, dtype="Int64")
+                grouped = measures.groupby(
+                    [period.rename("period"), member.astype("Int64").rename("member_id")],
+                    dropna=False, sort=False
+                ).sum().reset_index()
+                grouped.insert(0, "period_type", period_type)
+                grouped.insert(2, "dimension", dimension)
+                self.partials.append(grouped)
+
+        if len(self.partials) >= COMPACT_EVERY * len(PERIOD_TYPES) * len(self.dimensions):
+            self.partials = [self._combine(self.partials)]
+
+    def add_partial(self, partial):
+        """并入已按 (周期类型, 周期, 维度, 成员) 汇总好的数据，如滚动导入时由数据库汇总的旧周"""
+        self.partials.append(partial[_GROUP_COLUMNS + list(MEASURES)])
+
+    @staticmethod
+    def _combine(partials):
+        combined = pd.concat(partials, ignore_index=True)
+        return combined.groupby(_GROUP_COLUMNS, dropna=False, sort=False)[list(MEASURES)].sum().reset_index()
+
+    def frame(self):
+        """返回汇总表格式的DataFrame"""
+        if not self.partials:
+            return pd.DataFrame(columns=_GROUP_COLUMNS + ["period_start"] + list(MEASURES))
+        result = self._combine(self.partials)
+        result["member_id"] = result["member_id"].astype("Int64")
+        # 周期为空的行（原始数据未标注周次/月份）看板不会读取
+        result = result[result["period"].notna()].reset_index(drop=True)
+        starts = pd.Series(None, index=result.index, dtype=object)
+        for period_type in PERIOD_TYPES:
+            rows = result["period_type"] == period_type
+            starts[rows] = period_starts(period_type, result.loc[rows, "period"], self.anchor)
+        result.insert(2, "period_start", starts)
+        return result
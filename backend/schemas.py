@@ -3,6 +3,44 @@ from typing import List, Optional, Dict, Any
 
 class UploadResponse(BaseModel):
     message: str
+    job_id: Optional[str] = None
+    duplicate: bool = False
+
+class PreflightResponse(BaseModel):
+    filename: str
+    ok: bool
+    columns: List[str]
+    mapped_columns: Dict[str, str]
+    unmapped_columns: List[str]
+    missing_columns: List[str]
+    column_types: Dict[str, str]
+    warnings: List[str]
+    sample_rows: int
+    estimated_rows: Optional[int] = None
+    exact_rows: bool
+    elapsed_ms: float
+
+class UploadSessionStatus(BaseModel):
+    upload_id: Optional[str] = None
+    filename: Optional[str] = None
+    total_size: Optional[int] = None
+    chunk_size: Optional[int] = None
+    offset: Optional[int] = None
+    complete: bool = True
+    message: Optional[str] = None
+    job_id: Optional[str] = None
+    duplicate: bool = False
+
+class JobStatus(BaseModel):
+    job_id: str
+    filename: str
+    status: str
+    stage: str
+    rows_processed: int
+    elapsed_seconds: float
+    rows_per_second: float
+    message: Optional[str] = None
+    error: Optional[str] = None
 
 class ProductAnalysis(BaseModel):
     sku: str
@@ -52,5 +90,17 @@ class SalespersonComparison(BaseModel):
     previous_profit_rate: Optional[float] = None
     profit_rate_change: Optional[float] = None
 
+class WeeklyDashboard(BaseModel):
+    top_sales_volume: List[ProductAnalysis]
+    top_sales_amount: List[ProductAnalysis]
+    top_increased: List[ComparisonAnalysis]
+    top_decreased: List[ComparisonAnalysis]
+    country_distribution: List[CountryAnalysis]
+    platform_comparison: PlatformComparison
+    platform_detail: List[Dict[str, Any]]
+    salesperson_comparison: List[Dict[str, Any]]
+    platform_sales_distribution: Dict[str, float]
+    no_orders_this_week: List[ProductAnalysis]
+
 class AIAnalysis(BaseModel):
     analysis: str 
\ No newline at end of file
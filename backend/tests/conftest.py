@@ -0,0 +1,105 @@
+import os
+import sys
+import random
+import tempfile
+from datetime import date
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 上传、缓存、归档目录都相对于当前目录；导入main时会创建上传目录，先切换到临时目录
+os.chdir(tempfile.mkdtemp(prefix="sales-tests-"))
+
+import models
+import ingest
+import main
+
+# 测试数据的截止日期：2024-09-11在2024-W37，"本周"为9月9日开始的一周
+AS_OF = date(2024, 9, 11)
+
+
+def make_raw(rows=300, seed=1, weeks=("本周", "上周"), months=("9月",)):
+    """生成原始表头的模拟上传数据"""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(rows):
+        product = rng.randint(1, 40)
+        records.append({
+            "sku": f"SKU{product:04d}", "spu": f"SPU{product // 3}", "名称": f"产品{product}",
+            "店铺": f"店{rng.randint(1, 3)}", "站点": rng.choice(["US", "UK"]), "仓库": rng.choice(["W1", "W2"]),
+            "销量": rng.randint(0, 20), "销售额": round(rng.random() * 500, 2),
+            "买家国家": rng.choice(["美国", "英国", "德国"]), "平台": rng.choice(["Amazon", "eBay", "Temu"]),
+            "销售": rng.choice(["张三", "李四"]), "订单数": rng.randint(0, 10),
+            "销售毛利额": round(rng.random() * 100, 2), "毛利率": round(rng.random(), 3),
+            "周": rng.choice(weeks), "订单状态": "完成", "月": rng.choice(months)
+        })
+    return pd.DataFrame(records)
+
+
+def make_frame(rows=300, seed=1, **kwargs):
+    """生成清洗后的模拟数据"""
+    return ingest.process_data(make_raw(rows, seed, **kwargs))
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """每个测试在独立的目录中运行，上传缓存和历史归档互不影响"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def create_database(path):
+    """独立的SQLite数据库，不使用database.py中配置的连接"""
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def open_session(engine):
+    session = sessionmaker(bind=engine)()
+    session.info["columnar_store"] = None
+    return session
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_database(tmp_path / "sales.db")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = open_session(engine)
+    yield session
+    session.close()
+
+
+def load(db, frames, **kwargs):
+    """按导入流程写入数据并发布"""
+    kwargs.setdefault("as_of", AS_OF)
+    return main.save_to_database(frames, db, **kwargs)
+
+
+def rollup_snapshot(engine):
+    """汇总表和周期目录的内容，成员按维度值而不是键表示，便于比较两个数据库"""
+    with engine.connect() as connection:
+        rollup = pd.read_sql(text("""
+            SELECT r.period_type, r.period, r.period_start, r.dimension,
+                   COALESCE(p.sku || '/' || p.product_name, pl.platform, b.buyer_country, s.sales_person) AS member,
+                   r.sales_amount, r.sales_volume, r.order_count, r.profit,
+                   r.profit_rate_sum, r.profit_rate_count, r.row_count
+            FROM sales_rollup r
+            LEFT JOIN dim_product p ON r.dimension = 'product' AND p.id = r.member_id
+            LEFT JOIN dim_platform pl ON r.dimension = 'platform' AND pl.id = r.member_id
+            LEFT JOIN dim_buyer_country b ON r.dimension = 'buyer_country' AND b.id = r.member_id
+            LEFT JOIN dim_sales_person s ON r.dimension = 'sales_person' AND s.id = r.member_id
+        """), connection)
+        catalog = pd.read_sql(text("SELECT period_type, period, period_start, sort_key, row_count FROM period_catalog"),
+                              connection)
+    rollup = rollup.sort_values(["period_type", "period", "dimension", "member"]).reset_index(drop=True)
+    catalog = catalog.sort_values(["period_type", "period"]).reset_index(drop=True)
+    return rollup.round(6), catalog
@@ -0,0 +1,51 @@
+from datetime import date
+import pandas as pd
+import pytest
+import archive
+from conftest import AS_OF, make_frame, load
+
+
+def add_upload(upload, anchor, weeks=("本周", "上周"), month="9月"):
+    writer = archive.ArchiveWriter(upload, f"{upload}.csv", anchor=anchor)
+    writer.add(pd.DataFrame({
+        "sku": ["A", "B", "A", "B"], "platform": ["Amazon", "eBay", "Amazon", "eBay"],
+        "sales_amount": [1.0, 2.0, 3.0, 4.0], "week": [weeks[0], weeks[0], weeks[-1], weeks[-1]],
+        "month": [month] * 4
+    }))
+    assert writer.commit()
+
+
+def test_relative_weeks_of_different_uploads_are_distinct_periods():
+    for index, anchor in enumerate([date(2024, 9, 4), date(2024, 9, 11), date(2024, 9, 18)]):
+        add_upload(f"u{index}", anchor)
+
+    latest = archive.query(["sales_amount"], period_type="week")
+    assert latest["period"].tolist() == ["2024-08-26", "2024-09-02", "2024-09-09", "2024-09-16"]
+    assert latest["upload"].tolist() == ["u0", "u1", "u2", "u2"]
+    assert latest["sales_amount"].tolist() == [7.0, 7.0, 7.0, 3.0]
+
+    overlapping = archive.query(["sales_amount"], period_type="week", latest=False)
+    assert len(overlapping) == 6
+
+
+def test_query_periods_accept_labels_and_start_dates():
+    add_upload("u0", date(2024, 9, 11))
+    add_upload("u1", date(2024, 10, 9), month="10月")
+
+    by_platform = archive.query(["sales_amount"], "platform", period_type="month", periods=["2024-10"])
+    assert by_platform["period"].tolist() == ["2024-10-01", "2024-10-01"]
+    assert by_platform["platform"].tolist() == ["Amazon", "eBay"]
+    weeks = archive.query(["sales_amount"], period_type="week", periods=["2024-W37", "2024-10-07"])
+    assert weeks["period"].tolist() == ["2024-09-09", "2024-10-07"]
+    assert archive.query(["sales_amount"], periods=["2023-01"]).empty
+    with pytest.raises(ValueError):
+        archive.query(["sales_amount"], periods=["下个月"])
+
+
+def test_imports_are_archived_with_as_of(db):
+    load(db, [make_frame(200, seed=1)], fingerprint="first", source="first.csv")
+    history = archive.query(["sales_amount", "profit_rate"], period_type="week")
+    assert history["period"].tolist() == ["2024-09-02", "2024-09-09"]
+    assert history["upload"].unique().tolist() == ["first"]
+    assert archive.list_uploads()[0]["as_of"] == AS_OF.isoformat()
+
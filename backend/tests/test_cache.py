@@ -0,0 +1,96 @@
+import pickle
+import threading
+import time
+import models
+import cache
+from conftest import make_frame, load
+
+
+def publish(engine):
+    with engine.begin() as connection:
+        return models.bump_dataset_version(connection)
+
+
+def test_results_are_reused_until_data_is_published(engine):
+    results = cache.ResultCache(engine)
+    calls = []
+    compute = lambda: calls.append(1) or {"value": len(calls)}
+    assert results.get_or_compute("key", compute) == {"value": 1}
+    assert results.get_or_compute("key", compute) == {"value": 1}
+    assert publish(engine) == 1
+    assert results.get_or_compute("key", compute) == {"value": 2}
+    assert results.stats()["hits"] == 1 and results.stats()["misses"] == 2
+    assert results.stats()["version"] == 1
+
+
+def test_publish_by_another_process_invalidates_results(engine, db):
+    # 两个缓存实例相当于两个工作进程，导入只在其中一个进程中执行
+    importer, other = cache.ResultCache(engine), cache.ResultCache(engine)
+    assert other.get_or_compute("key", lambda: "empty") == "empty"
+    load(db, [make_frame(100)])
+    assert models.get_dataset_version(engine) == 1
+    assert importer.get_or_compute("key", lambda: "loaded") == "loaded"
+    assert other.get_or_compute("key", lambda: "loaded") == "loaded"
+    load(db, [make_frame(50, seed=2)], upsert=True)
+    assert other.get_or_compute("key", lambda: "upserted") == "upserted"
+
+
+def test_etag_follows_the_published_version(engine, db):
+    importer, other = cache.ResultCache(engine), cache.ResultCache(engine)
+    etag = other.etag("/analysis/top-sales-amount/", "")
+    assert importer.etag("/analysis/top-sales-amount/", "") == etag
+    assert other.etag("/analysis/top-sales-amount/", "limit=5") != etag
+    # 导入只经过其中一个进程，另一个进程不能再用旧ETag回答304
+    load(db, [make_frame(100)])
+    assert not cache.etag_matches(etag, other.etag("/analysis/top-sales-amount/", ""))
+    assert other.etag("/analysis/top-sales-amount/", "") == importer.etag("/analysis/top-sales-amount/", "")
+
+
+def test_least_recently_used_results_are_evicted(engine):
+    size = len(pickle.dumps("x" * 100, protocol=pickle.HIGHEST_PROTOCOL))
+    results = cache.ResultCache(engine, max_bytes=size * 3)
+    for key in ("a", "b", "c"):
+        results.get_or_compute(key, lambda: "x" * 100)
+    results.get_or_compute("a", lambda: "unused")
+    results.get_or_compute("d", lambda: "x" * 100)
+    assert results.stats()["entries"] == 3
+    assert results.get_or_compute("a", lambda: "recomputed") == "x" * 100
+    assert results.get_or_compute("b", lambda: "recomputed") == "recomputed"
+
+
+def test_concurrent_misses_compute_once(engine):
+    results = cache.ResultCache(engine)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return 42
+
+    outputs = []
+    threads = [threading.Thread(target=lambda: outputs.append(results.get_or_compute("key", compute)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outputs == [42] * 5
+    assert len(calls) == 1
+
+
+def test_result_computed_before_publish_is_not_reused(engine):
+    results = cache.ResultCache(engine)
+
+    def compute():
+        publish(engine)
+        return "stale"
+
+    assert results.get_or_compute("key", compute) == "stale"
+    assert results.get_or_compute("key", lambda: "fresh") == "fresh"
+
+
+def test_etag_matches():
+    assert cache.etag_matches('"a", W/"b"', '"b"')
+    assert cache.etag_matches("*", '"b"')
+    assert not cache.etag_matches('"a"', '"b"')
+    assert not cache.etag_matches(None, '"b"')
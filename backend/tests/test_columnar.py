@@ -0,0 +1,85 @@
+import pytest
+import models
+import columnar
+from conftest import make_frame, load, open_session
+
+# (面板函数, 额外参数)
+PANELS = [
+    (models.get_top_sales_volume, {}),
+    (models.get_top_sales_amount, {"week": "上周"}),
+    (models.get_top_increased_sales_amount, {}),
+    (models.get_top_decreased_sales_amount, {}),
+    (models.get_no_orders_this_week, {}),
+    (models.get_country_sales_distribution, {}),
+    (models.get_platform_comparison, {}),
+    (models.get_salesperson_comparison, {}),
+    (models.get_weekly_product_panels, {}),
+    (models.get_month_top_sales_amount, {}),
+    (models.get_month_top_increased_sales_volume, {}),
+    (models.get_month_country_sales_distribution, {}),
+    (models.get_month_platform_comparison, {}),
+    (models.get_month_salesperson_comparison, {}),
+    (models.get_trend, {}),
+    (models.get_trend, {"period_type": "month", "periods": 3, "year_over_year": True}),
+    (models.get_trend, {"dimension": "product", "member": "SKU0007", "year_over_year": True}),
+    (models.get_trend, {"dimension": "platform", "member": "Amazon", "metrics": ("profit_rate", "order_count")}),
+    (models.get_trend, {"dimension": "buyer_country", "member": "没有这个国家"}),
+]
+
+
+def approx(value):
+    """浮点数按相对误差比较，求和顺序不同时末位可能不同"""
+    if isinstance(value, dict):
+        return {key: approx(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [approx(item) for item in value]
+    if isinstance(value, float):
+        return pytest.approx(value, rel=1e-9, abs=1e-9)
+    return value
+
+
+def test_memory_engine_matches_sql(engine, db):
+    # 含去年同期的周和月，同比也要比较
+    load(db, [make_frame(500, seed=1, weeks=("本周", "上周", "2023-W37"), months=("8月", "9月", "2023-09"))])
+    columnar.load(engine)
+    memory = open_session(engine)
+    memory.info.pop("columnar_store")
+    try:
+        assert columnar.for_session(memory) is not None
+        for panel, kwargs in PANELS:
+            assert approx(panel(memory, **kwargs)) == panel(db, **kwargs), (panel.__name__, kwargs)
+    finally:
+        memory.close()
+        columnar.unload(engine)
+
+
+def test_reload_only_when_enabled(engine, db, monkeypatch):
+    load(db, [make_frame(50)])
+    monkeypatch.setattr(columnar, "ANALYSIS_ENGINE", "sql")
+    assert columnar.reload(engine) is None
+    monkeypatch.setattr(columnar, "ANALYSIS_ENGINE", "memory")
+    try:
+        assert columnar.reload(engine) is not None
+    finally:
+        columnar.unload(engine)
+
+
+
+def test_store_is_reloaded_after_another_process_publishes(engine, db, monkeypatch):
+    monkeypatch.setattr(columnar, "ANALYSIS_ENGINE", "memory")
+    try:
+        load(db, [make_frame(100, seed=1)])
+        stale = columnar._stores[engine]
+        # 导入在另一个进程中发布：本进程没有随导入重新载入
+        with monkeypatch.context() as patch:
+            patch.setattr(columnar, "reload", lambda bind: None)
+            load(db, [make_frame(60, seed=2)])
+        memory = open_session(engine)
+        memory.info.pop("columnar_store")
+        try:
+            assert columnar.for_session(memory) is not stale
+            assert approx(models.get_top_sales_amount(memory)) == models.get_top_sales_amount(db)
+        finally:
+            memory.close()
+    finally:
+        columnar.unload(engine)
@@ -0,0 +1,16 @@
+import main
+import cache
+from conftest import make_frame, load
+
+
+def test_weekly_dashboard_matches_separate_endpoints(db):
+    # 接口结果缓存是进程内全局的，各测试的数据库版本号都从1开始，先清空
+    cache.results.clear()
+    load(db, [make_frame(300, seed=4)])
+    dashboard = main.get_weekly_dashboard(db=db)
+    assert dashboard["platform_detail"] == main.get_platform_detail(db=db)
+    assert dashboard["salesperson_comparison"] == main.get_salesperson_comparison(db=db)
+    assert dashboard["platform_sales_distribution"] == main.get_platform_sales_distribution(db=db)
+    assert dashboard["country_distribution"] == main.get_country_distribution(db=db)
+    assert dashboard["top_sales_amount"] == main.get_top_sales_amount(db=db, week=None)
+    assert dashboard["no_orders_this_week"] == main.get_no_orders_this_week(db=db)
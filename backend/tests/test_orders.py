@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+import orders
+from conftest import AS_OF, make_raw
+
+
+def order_lines():
+    raw = make_raw(6, seed=3).drop(columns=["周", "月", "订单数"])
+    raw = pd.concat([raw.iloc[:3]] * 2 + [raw.iloc[3:]], ignore_index=True)
+    raw[["sku", "spu", "名称", "店铺", "站点", "仓库", "买家国家", "平台", "销售"]] = \
+        ["SKU1", "SPU1", "产品1", "店1", "US", "W1", "美国", "Amazon", "张三"]
+    raw["订单日期"] = ["2024-09-10", "2024-09-11", "2024-09-03", "2024-09-10 08:00", "2024/09/11", "2024-09-03",
+                   "2024-08-20", "2024-08-31", "not a date"]
+    return raw
+
+
+def test_order_lines_are_summed_per_week_and_labelled():
+    raw = order_lines()
+    partials = [orders.clean_order_chunk(raw.iloc[:4], check_columns=True), orders.clean_order_chunk(raw.iloc[4:])]
+    result = pd.concat(list(orders.aggregate(partials, anchor=AS_OF, chunk_rows=2)), ignore_index=True)
+
+    by_week = result.groupby("week", observed=True)[["sales_amount", "order_count"]].sum()
+    assert by_week["order_count"].to_dict() == {"2024-W34": 1, "上上周": 1, "上周": 2, "本周": 4, "": 1}
+    dates = pd.to_datetime(raw["订单日期"], errors="coerce", format="mixed")
+    this_week = dates >= pd.Timestamp("2024-09-09")
+    assert by_week.loc["本周", "sales_amount"] == pytest.approx(raw.loc[this_week, "销售额"].sum())
+    assert set(result["month"].astype(str)) == {"2024-08", "2024-09", ""}
+    rates = result["profit"] / result["sales_amount"] * 100
+    assert result["profit_rate"].round(6).tolist() == rates.fillna(0).round(6).tolist()
+
+
+def test_order_date_column_is_required():
+    with pytest.raises(ValueError, match="订单日期"):
+        orders.clean_order_chunk(order_lines().drop(columns=["订单日期"]), check_columns=True)
@@ -0,0 +1,49 @@
+import io
+import gzip
+import preflight
+import ingest
+from conftest import make_raw
+
+
+def csv_bytes(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def test_complete_csv_sample():
+    raw = make_raw(50).astype({"销售额": object})
+    raw.loc[3, "销售额"] = "abc"
+    report = preflight.inspect(csv_bytes(raw.assign(备注="x")), "sales.csv")
+    assert report["ok"] and report["missing_columns"] == []
+    assert report["unmapped_columns"] == ["备注"]
+    assert report["mapped_columns"]["销售额"] == "sales_amount"
+    assert report["estimated_rows"] == 50 and report["exact_rows"]
+    assert any(warning.startswith("销售额: 样本中 1 个值不是数字") for warning in report["warnings"])
+
+
+def test_truncated_sample_estimates_rows():
+    data = csv_bytes(make_raw(2000))
+    report = preflight.inspect(data[:20000], "sales.csv", total_size=len(data), complete=False)
+    assert not report["exact_rows"]
+    assert 1600 < report["estimated_rows"] < 2400
+
+    compressed = gzip.compress(data)
+    report = preflight.inspect(compressed, "sales.csv.gz", total_size=len(compressed), complete=True)
+    assert report["estimated_rows"] == 2000
+
+
+def test_missing_columns_match_import_check():
+    raw = make_raw(10).drop(columns=["销售额", "周"])
+    report = preflight.inspect(csv_bytes(raw), "sales.csv")
+    assert not report["ok"]
+    assert report["missing_columns"] == ["销售额", "周"]
+    assert preflight.find_missing_columns(raw.columns, order_level=True) == ["销售额", "订单日期"]
+
+
+def test_model_field_names_are_accepted():
+    renamed = make_raw(20).rename(columns=ingest.COLUMN_MAPPING)
+    buffer = io.BytesIO()
+    renamed.to_parquet(buffer)
+    report = preflight.inspect(buffer.getvalue(), "sales.parquet")
+    assert report["ok"] and report["missing_columns"] == []
+    assert ingest.find_missing_columns(renamed.columns) == []
+    assert len(ingest.clean_chunk(renamed, check_columns=True)) == 20
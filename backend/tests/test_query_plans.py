@@ -0,0 +1,30 @@
+from sqlalchemy import func
+import models
+import migrate
+from conftest import make_frame, load
+
+
+def test_analysis_queries_use_rollup_indexes(engine, db):
+    load(db, [make_frame(400, seed=1, months=("8月", "9月"))])
+    queries = migrate.capture_analysis_queries(engine)
+    assert len(queries) > 10
+    with engine.connect() as connection:
+        for statement, parameters in queries:
+            problems, details = migrate._explain_sqlite(connection, statement, parameters)
+            assert not problems, f"{statement}\n{details}"
+    assert migrate.check_query_plans(engine) == 0
+
+
+def test_explain_flags_fact_scans_and_rollup_sorts(engine, db):
+    load(db, [make_frame(100)])
+    rollup = models.SalesRollup
+    # 直接按维度属性对汇总行分组，需要对汇总行建临时B树排序
+    unordered = db.query(models.Product.sku, func.sum(rollup.sales_amount)).select_from(rollup).outerjoin(
+        models.Product, models.Product.id == rollup.member_id
+    ).filter(*models.rollup_criteria("product", "week")).group_by(models.Product.sku)
+    fact = db.query(func.sum(models.SalesData.sales_amount)).filter(models.SalesData.week == "本周")
+    with engine.connect() as connection:
+        for query in (unordered, fact):
+            statement = query.statement.compile(engine)
+            problems, _ = migrate._explain_sqlite(connection, str(statement), tuple(statement.params.values()))
+            assert problems
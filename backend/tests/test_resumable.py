@@ -0,0 +1,87 @@
+import hashlib
+import os
+import pandas as pd
+import pytest
+import ingest
+import resumable
+from conftest import make_raw
+
+CHUNK_SIZE = 4096
+
+
+def chunks(data):
+    return [data[start:start + CHUNK_SIZE] for start in range(0, len(data), CHUNK_SIZE)]
+
+
+def new_session(data, filename="sales.csv"):
+    return resumable.UploadSession("key", filename, len(data), {"orders": False}, chunk_size=CHUNK_SIZE)
+
+
+def test_chunks_are_appended_in_order():
+    data = make_raw(200).to_csv(index=False).encode("utf-8")
+    parts = chunks(data)
+    session = new_session(data)
+    try:
+        assert session.append(0, parts[0], hashlib.sha256(parts[0]).hexdigest()) == CHUNK_SIZE
+        # 确认丢失后重发已接收的块
+        assert session.append(0, parts[0]) == CHUNK_SIZE
+        with pytest.raises(resumable.OffsetMismatch) as mismatch:
+            session.append(2, parts[2])
+        assert mismatch.value.offset == CHUNK_SIZE
+        with pytest.raises(ValueError, match="校验失败"):
+            session.append(1, parts[1], hashlib.sha256(b"other").hexdigest())
+        with pytest.raises(ValueError, match="大小不正确"):
+            session.append(1, parts[1][:-1])
+        for index, part in enumerate(parts[1:], start=1):
+            session.append(index, part)
+        assert session.complete
+        assert session.content_hash() == hashlib.sha256(data).hexdigest()
+        with open(session.path, "rb") as f:
+            assert f.read() == data
+    finally:
+        session.close()
+    assert not os.path.exists(session.directory)
+
+
+def test_csv_is_cleaned_while_receiving():
+    raw = make_raw(500)
+    data = raw.to_csv(index=False).encode("utf-8")
+    session = new_session(data)
+    try:
+        assert session.start_parsing()
+        for index, part in enumerate(chunks(data)):
+            session.append(index, part)
+        parsed = pd.concat(list(session.parsed_frames()), ignore_index=True)
+    finally:
+        session.close()
+    expected = ingest.process_data(raw)
+    assert len(parsed) == len(expected)
+    assert parsed["sales_amount"].sum() == pytest.approx(expected["sales_amount"].sum())
+    assert parsed["sku"].astype(str).tolist() == expected["sku"].astype(str).tolist()
+
+
+def test_parse_error_is_reported():
+    data = make_raw(50).drop(columns=["销售额"]).to_csv(index=False).encode("utf-8")
+    session = new_session(data)
+    try:
+        session.start_parsing()
+        for index, part in enumerate(chunks(data)):
+            session.append(index, part)
+        with pytest.raises(ValueError, match="销售额"):
+            list(session.parsed_frames())
+    finally:
+        session.close()
+
+
+def test_open_session_resumes_matching_upload():
+    session = resumable.open_session("key", "sales.csv", 100, {"orders": False})
+    try:
+        assert resumable.open_session("key", "sales.csv", 100, {"orders": False}) is session
+        assert resumable.get(session.id) is session
+        assert resumable.open_session("key", "sales.csv", 100, {"orders": True}) is not session
+    finally:
+        for upload_id in list(resumable._sessions):
+            resumable.get(upload_id).close()
+    assert resumable.get(session.id) is None
+    with pytest.raises(ValueError):
+        resumable.open_session("key", "empty.csv", 0, {})
@@ -0,0 +1,45 @@
+from datetime import timedelta
+import pandas as pd
+import pytest
+from sqlalchemy import text
+import rolling
+from conftest import AS_OF, make_raw, make_frame, load, create_database, open_session, rollup_snapshot
+import ingest
+
+
+def test_rolling_import_matches_full_import(tmp_path):
+    last_week = make_raw(300, seed=1, weeks=("本周",))
+    this_week = make_raw(200, seed=2, weeks=("本周",))
+
+    rolled = create_database(tmp_path / "rolling.db")
+    db = open_session(rolled)
+    load(db, [ingest.process_data(last_week)], as_of=AS_OF - timedelta(days=7))
+    load(db, [ingest.process_data(this_week)], rolling=True)
+    db.close()
+
+    full = create_database(tmp_path / "full.db")
+    db = open_session(full)
+    load(db, [ingest.process_data(pd.concat([last_week.assign(周="上周"), this_week], ignore_index=True))])
+    db.close()
+
+    rolled_rollup, rolled_catalog = rollup_snapshot(rolled)
+    full_rollup, full_catalog = rollup_snapshot(full)
+    pd.testing.assert_frame_equal(rolled_rollup, full_rollup)
+    pd.testing.assert_frame_equal(rolled_catalog, full_catalog)
+    with rolled.connect() as connection:
+        weeks = dict(connection.execute(text("SELECT week, COUNT(*) FROM sales_data GROUP BY week")).fetchall())
+    assert weeks == {"本周": 200, "上周": 300}
+
+
+def test_rolling_import_drops_weeks_outside_window(db):
+    load(db, [make_frame(100, seed=1, weeks=("本周",))], as_of=AS_OF - timedelta(days=14))
+    load(db, [make_frame(50, seed=2, weeks=("本周",))], rolling=True)
+    with db.get_bind().connect() as connection:
+        weeks = dict(connection.execute(text("SELECT week, COUNT(*) FROM sales_data GROUP BY week")).fetchall())
+    assert weeks == {"本周": 50}
+
+
+def test_rolling_upload_must_contain_only_this_week():
+    with pytest.raises(ValueError, match="上周"):
+        rolling.current_week(make_frame(20, weeks=("本周", "上周")), AS_OF)
+    assert rolling.carried_weeks(AS_OF) == {AS_OF - timedelta(days=AS_OF.weekday() + 7): "上周"}
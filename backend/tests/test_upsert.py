@@ -0,0 +1,39 @@
+import pandas as pd
+from sqlalchemy import text
+import ingest
+from conftest import make_raw, load, create_database, open_session, rollup_snapshot
+
+# 自然键对应的原始列
+KEY = ["sku", "spu", "名称", "店铺", "站点", "仓库", "买家国家", "平台", "销售", "周", "月"]
+
+
+def test_upsert_matches_reimport_of_corrected_file(tmp_path):
+    base = make_raw(300, seed=1)
+    base = base[~base.duplicated(KEY, keep=False)].reset_index(drop=True)
+    corrections = base.iloc[:40].copy()
+    corrections["销售额"] = corrections["销售额"] * 2
+    corrections["销量"] += 1
+    added = make_raw(5, seed=9).assign(sku="SKUNEW", spu="SPUNEW", 名称="新品")
+    corrections = pd.concat([corrections, added], ignore_index=True)
+    fixed = pd.concat([corrections.iloc[:40], base.iloc[40:], added], ignore_index=True)
+
+    upserted = create_database(tmp_path / "upsert.db")
+    db = open_session(upserted)
+    load(db, [ingest.process_data(base)])
+    assert load(db, [ingest.process_data(corrections)], upsert=True) == 45
+    # 同一份修正再导入一次结果不变
+    load(db, [ingest.process_data(corrections)], upsert=True)
+    db.close()
+
+    full = create_database(tmp_path / "full.db")
+    db = open_session(full)
+    load(db, [ingest.process_data(fixed)])
+    db.close()
+
+    upserted_rollup, upserted_catalog = rollup_snapshot(upserted)
+    full_rollup, full_catalog = rollup_snapshot(full)
+    pd.testing.assert_frame_equal(upserted_rollup, full_rollup)
+    pd.testing.assert_frame_equal(upserted_catalog, full_catalog)
+    with upserted.connect() as connection:
+        rows, keys = connection.execute(text("SELECT COUNT(*), COUNT(DISTINCT row_key) FROM sales_data")).one()
+    assert rows == keys == len(fixed)
@@ -0,0 +1,210 @@
+"""按行的自然键增量导入（upsert）：只修正上传文件中出现的行，不重新导入全部数据
+
+自然键为 商品(sku)、店铺/站点、仓库、买家国家、平台、销售人员 的维度键加上周、月的起始日期，
+拼成事实表的row_key列并建唯一索引。MySQL使用 INSERT ... ON DUPLICATE KEY UPDATE，
+SQLite使用 INSERT ... ON CONFLICT DO UPDATE；汇总表按 新行 - 被替换的旧行 的差额原地更新，
+事实表、汇总表和周期目录在同一个事务中修改。
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, update, delete, bindparam
+import models
+import rollups
+
+# 组成自然键的事实表列（维度属性已替换为整数键），周期用起始日期，"本周"等相对标签不影响匹配
+NATURAL_KEY = ("product_id", "shop_id", "warehouse_id", "buyer_country_id", "platform_id", "sales_person_id",
+               "week_start", "month_start")
+
+# 每条IN查询携带的键数
+_LOOKUP_BATCH = 500
+
+
+def _column(fact, name):
+    if name in fact.columns:
+        return fact[name]
+    return pd.Series(None, index=fact.index, dtype="object")
+
+
+def _format(values, formatter):
+    """每个不同的值只格式化一次，缺失值为空串"""
+    codes, uniques = pd.factorize(values)
+    table = np.array([formatter(value) for value in uniques] + [""], dtype=object)
+    return table[codes]
+
+
+def _key_part(fact, column):
+    """自然键的一列转为字符串数组；周期起始日期无法解析时退回原标签"""
+    values = _column(fact, column)
+    if column.endswith("_start"):
+        period_type = column[:-len("_start")]
+        text = _format(values.astype(object), date.isoformat)
+        missing = text == ""
+        if missing.any():
+            labels = _column(fact, period_type).astype(object)
+            text[missing] = _format(labels[missing], lambda label: f"{period_type}:{label}")
+        return text
+    return _format(values.astype("Int64"), lambda value: str(int(value)))
+
+
+class RowKeys:
+    """为事实行生成row_key
+
+    同一次导入中自然键重复的行（如同一商品多个订单状态）按出现顺序加上 #2、#3 后缀，
+    修正文件中的第N次出现对应原数据中的第N次出现。
+    """
+
+    def __init__(self):
+        self.counts = Counter()   # 之前各块中每个自然键出现的次数
+
+    def assign(self, fact):
+        parts = [_key_part(fact, column).tolist() for column in NATURAL_KEY]
+        keys = ["|".join(values) for values in zip(*parts)]
+        counts = self.counts
+        if len(counts) + len(keys) > len(set(keys).union(counts)):
+            # 有重复的自然键时才逐行编号
+            for position, key in enumerate(keys):
+                ordinal = counts[key]
+                counts[key] = ordinal + 1
+                if ordinal:
+                    keys[position] = f"{key}#{ordinal + 1}"
+        else:
+            counts.update(keys)
+        return pd.Series(keys, index=fact.index, dtype=object)
+
+
+def default_anchor(bind):
+    """未指定as_of时，按当前数据中"本周"所在的周换算相对周期，使修正文件与原数据对齐"""
+    catalog = models.PeriodCatalog.__table__
+    with bind.connect() as connection:
+        monday = connection.execute(
+            select(catalog.c.period_start).where(catalog.c.period_type == "week", catalog.c.period == "本周")
+        ).scalar()
+    if monday is None:
+        return date.today()
+    return min(monday + timedelta(days=6), date.today())
+
+
+def _upsert_statement(connection, columns):
+    """按数据库生成 插入或按row_key更新 的语句"""
+    table = models.SalesData.__table__
+    if connection.dialect.name == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        return statement.on_duplicate_key_update({column: statement.inserted[column] for column in columns})
+    if connection.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table)
+        return statement.on_conflict_do_update(
+            index_elements=["row_key"], set_={column: statement.excluded[column] for column in columns}
+        )
+    raise ValueError(f"{connection.dialect.name} 不支持增量导入")
+
+
+def _records(df):
+    return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+
+
+def _existing_rows(connection, keys):
+    """按row_key取回将被替换的旧行（汇总表扣减用）"""
+    table = models.SalesData.__table__
+    columns = [table.c.row_key, table.c.week, table.c.month, *[table.c[key] for key in models.ROLLUP_DIMENSIONS.values() if key]] + \
+              [table.c[name] for name in ("sales_amount", "sales_volume", "order_count", "profit", "profit_rate")]
+    frames = [pd.DataFrame(columns=[column.name for column in columns])]
+    for start in range(0, len(keys), _LOOKUP_BATCH):
+        batch = keys[start:start + _LOOKUP_BATCH]
+        frames.append(pd.DataFrame(connection.execute(select(*columns).where(table.c.row_key.in_(batch))).mappings().all(),
+                                   columns=[column.name for column in columns]))
+    return pd.concat(frames, ignore_index=True)
+
+
+def _rollup_delta(new_fact, old_fact, anchor):
+    """汇总表的差额：新行的汇总减去被替换旧行的汇总，去掉没有变化的行"""
+    builder = rollups.RollupBuilder(anchor=anchor)
+    builder.add(new_fact)
+    removed = rollups.RollupBuilder(anchor=anchor)
+    removed.add(old_fact)
+    for partial in removed.partials:
+        partial = partial.copy()
+        partial[list(rollups.MEASURES)] = -partial[list(rollups.MEASURES)]
+        builder.add_partial(partial)
+    delta = builder.frame()
+    changed = (delta[list(rollups.MEASURES)].abs() > 1e-9).any(axis=1)
+    return delta[changed].reset_index(drop=True)
+
+
+def _apply_rollup_delta(connection, delta):
+    """已有的汇总行按差额累加，新出现的 (周期, 维度, 成员) 插入新行；返回更新和插入的行数"""
+    rollup = models.SalesRollup.__table__
+    if delta.empty:
+        return 0, 0
+    existing = []
+    for (period_type, dimension), group in delta.groupby(["period_type", "dimension"], sort=False):
+        rows = connection.execute(
+            select(rollup.c.id, rollup.c.period, rollup.c.member_id).where(
+                rollup.c.period_type == period_type, rollup.c.dimension == dimension,
+                rollup.c.period.in_(group["period"].unique().tolist())
+            )
+        ).mappings().all()
+        frame = pd.DataFrame(rows, columns=["id", "period", "member_id"])
+        frame.insert(0, "period_type", period_type)
+        frame.insert(2, "dimension", dimension)
+        existing.append(frame)
+    existing = pd.concat(existing, ignore_index=True)
+    existing["member_id"] = existing["member_id"].astype("Int64")
+    merged = delta.merge(existing, on=["period_type", "period", "dimension", "member_id"], how="left")
+
+    found = merged[merged["id"].notna()]
+    if not found.empty:
+        statement = update(rollup).where(rollup.c.id == bindparam("row_id")).values(
+            {name: rollup.c[name] + bindparam(f"delta_{name}") for name in rollups.MEASURES}
+        )
+        connection.execute(statement, [
+            {"row_id": int(row["id"]), **{f"delta_{name}": row[name] for name in rollups.MEASURES}}
+            for row in _records(found)
+        ])
+    added = merged[merged["id"].isna()].drop(columns=["id"])
+    if not added.empty:
+        connection.execute(rollup.insert(), _records(added))
+    return len(found), len(added)
+
+
+def _rebuild_catalog(connection):
+    """按汇总表的total行重写周期目录（只有几行）"""
+    rollup = models.SalesRollup.__table__
+    catalog = models.PeriodCatalog.__table__
+    totals = pd.DataFrame(connection.execute(
+        select(rollup.c.period_type, rollup.c.period, rollup.c.period_start, rollup.c.dimension, rollup.c.row_count)
+        .where(rollup.c.dimension == "total")
+    ).mappings().all(), columns=["period_type", "period", "period_start", "dimension", "row_count"])
+    connection.execute(delete(catalog))
+    if not totals.empty:
+        connection.execute(catalog.insert(), _records(rollups.catalog_frame(totals)))
+
+
+def apply(frames, bind, resolver, anchor=None, on_progress=None):
+    """把清洗后的数据块按自然键upsert到正式表，返回 {"rows", "inserted", "updated"}"""
+    fact_table = models.SalesData.__table__
+    columns = [column.name for column in fact_table.columns if column.name not in ("id", "row_key", "created_at")]
+    keys = RowKeys()
+    facts = []
+    for df in frames:
+        fact = rollups.add_period_keys(resolver.resolve(df), anchor)
+        fact["row_key"] = keys.assign(fact)
+        facts.append(fact)
+    fact = pd.concat(facts, ignore_index=True) if facts else pd.DataFrame(columns=columns + ["row_key"])
+    if on_progress:
+        on_progress(stage="loading", rows_processed=len(fact))
+
+    with bind.begin() as connection:
+        old_fact = _existing_rows(connection, fact["row_key"].tolist())
+        values = fact.reindex(columns=columns + ["row_key"]).assign(created_at=datetime.now())
+        if len(values):
+            connection.execute(_upsert_statement(connection, columns), _records(values))
+        updated, added = _apply_rollup_delta(connection, _rollup_delta(fact, old_fact, anchor))
+        _rebuild_catalog(connection)
+        models.bump_dataset_version(connection)
+    print(f"增量导入 {len(fact)} 行：更新 {len(old_fact)} 行，新增 {len(fact) - len(old_fact)} 行；"
+          f"汇总表更新 {updated} 行，新增 {added} 行")
+    return {"rows": len(fact), "inserted": len(fact) - len(old_fact), "updated": len(old_fact)}
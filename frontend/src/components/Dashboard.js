@@ -94,61 +94,41 @@ const Dashboard = () => {
         }
       };
       
-      // 并行加载所有数据
-      const [
-        topSalesVolumeRes,
-        topSalesAmountRes,
-        topIncreasedRes,
-        topDecreasedRes,
-        countryDistributionRes,
-        platformComparisonRes,
-        platformDetailRes,
-        salespersonComparisonRes,
-        platformSalesDistributionRes, // 新增API响应
-        noOrdersThisWeekRes // 新增无单SKU API响应
-      ] = await Promise.all([
-        axios.get(`http://localhost:8000/analysis/top-sales-volume/?week=${weekFilter === 'all' ? '' : weekFilter}`, axiosConfig),
-        axios.get(`http://localhost:8000/analysis/top-sales-amount/?week=${weekFilter === 'all' ? '' : weekFilter}`, axiosConfig),
-        axios.get('http://localhost:8000/analysis/top-increased', axiosConfig),
-        axios.get('http://localhost:8000/analysis/top-decreased', axiosConfig),
-        axios.get('http://localhost:8000/analysis/country-distribution/', axiosConfig),
-        axios.get('http://localhost:8000/analysis/platform-comparison/', axiosConfig),
-        axios.get('http://localhost:8000/analysis/platform-detail/', axiosConfig),
-        axios.get('http://localhost:8000/analysis/salesperson-comparison/', axiosConfig),
-        axios.get('http://localhost:8000/analysis/platform-sales-distribution/', axiosConfig),
-        axios.get('http://localhost:8000/analysis/no-orders-this-week/', axiosConfig) // 新增API请求
-      ]);
+      // 周看板全部面板由合并接口一次返回，后端在同一个读事务中计算，各面板数据一致
+      const response = await axios.get(
+        `http://localhost:8000/analysis/weekly-dashboard/?week=${weekFilter === 'all' ? '' : weekFilter}`,
+        axiosConfig
+      );
+      const dashboard = response.data || {};
       
       // 打印API响应状态和数据结构
-      console.log('API响应');
-      console.log('销量Top5', topSalesVolumeRes.status);
-      console.log('销售额Top5', topSalesAmountRes.status);
+      console.log('API响应', response.status);
       
       // 检查API响应内容
-      if (Array.isArray(topSalesVolumeRes.data) && topSalesVolumeRes.data.length > 0) {
-        console.log('销量Top5示例数据:', topSalesVolumeRes.data[0]);
+      if (Array.isArray(dashboard.top_sales_volume) && dashboard.top_sales_volume.length > 0) {
+        console.log('销量Top5示例数据:', dashboard.top_sales_volume[0]);
       } else {
         console.warn('销量Top5 API返回空数据或格式不是数组');
       }
       
-      if (Array.isArray(topSalesAmountRes.data) && topSalesAmountRes.data.length > 0) {
-        console.log('销售额Top5示例数据:', topSalesAmountRes.data[0]);
+      if (Array.isArray(dashboard.top_sales_amount) && dashboard.top_sales_amount.length > 0) {
+        console.log('销售额Top5示例数据:', dashboard.top_sales_amount[0]);
       } else {
         console.warn('销售额Top5 API返回空数据或格式不是数组');
       }
       
       // 设置状态
       setData({
-        topSalesVolume: topSalesVolumeRes.data || [],
-        topSalesAmount: topSalesAmountRes.data || [],
-        topIncreased: topIncreasedRes.data || [],
-        topDecreased: topDecreasedRes.data || [],
-        countryDistribution: countryDistributionRes.data || [],
-        platformComparison: platformComparisonRes.data || {},
-        platformDetail: platformDetailRes.data || [],
-        salespersonComparison: salespersonComparisonRes.data || [],
-        platformSalesDistribution: platformSalesDistributionRes.data || {},
-        noOrdersThisWeek: noOrdersThisWeekRes.data || [] // 设置无单SKU数据
+        topSalesVolume: dashboard.top_sales_volume || [],
+        topSalesAmount: dashboard.top_sales_amount || [],
+        topIncreased: dashboard.top_increased || [],
+        topDecreased: dashboard.top_decreased || [],
+        countryDistribution: dashboard.country_distribution || [],
+        platformComparison: dashboard.platform_comparison || {},
+        platformDetail: dashboard.platform_detail || [],
+        salespersonComparison: dashboard.salesperson_comparison || [],
+        platformSalesDistribution: dashboard.platform_sales_distribution || {},
+        noOrdersThisWeek: dashboard.no_orders_this_week || [] // 设置无单SKU数据
       });
     } catch (err) {
       console.error('加载数据时出错', err);
@@ -6,21 +6,137 @@ import axios from 'axios';
 const { Dragger } = Upload;
 const { Title, Paragraph } = Typography;
 
+const API_BASE = 'http://localhost:8000';
+
+// 导入任务阶段的显示名称
+const STAGE_LABELS = {
+  queued: '排队中',
+  parsing: '解析中',
+  loading: '写入数据库',
+  publishing: '发布新数据',
+  done: '已完成'
+};
+
+// 订阅后台导入任务进度（Server-Sent Events），任务结束后关闭连接
+const watchImportJob = (jobId, onProgress) => new Promise((resolve, reject) => {
+  const source = new EventSource(`${API_BASE}/jobs/${jobId}/events`);
+  source.onmessage = (event) => {
+    const job = JSON.parse(event.data);
+    onProgress(job);
+    if (job.status === 'succeeded') {
+      source.close();
+      resolve(job);
+    } else if (job.status === 'failed') {
+      source.close();
+      reject(new Error(job.error || '导入失败'));
+    }
+  };
+  source.onerror = () => {
+    source.close();
+    reject(new Error('与服务器的进度连接已断开'));
+  };
+});
+
+// 上传前预检：CSV、JSON Lines（包括.gz）只发送开头一段；xlsx、Parquet需要整个文件，较大时跳过预检；zip包不预检
+const PREFLIGHT_BYTES = 256 * 1024;
+const PREFLIGHT_EXCEL_MAX_BYTES = 20 * 1024 * 1024;
+const STREAM_EXTENSIONS = ['.csv', '.csv.gz', '.ndjson', '.jsonl', '.ndjson.gz', '.jsonl.gz'];
+
+const preflightFile = (file) => {
+  const isStream = STREAM_EXTENSIONS.some(extension => file.name.endsWith(extension));
+  if (file.name.endsWith('.zip') || (!isStream && file.size > PREFLIGHT_EXCEL_MAX_BYTES)) {
+    return Promise.resolve(null);
+  }
+  const formData = new FormData();
+  formData.append('file', isStream ? file.slice(0, PREFLIGHT_BYTES) : file, file.name);
+  return axios
+    .post(`${API_BASE}/upload/preflight/`, formData, { params: { total_size: file.size } })
+    .then(response => response.data)
+    .catch(error => {
+      // 文件本身有问题时中止上传；预检接口不可用时不影响正常上传
+      if (error.response?.status === 400) {
+        throw error;
+      }
+      return null;
+    });
+};
+
+// 分块续传：每块带SHA-256校验，失败时按指数退避重试，中断后用同一个key重新创建会话从断点继续
+const CHUNK_RETRIES = 5;
+
+const sha256Hex = async (buffer) => {
+  if (!window.crypto?.subtle) {
+    return null;  // 非HTTPS页面没有crypto.subtle，只按偏移量校验
+  }
+  const digest = await window.crypto.subtle.digest('SHA-256', buffer);
+  return Array.from(new Uint8Array(digest)).map(byte => byte.toString(16).padStart(2, '0')).join('');
+};
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+const uploadResumable = async (file, onProgress) => {
+  const params = {
+    filename: file.name,
+    total_size: file.size,
+    key: `${file.name}:${file.size}:${file.lastModified}`
+  };
+  const session = (await axios.post(`${API_BASE}/upload/sessions/`, null, { params })).data;
+  let { offset } = session;
+  let status = session;
+  let failures = 0;
+  onProgress(offset / file.size);
+  while (!status.complete) {
+    const index = Math.floor(offset / session.chunk_size);
+    const data = await file.slice(index * session.chunk_size, (index + 1) * session.chunk_size).arrayBuffer();
+    const checksum = await sha256Hex(data);
+    try {
+      const response = await axios.put(`${API_BASE}/upload/sessions/${session.upload_id}/chunks/${index}`, data, {
+        headers: { 'Content-Type': 'application/octet-stream', ...(checksum && { 'X-Chunk-SHA256': checksum }) }
+      });
+      status = response.data;
+      offset = status.offset;
+      failures = 0;
+      onProgress(offset / file.size);
+    } catch (error) {
+      const response = error.response;
+      if (response?.status === 409) {
+        // 服务端已确认的偏移量与本地不一致，从服务端的偏移量继续
+        offset = response.data.detail.offset;
+        continue;
+      }
+      if ((response && response.status < 500) || failures >= CHUNK_RETRIES) {
+        throw error;
+      }
+      failures += 1;
+      await sleep(500 * 2 ** failures);
+      // 网络中断后重新查询服务端已收到多少
+      offset = (await axios.get(`${API_BASE}/upload/sessions/${session.upload_id}`).catch(() => ({ data: { offset } }))).data.offset;
+    }
+  }
+  return status;
+};
+
 const DataImport = () => {
   const [uploading, setUploading] = useState(false);
   const [uploadResult, setUploadResult] = useState(null);
+  const [jobProgress, setJobProgress] = useState(null);
+  const [preflight, setPreflight] = useState(null);
+  const [uploadPercent, setUploadPercent] = useState(null);
 
   const props = {
     name: 'file',
     multiple: false,
-    action: 'http://localhost:8000/upload/',
-    accept: '.xlsx,.xls,.csv',
+    action: `${API_BASE}/upload/`,
+    accept: '.xlsx,.xls,.csv,.gz,.ndjson,.jsonl,.parquet,.zip',
     onChange(info) {
       const { status } = info.file;
       
       if (status === 'uploading') {
         setUploading(true);
         setUploadResult(null);
+        setJobProgress(null);
+        setPreflight(null);
+        setUploadPercent(null);
       }
       
       if (status === 'done') {
@@ -39,22 +155,32 @@ const DataImport = () => {
         });
       }
     },
-    customRequest({ file, onSuccess, onError }) {
-      const formData = new FormData();
-      formData.append('file', file);
-      
-      axios
-        .post('http://localhost:8000/upload/', formData, {
-          headers: {
-            'Content-Type': 'multipart/form-data',
-          },
+    customRequest({ file, onProgress, onSuccess, onError }) {
+      preflightFile(file)
+        .then(report => {
+          setPreflight(report);
+          if (report && !report.ok) {
+            throw new Error(`文件缺少必要的列: ${report.missing_columns.join('、')}`);
+          }
+          return uploadResumable(file, fraction => {
+            const percent = Math.round(fraction * 100);
+            setUploadPercent(percent);
+            onProgress({ percent });
+          });
+        })
+        .then(result => {
+          // 最后一块到达后，解析和入库在后台任务中进行
+          if (!result.job_id) {
+            return result;
+          }
+          return watchImportJob(result.job_id, setJobProgress);
         })
-        .then(response => {
-          onSuccess(response.data, file);
+        .then(result => {
+          onSuccess(result, file);
         })
         .catch(error => {
           console.error('上传文件失败:', error);
-          const errorMsg = error.response?.data?.detail || '服务器错误，请检查后端日志';
+          const errorMsg = error.response?.data?.detail || error.message || '服务器错误，请检查后端日志';
           message.error(`上传失败: ${errorMsg}`);
           onError({ ...error, message: errorMsg });
         });
@@ -65,7 +191,7 @@ const DataImport = () => {
     <div>
       <Title level={2}>数据导入</Title>
       <Paragraph>
-        支持上传Excel(.xlsx, .xls)或CSV文件，系统会自动处理和分析数据。
+        支持上传Excel(.xlsx, .xls)、CSV(.csv, .csv.gz)、JSON Lines(.ndjson, .jsonl)、Parquet文件或zip包，系统会自动处理和分析数据。
       </Paragraph>
       
       <Card style={{ marginBottom: 16 }}>
@@ -75,7 +201,7 @@ const DataImport = () => {
           </p>
           <p className="ant-upload-text">点击或拖拽文件到此区域上传</p>
           <p className="ant-upload-hint">
-            支持Excel和CSV格式的销售数据文件
+            支持Excel、CSV、JSON Lines和Parquet格式的销售数据文件，系统导出的数据建议使用Parquet或压缩CSV
           </p>
         </Dragger>
         
@@ -84,11 +210,34 @@ const DataImport = () => {
             <Spin>
               <div style={{ padding: '30px', background: 'rgba(0,0,0,0.05)' }}>
                 <p>正在上传和处理数据...</p>
+                {uploadPercent !== null && uploadPercent < 100 && <p>已上传 {uploadPercent}%</p>}
+                {jobProgress && (
+                  <p>
+                    {STAGE_LABELS[jobProgress.stage] || jobProgress.stage}：已处理 {jobProgress.rows_processed} 行
+                    {jobProgress.rows_per_second > 0 && `（${Math.round(jobProgress.rows_per_second)} 行/秒）`}
+                  </p>
+                )}
               </div>
             </Spin>
           </div>
         )}
         
+        {preflight && (
+          <Alert
+            message={`预检：${preflight.exact_rows ? '' : '约'}${preflight.estimated_rows ?? '未知'} 行数据（${preflight.elapsed_ms} 毫秒）`}
+            description={
+              <>
+                {preflight.missing_columns.length > 0 && <div>缺少必要的列：{preflight.missing_columns.join('、')}</div>}
+                {preflight.unmapped_columns.length > 0 && <div>以下列不会导入：{preflight.unmapped_columns.join('、')}</div>}
+                {preflight.warnings.map(warning => <div key={warning}>{warning}</div>)}
+              </>
+            }
+            type={!preflight.ok ? 'error' : (preflight.warnings.length || preflight.unmapped_columns.length ? 'warning' : 'info')}
+            showIcon
+            style={{ marginTop: 16 }}
+          />
+        )}
+        
         {uploadResult && (
           <Alert
             message={uploadResult.success ? "上传成功" : "上传失败"}